@@ -7,7 +7,8 @@ use IEEE.STD_LOGIC_UNSIGNED.ALL;
 --! @details This component takes a clock and reset signal and outputs a
 --! tick signal which is set to high for one clock cycle periodically.
 --! The period is defined via the generics CLK_FREQ and BAUD_RATE: A tick is
---! generated every floor(CLK_FREQ/BAUD_RATE) clock cycles.
+--! generated every round(CLK_FREQ/BAUD_RATE) clock cycles, rounding keeping
+--! the error of the bit time low at high baud rates.
 --! The tick rises with clk and falls with the next rise of clk. It is kept
 --! low asynchronously while rst is set high.
 entity baud_rate_generator is
@@ -23,7 +24,7 @@ entity baud_rate_generator is
 end baud_rate_generator;
 
 architecture implementation of baud_rate_generator is
-	constant TICKS_PER_BIT : integer := CLK_FREQ/BAUD_RATE;
+	constant TICKS_PER_BIT : integer := (CLK_FREQ+BAUD_RATE/2)/BAUD_RATE;
 	signal counter : integer range 0 to TICKS_PER_BIT-1;
 begin
 
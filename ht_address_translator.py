@@ -23,15 +23,23 @@ import sys
 import math
 import random
 import time
+import atexit
 
 # command-line argument handling
 fHardware=False
 fTestRandom=False
 randomPLACount=1000
 randomInputCount=1000
+inputBatchSize=256
 pla_terms=[]
-port="/dev/ttyUSB0"
+ports=[] # one per board, -p may be given repeatedly
 baudrate=921600
+fnRecord=None
+fnReplay=[]
+seed=None
+metricsInterval=None
+fnMetrics=None
+framed=False
 
 try:
   s=None
@@ -42,60 +50,132 @@ try:
         elif arg in { "-r", "--test-random" }: fTestRandom=True
         elif arg in { "-p", "--port" }: s="--port"
         elif arg in { "-b", "--baud" }: s="--baud"
+        elif arg=="--record": s="--record"
+        elif arg=="--replay": s="--replay"
+        elif arg=="--seed": s="--seed"
+        elif arg=="--metrics": s="--metrics"
+        elif arg=="--metrics-file": s="--metrics-file"
+        elif arg=="--framed": framed=True
         else:
           raise Exception("unknown switch: %s"%arg)
       else:
         pla_terms.append(arg)
     elif s=="--port":
-      port=arg
+      ports.append(arg)
       s=None
     elif s=="--baud":
       baudrate=int(arg)
       s=None
+    elif s=="--record":
+      fnRecord=arg
+      s=None
+    elif s=="--replay":
+      fnReplay.append(arg)
+      s=None
+    elif s=="--seed":
+      seed=int(arg)
+      s=None
+    elif s=="--metrics":
+      metricsInterval=float(arg)
+      s=None
+    elif s=="--metrics-file":
+      fnMetrics=arg
+      s=None
 
 except Exception as e:
   sys.stderr.write("\x1b[31;1mERROR\x1b[30;0m: %s\n"%e)
   sys.exit(1)
 
-# execution
-iface=htlib.IFace(port,baudrate)
-ctrl=htlib.PLAControl(iface)
+if len(ports)==0:
+  ports.append("/dev/ttyUSB0")
 
-# test i/o
-print("\x1b[34;1mRunning\x1b[30;0m: echo test")
-iface.test_echo()
+# a run is reproducible, and thus replayable, given its seed
+if seed==None:
+  seed=int(time.time())
+print("\x1b[34;1mSeed\x1b[30;0m: %i"%seed)
+random.seed(seed)
 
-# retrieve architecture specifics
-print("\x1b[34;1mRunning\x1b[30;0m: load config")
-iface.load_config()
-iface.print_config()
+# execution, the preliminary tests are run on every board
+boards=htlib.ShardedRunner.connect(ports,baudrate,fnRecord,fnReplay)
 
-# test configuration stream
-print("\x1b[34;1mRunning\x1b[30;0m: config test")
-iface.test_config(iface.CFG_PLA_REGISTER_COUNT)
+# the hardware tests must be built with C_FRAMED set
+if framed:
+  for board in boards.boards:
+    board.iface.enable_framing()
+
+# print (and export) transport metrics periodically and before exiting
+if metricsInterval!=None or fnMetrics!=None:
+  reporter=htlib.MetricsReporter(
+    { board.port:board.iface.enable_metrics() for board in boards.boards },
+    metricsInterval if metricsInterval!=None else 10.0,fnMetrics)
+  atexit.register(reporter.stop)
+  reporter.start()
+
+for board in boards.boards:
+  iface=board.iface
+  ctrl=htlib.PLAControl(iface)
+  print("\x1b[34;1mBoard\x1b[30;0m: %s"%board.port)
+
+  # test i/o
+  print("\x1b[34;1mRunning\x1b[30;0m: echo test")
+  iface.test_echo()
+
+  # retrieve architecture specifics
+  print("\x1b[34;1mRunning\x1b[30;0m: load config")
+  iface.load_config()
+  iface.print_config()
+
+  # test configuration stream
+  print("\x1b[34;1mRunning\x1b[30;0m: config test")
+  iface.test_config(iface.CFG_PLA_REGISTER_COUNT)
+
+try:
+  boards.check_arch()
+except htlib.ArchMismatch as e:
+  sys.stderr.write("\x1b[31;1mERROR\x1b[30;0m: %s\n"%e)
+  sys.exit(1)
+
+# manual tests use the first board
+iface=boards.boards[0].iface
+ctrl=htlib.PLAControl(iface)
 
 if fTestRandom: # automatically generate and test PLA configurations
   print(
     "\x1b[34;1mRunning\x1b[30;0m: automatic test (%i PLAs, %i points)"
     %(randomPLACount,randomInputCount))
-  random.seed(time.time())
-  with htlib.ProgressBar(0,randomPLACount) as pb_pla:
-    for i_pla in range(randomPLACount):
+
+  def stages(board):
+    iface=board.iface
+    ctrl=htlib.PLAControl(iface)
+
+    def configure(task):
       spec=ctrl.random_pla()
-      inter=ctrl.pla_compile(spec)
-      ctrl.config_pla(spec)
-      
-      with htlib.ProgressBar(0,randomInputCount,parent=pb_pla) as pb_input:
-        for i_input in range(randomInputCount):
-          x=ctrl.random_pla_input()
-          y_sim=inter.sim(x)
-          y_pla=iface.command(htlib.CMD_COMPUTE_PLA,x)
-          if y_sim!=y_pla:
-            sys.stderr.write(
-              "\r\x1b[31;1mERROR\x1b[30;0m: "
-              "mismatch (code: <%s>, x: %.8x, y_sim: %.8x, y_pla: %.8x)\n"
-              %(" ".join(spec.code),x,y_sim,y_pla))
-          pb_input.increment(1)
+      return (spec,ctrl.pla_compile(spec))
+
+    def produce(job):
+      (spec,inter)=job.config
+      xs=[ctrl.random_pla_input() for i in range(job.count)]
+      return htlib.VerificationRunner.chunk_t(job,xs,[inter.sim(x) for x in xs])
+
+    def execute(chunk):
+      if chunk.job.offset==0:
+        ctrl.config_pla(chunk.job.config[0])
+      return iface.command_many(htlib.CMD_COMPUTE_PLA,chunk.inputs)
+    
+    return (configure,produce,execute)
+
+  def on_mismatch(m):
+    (board,m)=m
+    sys.stderr.write(
+      "\r\x1b[31;1mERROR\x1b[30;0m: "
+      "mismatch on %s (code: <%s>, x: %.8x, y_sim: %.8x, y_pla: %.8x)\n"
+      %(board.port," ".join(m.chunk.job.config[0].code),
+        m.chunk.inputs[m.index],m.y_sim,m.y_phy))
+
+  with htlib.ProgressBar(0,randomPLACount*randomInputCount) as pb:
+    boards.run(
+      range(randomPLACount),stages,randomInputCount,inputBatchSize,
+      on_mismatch,lambda board,chunk: pb.increment(len(chunk.inputs)))
 
 
 elif fHardware: # compile a PLA, download to hardware and enter shell
@@ -114,7 +194,7 @@ elif fHardware: # compile a PLA, download to hardware and enter shell
     pass
 else: # compile a PLA, simulate it and enter sheller shell
   print("\x1b[34;1mRunning\x1b[30;0m: simulation test (manual)")
-  (and_plane,or_plane,sim)=ctrl.pla_compile(*pla_terms)
+  sim=ctrl.pla_compile(ctrl.specification_t(pla_terms)).sim
   try:
     while True:
       sys.stdout.write("> ")
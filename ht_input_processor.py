@@ -16,12 +16,20 @@ import sys
 import math
 import random
 import time
+import atexit
 
 # command-line argument handling
 randomConfigCount=1000
 randomInputCount=1000
-port="/dev/ttyUSB0"
+inputBatchSize=256
+ports=[] # one per board, -p may be given repeatedly
 baudrate=921600
+fnRecord=None
+fnReplay=[]
+seed=None
+metricsInterval=None
+fnMetrics=None
+framed=False
 
 try:
   s=None
@@ -31,37 +39,90 @@ try:
         if False: pass
         elif arg in { "-p", "--port" }: s="--port"
         elif arg in { "-b", "--baud" }: s="--baud"
+        elif arg=="--record": s="--record"
+        elif arg=="--replay": s="--replay"
+        elif arg=="--seed": s="--seed"
+        elif arg=="--metrics": s="--metrics"
+        elif arg=="--metrics-file": s="--metrics-file"
+        elif arg=="--framed": framed=True
         else:
           raise Exception("unknown switch: %s"%arg)
       else:
         raise Exception("stray argument: %s"%arg)
     elif s=="--port":
-      port=arg
+      ports.append(arg)
       s=None
     elif s=="--baud":
       baudrate=int(arg)
       s=None
+    elif s=="--record":
+      fnRecord=arg
+      s=None
+    elif s=="--replay":
+      fnReplay.append(arg)
+      s=None
+    elif s=="--seed":
+      seed=int(arg)
+      s=None
+    elif s=="--metrics":
+      metricsInterval=float(arg)
+      s=None
+    elif s=="--metrics-file":
+      fnMetrics=arg
+      s=None
 
 except Exception as e:
   sys.stderr.write("\x1b[31;1mERROR\x1b[30;0m: %s\n"%e)
   sys.exit(1)
 
-# execution
-iface=htlib.IFace(port,baudrate)
-ctrl=htlib.IDECControl(iface)
+if len(ports)==0:
+  ports.append("/dev/ttyUSB0")
+
+# a run is reproducible, and thus replayable, given its seed
+if seed==None:
+  seed=int(time.time())
+print("\x1b[34;1mSeed\x1b[30;0m: %i"%seed)
+random.seed(seed)
+
+# execution, the preliminary tests are run on every board
+boards=htlib.ShardedRunner.connect(ports,baudrate,fnRecord,fnReplay)
+
+# the hardware tests must be built with C_FRAMED set
+if framed:
+  for board in boards.boards:
+    board.iface.enable_framing()
+
+# print (and export) transport metrics periodically and before exiting
+if metricsInterval!=None or fnMetrics!=None:
+  reporter=htlib.MetricsReporter(
+    { board.port:board.iface.enable_metrics() for board in boards.boards },
+    metricsInterval if metricsInterval!=None else 10.0,fnMetrics)
+  atexit.register(reporter.stop)
+  reporter.start()
 
-# test i/o
-print("\x1b[34;1mRunning\x1b[30;0m: echo test")
-iface.test_echo()
+for board in boards.boards:
+  iface=board.iface
+  ctrl=htlib.IDECControl(iface)
+  print("\x1b[34;1mBoard\x1b[30;0m: %s"%board.port)
 
-# retrieve architecture specifics
-print("\x1b[34;1mRunning\x1b[30;0m: load config")
-iface.load_config()
-iface.print_config()
+  # test i/o
+  print("\x1b[34;1mRunning\x1b[30;0m: echo test")
+  iface.test_echo()
 
-# test configuration stream
-print("\x1b[34;1mRunning\x1b[30;0m: config test")
-iface.test_config(iface.CFG_INPUT_DECODER_REGISTER_COUNT)
+  # retrieve architecture specifics
+  print("\x1b[34;1mRunning\x1b[30;0m: load config")
+  iface.load_config()
+  iface.print_config()
+
+  # test configuration stream
+  print("\x1b[34;1mRunning\x1b[30;0m: config test")
+  iface.test_config(iface.CFG_INPUT_DECODER_REGISTER_COUNT)
+
+try:
+  boards.check_arch()
+except htlib.ArchMismatch as e:
+  sys.stderr.write("\x1b[31;1mERROR\x1b[30;0m: %s\n"%e)
+  sys.exit(1)
 
 def fmt_bv(x,cb):
   bv=("{0:%ib}"%cb).format(x)
@@ -72,26 +133,39 @@ def fmt_bv(x,cb):
 print(
   "\x1b[34;1mRunning\x1b[30;0m: automatic test (%i configs, %i points)"
   %(randomConfigCount,randomInputCount))
-random.seed(time.time())
-with htlib.ProgressBar(0,randomConfigCount) as pb_idec:
-  for i_cfg in range(randomConfigCount):
+
+def stages(board):
+  iface=board.iface
+  ctrl=htlib.IDECControl(iface)
+
+  def configure(task):
     spec=ctrl.random_idec()
-    inter=ctrl.idec_compile(spec)
-    ctrl.config_idec(spec)
-    
-    with htlib.ProgressBar(0,randomInputCount,parent=pb_idec) as pb_input:
-      for i_input in range(randomInputCount):
-        x=ctrl.random_idec_input()
-        y_sim=inter.sim(x)
-        y_idec=iface.commandi(htlib.CMD_COMPUTE_IDEC,x)
-        if y_sim!=y_idec:
-          sys.stderr.write(
-            "\r\x1b[31;1mERROR\x1b[30;0m: "
-            "mismatch (code: <%s>)\n  x:      %s\n  y_sim:  %s\n  y_idec: %s\n"
-            %(" ".join([str(v) for v in spec.choices]),
-            fmt_bv(x,iface.INPUT_WORDS*iface.WORD_SIZE),
-            fmt_bv(y_sim,iface.SELECTOR_BITS+iface.INTERPOLATION_BITS),
-            fmt_bv(y_idec,iface.SELECTOR_BITS+iface.INTERPOLATION_BITS)))
-        pb_input.increment(1)
+    return (spec,ctrl.idec_compile(spec))
+
+  def produce(job):
+    (spec,inter)=job.config
+    xs=[ctrl.random_idec_input() for i in range(job.count)]
+    return htlib.VerificationRunner.chunk_t(job,xs,[inter.sim(x) for x in xs])
+
+  def execute(chunk):
+    if chunk.job.offset==0:
+      ctrl.config_idec(chunk.job.config[0])
+    return iface.commandi_many(htlib.CMD_COMPUTE_IDEC,chunk.inputs)
+  
+  return (configure,produce,execute)
 
+def on_mismatch(m):
+  (board,m)=m
+  sys.stderr.write(
+    "\r\x1b[31;1mERROR\x1b[30;0m: "
+    "mismatch on %s (code: <%s>)\n"
+    "  x:      %s\n  y_sim:  %s\n  y_idec: %s\n"
+    %(board.port," ".join([str(v) for v in m.chunk.job.config[0].choices]),
+    fmt_bv(m.chunk.inputs[m.index],iface.INPUT_WORDS*iface.WORD_SIZE),
+    fmt_bv(m.y_sim,iface.SELECTOR_BITS+iface.INTERPOLATION_BITS),
+    fmt_bv(m.y_phy,iface.SELECTOR_BITS+iface.INTERPOLATION_BITS)))
 
+with htlib.ProgressBar(0,randomConfigCount*randomInputCount) as pb:
+  boards.run(
+    range(randomConfigCount),stages,randomInputCount,inputBatchSize,
+    on_mismatch,lambda board,chunk: pb.increment(len(chunk.inputs)))
@@ -16,10 +16,18 @@ import sys
 import math
 import random
 import time
+import atexit
 # command-line argument handling
 randomInputCount=100000
-port="/dev/ttyUSB0"
+inputBatchSize=256
+ports=[] # one per board, -p may be given repeatedly
 baudrate=921600
+fnRecord=None
+fnReplay=[]
+seed=None
+metricsInterval=None
+fnMetrics=None
+framed=False
 
 try:
   s=None
@@ -29,66 +37,132 @@ try:
         if False: pass
         elif arg in { "-p", "--port" }: s="--port"
         elif arg in { "-b", "--baud" }: s="--baud"
+        elif arg=="--record": s="--record"
+        elif arg=="--replay": s="--replay"
+        elif arg=="--seed": s="--seed"
+        elif arg=="--metrics": s="--metrics"
+        elif arg=="--metrics-file": s="--metrics-file"
+        elif arg=="--framed": framed=True
         else:
           raise Exception("unknown switch: %s"%arg)
       else:
         raise Exception("stray argument: %s"%arg)
     elif s=="--port":
-      port=arg
+      ports.append(arg)
       s=None
     elif s=="--baud":
       baudrate=int(arg)
       s=None
+    elif s=="--record":
+      fnRecord=arg
+      s=None
+    elif s=="--replay":
+      fnReplay.append(arg)
+      s=None
+    elif s=="--seed":
+      seed=int(arg)
+      s=None
+    elif s=="--metrics":
+      metricsInterval=float(arg)
+      s=None
+    elif s=="--metrics-file":
+      fnMetrics=arg
+      s=None
 
 except Exception as e:
   sys.stderr.write("\x1b[31;1mERROR\x1b[30;0m: %s\n"%e)
   sys.exit(1)
 
-# execution
-iface=htlib.IFace(port,baudrate)
-ctrl=htlib.InterControl(iface)
+if len(ports)==0:
+  ports.append("/dev/ttyUSB0")
+
+# a run is reproducible, and thus replayable, given its seed
+if seed==None:
+  seed=int(time.time())
+print("\x1b[34;1mSeed\x1b[30;0m: %i"%seed)
+random.seed(seed)
+
+# execution, the preliminary tests are run on every board
+boards=htlib.ShardedRunner.connect(ports,baudrate,fnRecord,fnReplay)
+
+# the hardware tests must be built with C_FRAMED set
+if framed:
+  for board in boards.boards:
+    board.iface.enable_framing()
 
+# print (and export) transport metrics periodically and before exiting
+if metricsInterval!=None or fnMetrics!=None:
+  reporter=htlib.MetricsReporter(
+    { board.port:board.iface.enable_metrics() for board in boards.boards },
+    metricsInterval if metricsInterval!=None else 10.0,fnMetrics)
+  atexit.register(reporter.stop)
+  reporter.start()
 
-# test i/o
-print("\x1b[34;1mRunning\x1b[30;0m: echo test")
-iface.test_echo()
+for board in boards.boards:
+  iface=board.iface
+  ctrl=htlib.InterControl(iface)
+  print("\x1b[34;1mBoard\x1b[30;0m: %s"%board.port)
 
-# retrieve architecture specifics
-print("\x1b[34;1mRunning\x1b[30;0m: load config")
-iface.load_config()
-iface.print_config()
+  # test i/o
+  print("\x1b[34;1mRunning\x1b[30;0m: echo test")
+  iface.test_echo()
+
+  # retrieve architecture specifics
+  print("\x1b[34;1mRunning\x1b[30;0m: load config")
+  iface.load_config()
+  iface.print_config()
+
+try:
+  boards.check_arch()
+except htlib.ArchMismatch as e:
+  sys.stderr.write("\x1b[31;1mERROR\x1b[30;0m: %s\n"%e)
+  sys.exit(1)
 
 # automatically generate and test decoder configurations
 print(
   "\x1b[34;1mRunning\x1b[30;0m: automatic test (%i points)"
   %(randomInputCount))
-random.seed(time.time())
 inter=sim=ctrl.inter_compile()
-with htlib.ProgressBar(0,randomInputCount) as pb_input:
-  for i in range(randomInputCount):
-    (selector,interpolator,base,incline)=ctrl.random_inter_input()
-    y_sim=inter.sim(selector,interpolator,base,incline)
-    y_inter=iface.command_inter(
-      htlib.CMD_COMPUTE_INTER,selector,interpolator,base,incline)
-
-    if y_sim!=y_inter:
-      sys.stderr.write(
-        "\r\x1b[31;1mERROR\x1b[30;0m: "
-        "mismatch:\n"
-        "  selector:     %s (%s)\n"
-        "  interpolator: %s (%s)\n"
-        "  base:         %s (%s)\n"
-        "  incline:      %s (%s)\n"
-        "  y_sim:        %s (%s)\n"
-        "  y_idec:       %s (%s)\n"
-        %(
-          ("{0:%ib}"%iface.SELECTOR_BITS).format(selector),selector,
-          ("{0:%ib}"%iface.INTERPOLATION_BITS).format(interpolator),interpolator,
-          ("{0:%ib}"%iface.BASE_BITS).format(base),base,
-          ("{0:%ib}"%iface.INCLINE_BITS).format(incline),incline,
-          ("{0:%ib}"%iface.WORD_SIZE).format(y_sim),y_sim,
-          ("{0:%ib}"%iface.WORD_SIZE).format(y_inter),y_inter
-          ))
-    pb_input.increment(1)
 
+def stages(board):
+  iface=board.iface
+  ctrl=htlib.InterControl(iface)
+
+  def produce(job):
+    xs=[ctrl.random_inter_input() for i in range(job.count)]
+    return htlib.VerificationRunner.chunk_t(
+      job,xs,[inter.sim(*x) for x in xs])
+
+  def execute(chunk):
+    return iface.command_inter_many(htlib.CMD_COMPUTE_INTER,chunk.inputs)
+  
+  return (lambda task: None,produce,execute)
+
+def on_mismatch(m):
+  (board,m)=m
+  (selector,interpolator,base,incline)=m.chunk.inputs[m.index]
+  sys.stderr.write(
+    "\r\x1b[31;1mERROR\x1b[30;0m: "
+    "mismatch on %s:\n"
+    "  selector:     %s (%s)\n"
+    "  interpolator: %s (%s)\n"
+    "  base:         %s (%s)\n"
+    "  incline:      %s (%s)\n"
+    "  y_sim:        %s (%s)\n"
+    "  y_idec:       %s (%s)\n"
+    %(
+      board.port,
+      ("{0:%ib}"%iface.SELECTOR_BITS).format(selector),selector,
+      ("{0:%ib}"%iface.INTERPOLATION_BITS).format(interpolator),interpolator,
+      ("{0:%ib}"%iface.BASE_BITS).format(base),base,
+      ("{0:%ib}"%iface.INCLINE_BITS).format(incline),incline,
+      ("{0:%ib}"%iface.WORD_SIZE).format(m.y_sim),m.y_sim,
+      ("{0:%ib}"%iface.WORD_SIZE).format(m.y_phy),m.y_phy
+      ))
 
+# shard the inputs into tasks of one chunk each
+with htlib.ProgressBar(0,randomInputCount) as pb:
+  boards.run(
+    range(0,randomInputCount,inputBatchSize),stages,inputBatchSize,
+    inputBatchSize,on_mismatch,
+    lambda board,chunk: pb.increment(len(chunk.inputs)))
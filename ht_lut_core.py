@@ -17,6 +17,7 @@ import sys
 import math
 import random
 import time
+import atexit
 
 def choices_compile(*args):
   
@@ -52,9 +53,16 @@ def config_hw(*args):
 # command-line argument handling
 randomConfigCount=1000
 randomInputCount=1000
+inputBatchSize=256
 configTestCount=10
-port="/dev/ttyUSB0"
+ports=[] # one per board, -p may be given repeatedly
 baudrate=921600
+fnRecord=None
+fnReplay=[]
+seed=None
+metricsInterval=None
+fnMetrics=None
+framed=False
 
 try:
   s=None
@@ -64,96 +72,155 @@ try:
         if False: pass
         elif arg in { "-p", "--port" }: s="--port"
         elif arg in { "-b", "--baud" }: s="--baud"
+        elif arg=="--record": s="--record"
+        elif arg=="--replay": s="--replay"
+        elif arg=="--seed": s="--seed"
+        elif arg=="--metrics": s="--metrics"
+        elif arg=="--metrics-file": s="--metrics-file"
+        elif arg=="--framed": framed=True
         else:
           raise Exception("unknown switch: %s"%arg)
       else:
         raise Exception("stray argument: %s"%arg)
     elif s=="--port":
-      port=arg
+      ports.append(arg)
       s=None
     elif s=="--baud":
       baudrate=int(arg)
       s=None
+    elif s=="--record":
+      fnRecord=arg
+      s=None
+    elif s=="--replay":
+      fnReplay.append(arg)
+      s=None
+    elif s=="--seed":
+      seed=int(arg)
+      s=None
+    elif s=="--metrics":
+      metricsInterval=float(arg)
+      s=None
+    elif s=="--metrics-file":
+      fnMetrics=arg
+      s=None
 
 except Exception as e:
   sys.stderr.write("\x1b[31;1mERROR\x1b[30;0m: %s\n"%e)
   sys.exit(1)
 
-# execution
-iface=htlib.IFace(port,baudrate)
-ctrl=htlib.LUTCoreControl(iface)
-
-# test i/o
-print("\x1b[34;1mRunning\x1b[30;0m: echo test")
-iface.test_echo()
-
-# retrieve architecture specifics
-print("\x1b[34;1mRunning\x1b[30;0m: load config")
-iface.load_config()
-iface.print_config()
-
-# status test
-print("\x1b[34;1mRunning\x1b[30;0m: status test")
-ctrl.core_reset()
-ctrl.core_assert(raw=0)
-
-for i in range(configTestCount):
-  sys.stdout.write("  %i "%i)
-  n=random.randint(1,iface.CFG_REGISTER_COUNT);
-  for j in range(n):
-    iface.command0(htlib.CMD_CORE_CFG,0xaffedead)
-    ctrl.core_assert(raw=(j+1)<<8)
-    sys.stdout.write("\r  %i/%i: %.2f%%"%(i+1,configTestCount,(j+1/n)*100.0))
+if len(ports)==0:
+  ports.append("/dev/ttyUSB0")
+
+# a run is reproducible, and thus replayable, given its seed
+if seed==None:
+  seed=int(time.time())
+print("\x1b[34;1mSeed\x1b[30;0m: %i"%seed)
+random.seed(seed)
+
+# execution, the preliminary tests are run on every board
+boards=htlib.ShardedRunner.connect(ports,baudrate,fnRecord,fnReplay)
+
+# the hardware tests must be built with C_FRAMED set
+if framed:
+  for board in boards.boards:
+    board.iface.enable_framing()
+
+# print (and export) transport metrics periodically and before exiting
+if metricsInterval!=None or fnMetrics!=None:
+  reporter=htlib.MetricsReporter(
+    { board.port:board.iface.enable_metrics() for board in boards.boards },
+    metricsInterval if metricsInterval!=None else 10.0,fnMetrics)
+  atexit.register(reporter.stop)
+  reporter.start()
+
+for board in boards.boards:
+  iface=board.iface
+  ctrl=htlib.LUTCoreControl(iface)
+  print("\x1b[34;1mBoard\x1b[30;0m: %s"%board.port)
+
+  # test i/o
+  print("\x1b[34;1mRunning\x1b[30;0m: echo test")
+  iface.test_echo()
+
+  # retrieve architecture specifics
+  print("\x1b[34;1mRunning\x1b[30;0m: load config")
+  iface.load_config()
+  iface.print_config()
+
+  # status test
+  print("\x1b[34;1mRunning\x1b[30;0m: status test")
   ctrl.core_reset()
   ctrl.core_assert(raw=0)
-sys.stdout.write("\r")
 
-for j in range(iface.CFG_REGISTER_COUNT):
-  iface.command0(htlib.CMD_CORE_CFG,0xaffedead)
+  for i in range(configTestCount):
+    sys.stdout.write("  %i "%i)
+    n=random.randint(1,iface.CFG_REGISTER_COUNT);
+    for j in range(n):
+      iface.command0(htlib.CMD_CORE_CFG,0xaffedead)
+      ctrl.core_assert(raw=(j+1)<<8)
+      sys.stdout.write("\r  %i/%i: %.2f%%"%(i+1,configTestCount,(j+1/n)*100.0))
+    ctrl.core_reset()
+    ctrl.core_assert(raw=0)
+  sys.stdout.write("\r")
 
-ctrl.core_assert(raw=(iface.CFG_REGISTER_COUNT<<8)|0x00)
-ctrl.core_exec(12,True)
-ctrl.core_assert(raw=(iface.CFG_REGISTER_COUNT<<8)|0x00)
-print("\n  delay: %s"%(iface.command(htlib.CMD_DIAG_CLOCK_COUNTER)))
+  for j in range(iface.CFG_REGISTER_COUNT):
+    iface.command0(htlib.CMD_CORE_CFG,0xaffedead)
+
+  ctrl.core_assert(raw=(iface.CFG_REGISTER_COUNT<<8)|0x00)
+  ctrl.core_exec(12,True)
+  ctrl.core_assert(raw=(iface.CFG_REGISTER_COUNT<<8)|0x00)
+  print("\n  delay: %s"%(iface.command(htlib.CMD_DIAG_CLOCK_COUNTER)))
 
-iface.command0(htlib.CMD_CORE_CFG,0xaffedead)
-ctrl.core_assert(raw=(iface.CFG_REGISTER_COUNT<<8)|0x01)
-ctrl.core_exec_begin(12)
-ctrl.core_assert(raw=(iface.CFG_REGISTER_COUNT<<8)|0x03)
+  iface.command0(htlib.CMD_CORE_CFG,0xaffedead)
+  ctrl.core_assert(raw=(iface.CFG_REGISTER_COUNT<<8)|0x01)
+  ctrl.core_exec_begin(12)
+  ctrl.core_assert(raw=(iface.CFG_REGISTER_COUNT<<8)|0x03)
 
-ctrl.core_reset()
-ctrl.core_assert(raw=0)
+  ctrl.core_reset()
+  ctrl.core_assert(raw=0)
 
+try:
+  boards.check_arch()
+except htlib.ArchMismatch as e:
+  sys.stderr.write("\x1b[31;1mERROR\x1b[30;0m: %s\n"%e)
+  sys.exit(1)
 
 # automatically generate and test decoder configurations
 print(
   "\x1b[34;1mRunning\x1b[30;0m: automatic test (%i configs, %i points)"
   %(randomConfigCount,randomInputCount))
-random.seed(time.time())
-with htlib.ProgressBar(0,randomConfigCount) as pb_cfg:
-  for i_cfg in range(randomConfigCount):
-    specification=ctrl.random_core()
-    intermediate=ctrl.core_compile(specification)
-    ctrl.core_reset()
-    ctrl.config_core(specification)
-
-    with htlib.ProgressBar(0,randomInputCount,parent=pb_cfg) as pb_input:
-      for i_input in range(randomInputCount):
-        x=ctrl.random_core_input()
-        y_sim=intermediate.sim(x)
-        y_phy=ctrl.core_exec(x)
-        #y_idec=iface.command
-        if y_sim!=y_phy:
-          # todo: error output
-          sys.stderr.write(
-            "\r\x1b[31;1mERROR\x1b[30;0m: "
-            "mismatch (x: 0x%x, y_sim=0x%x, y_phy=0x%x)\n"
-            %(x,y_sim,y_phy))
-        elif False:
-          sys.stderr.write(
-            "\r\x1b[32;1mSUCCESS\x1b[30;0m: "
-            "(x: 0x%x, y_sim=0x%x, y_phy=0x%x)\n"
-            %(x,y_sim,y_phy))
-        pb_input.increment(1)
 
+def stages(board):
+  iface=board.iface
+  ctrl=htlib.LUTCoreControl(iface)
 
+  def configure(task):
+    specification=ctrl.random_core()
+    return (specification,ctrl.core_compile(specification))
+
+  def produce(job):
+    (specification,intermediate)=job.config
+    xs=ctrl.random_core_inputs(job.count)
+    return htlib.VerificationRunner.chunk_t(
+      job,xs,intermediate.sim_sliced(xs))
+
+  def execute(chunk):
+    if chunk.job.offset==0:
+      ctrl.core_reset()
+      ctrl.config_core(chunk.job.config[0])
+    return ctrl.core_exec_many(chunk.inputs)
+  
+  return (configure,produce,execute)
+
+def on_mismatch(m):
+  # todo: error output
+  sys.stderr.write(
+    "\r\x1b[31;1mERROR\x1b[30;0m: "
+    "mismatch on %s (x: 0x%x, y_sim=0x%x, y_phy=0x%x)\n"
+    %(m.board.port,m.mismatch.chunk.inputs.value(m.mismatch.index),
+      m.mismatch.y_sim,m.mismatch.y_phy))
+
+with htlib.ProgressBar(0,randomConfigCount*randomInputCount) as pb:
+  boards.run(
+    range(randomConfigCount),stages,randomInputCount,inputBatchSize,
+    on_mismatch,lambda board,chunk: pb.increment(len(chunk.inputs)))
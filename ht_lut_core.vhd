@@ -29,6 +29,8 @@ architecture implementation of ht_lut_core is
   signal tx_valid : std_logic;
   signal tx_ready : std_logic;
   signal tx_data  : std_logic_vector(7 downto 0);
+  signal rx_ready : std_logic;
+  signal sm_idle : std_logic;
 
   type state_t is (
     IDLE,
@@ -89,29 +91,26 @@ begin
   );
 
 
-  rx : uart_receiver generic map (
+  link : entity work.uart_link generic map (
     CLK_FREQ => C_CLK_FREQ,
-    BAUD_RATE => C_BAUD_RATE
+    BAUD_RATE => C_BAUD_RATE,
+    FRAMED => C_FRAMED
   ) port map (
     clk => clk,
     rst => rst,
     rxd => rxd,
-
-    valid => rx_valid,
-    do    => rx_data
-  );
-
-  tx : uart_transmitter generic map (
-    CLK_FREQ => C_CLK_FREQ,
-    BAUD_RATE => C_BAUD_RATE
-  ) port map (
-    clk => clk,
-    rst => rst,
     txd => txd,
-    di => tx_data,
-    valid => tx_valid,
-    ready => tx_ready
+
+    rx_valid => rx_valid,
+    rx_data => rx_data,
+    rx_ready => rx_ready,
+    sm_idle => sm_idle,
+    tx_valid => tx_valid,
+    tx_ready => tx_ready,
+    tx_data => tx_data
   );
+  rx_ready <= '1' when (state=IDLE) or (state=RX_WORD) else '0';
+  sm_idle <= '1' when state=IDLE else '0';
 
   led <=
     x"81" when state=IDLE else
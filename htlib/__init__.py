@@ -1,9 +1,23 @@
 from .iface import *
 from .error import *
+from .metrics import *
+from .framing import *
+from .arch import *
+from .async_iface import *
 from .util import *
+from .bitslice import *
+from .columns import *
+from .intermediate import *
+from .cache import *
+from .profiler import *
+from .bitstream import *
+from .compression import *
 from .input_decoder import *
 from .address_translator import *
 from .lut import *
 from .interpolator import *
 from .lut_core import *
+from .runner import *
+from .emulator import *
+from .replay import *
 from .visualizer import *
@@ -1,7 +1,240 @@
 from .iface import *
+from .util import require_numpy
+from .intermediate import Intermediate
 import random
 from collections import namedtuple
 
+## Compiled PLA.
+#
+# Holds the number of selector bits along with the and plane rows and or plane
+# columns, which is the information required to configure a hardware
+# instantiation, as well as methods for simulating that PLA. `sim_batch`
+# simulates an array of selector values at once, returning a uint64 array of
+# addresses. `sim_sliced` evaluates a bit-sliced list of selectors (one slice
+# per selector bit) given the slice of all ones, returning the address slices.
+#
+# PLAs with up to TABLE_MAX_SELECTOR_BITS selector bits are tabulated for all
+# possible selectors, wider ones are evaluated using the tables generated by
+# compile_eval. Both are built on first use.
+class PLAIntermediate(Intermediate):
+  __slots__=(
+    "selector_bits","and_plane","or_plane",
+    "_eval","_table","_numpy_tables","_sliced_plan")
+  fields=("selector_bits","and_plane","or_plane")
+
+  ## Largest number of selector bits for which the PLA is simulated using a
+  # full selector-to-address table. Wider PLAs are evaluated bit-parallel.
+  TABLE_MAX_SELECTOR_BITS=12
+
+  ## Tables for evaluating all interconnects of a PLA in parallel.
+  #
+  # `alive` is the set of interconnects whose and plane row can be satisfied
+  # at all. `kill[k][b]` is the set of interconnects whose product is false
+  # if byte k of the selector equals b. `out` is a list of pairs (shift, tab)
+  # where `tab[b]` holds the or plane outputs driven by the interconnects
+  # b<<shift.
+  eval_t=namedtuple("pla_eval_t","alive kill out")
+  # locate the type by its attribute, as required for pickling
+  eval_t.__qualname__="PLAIntermediate.eval_t"
+
+  ## Transposes and and or planes into an instance of eval_t.
+  def compile_eval(s):
+    sel_bits=s.selector_bits
+
+    alive=0
+    need0=[0]*sel_bits
+    need1=[0]*sel_bits
+    for i,v in enumerate(s.and_plane):
+      if (v>>(2*sel_bits))!=0: continue
+      alive|=1<<i
+      for t in range(sel_bits):
+        if v&(1<<t): need0[t]|=1<<i
+        if v&(1<<(t+sel_bits)): need1[t]|=1<<i
+
+    kill=[]
+    for k in range(0,sel_bits,8):
+      tab=[0]*256
+      for b in range(256):
+        m=0
+        for t in range(k,min(k+8,sel_bits)):
+          m|=need0[t] if b&(1<<(t-k)) else need1[t]
+        tab[b]=m
+      kill.append(tab)
+
+    return PLAIntermediate.eval_t(alive,kill,s.compile_out())
+
+  ## Computes the `out` tables of eval_t from the or plane.
+  def compile_out(s):
+    row_out=[
+      sum([1<<j for j,v in enumerate(s.or_plane) if v&(1<<i)])
+      for i in range(len(s.and_plane))]
+    out=[]
+    for shift in range(0,len(s.and_plane),8):
+      rows=row_out[shift:shift+8]
+      if not any(rows): continue
+      tab=[0]*256
+      for b in range(1,256):
+        low=(b&-b).bit_length()-1
+        tab[b]=tab[b&(b-1)]|(rows[low] if low<len(rows) else 0)
+      out.append((shift,tab))
+    return out
+
+  ## Replaces and plane row i, updating the tables built so far.
+  def set_and_row(s,i,v):
+    sel_bits=s.selector_bits
+    s.and_plane[i]=v
+    
+    if s._eval!=None:
+      (alive,kill,out)=s._eval
+      bit=1<<i
+      valid=(v>>(2*sel_bits))==0
+      alive=alive|bit if valid else alive&~bit
+      for k,tab in enumerate(kill):
+        # selector bits of byte k for which the product requires 0 or 1
+        need0=(v>>(8*k))&0xff&((1<<(sel_bits-8*k))-1)
+        need1=(v>>(sel_bits+8*k))&0xff&((1<<(sel_bits-8*k))-1)
+        for b in range(256):
+          if valid and ((b&need0) or (~b&need1)):
+            tab[b]|=bit
+          else:
+            tab[b]&=~bit
+      s._eval=PLAIntermediate.eval_t(alive,kill,out)
+    
+    if s._sliced_plan!=None:
+      (literals,or_rows)=s._sliced_plan
+      literals.pop(i,None)
+      if (v>>(2*sel_bits))==0:
+        literals[i]=(
+          [(t,0) for t in range(sel_bits) if (v>>t)&1]+
+          [(t,1) for t in range(sel_bits) if (v>>(t+sel_bits))&1])
+      s._sliced_plan=(literals,[
+        [i for i in sorted(literals) if c&(1<<i)]
+        for c in s.or_plane])
+    
+    s._update_tables()
+
+  ## Replaces or plane column j, updating the tables built so far.
+  def set_or_column(s,j,v):
+    s.or_plane[j]=v
+
+    if s._eval!=None:
+      s._eval=s._eval._replace(out=s.compile_out())
+    
+    if s._sliced_plan!=None:
+      (literals,or_rows)=s._sliced_plan
+      or_rows[j]=[i for i in sorted(literals) if v&(1<<i)]
+    
+    s._update_tables()
+
+  def _update_tables(s):
+    if s._table!=None:
+      s._table=[s.evaluate(sel) for sel in range(1<<s.selector_bits)]
+    s._numpy_tables=None
+
+  ## Evaluation tables of this PLA, an instance of eval_t.
+  @property
+  def evaluation(s):
+    if s._eval==None:
+      s._eval=s.compile_eval()
+    return s._eval
+  
+  ## Selector-to-address table of this PLA or None if it has more than
+  # TABLE_MAX_SELECTOR_BITS selector bits.
+  @property
+  def table(s):
+    if s._table==None:
+      if s.selector_bits>PLAIntermediate.TABLE_MAX_SELECTOR_BITS:
+        return None
+      s._table=[s.evaluate(sel) for sel in range(1<<s.selector_bits)]
+    return s._table
+
+  ## Evaluates the PLA bit-parallel for a selector of at most selector_bits
+  # bits.
+  def evaluate(s,sel):
+    (alive,kill,out)=s.evaluation
+    killed=0
+    for k,tab in enumerate(kill):
+      killed|=tab[(sel>>(8*k))&0xff]
+    and_eval=alive&~killed
+    r=0
+    for shift,tab in out:
+      r|=tab[(and_eval>>shift)&0xff]
+    return r
+
+  def sim(s,sel):
+    table=s._table if s._table!=None else s.table
+    if table!=None:
+      return table[sel&((1<<s.selector_bits)-1)]
+    return s.evaluate(sel&((1<<s.selector_bits)-1))
+
+  def sim_batch(s,sel):
+    np=require_numpy()
+    sel=np.asarray(sel,dtype=np.uint64)&np.uint64((1<<s.selector_bits)-1)
+    
+    if s._numpy_tables is None:
+      if s.table!=None:
+        s._numpy_tables=np.array(s.table,dtype=np.uint64)
+      else:
+        # interconnects are processed in chunks of 64
+        (alive,kill,out)=s.evaluation
+        s._numpy_tables=[
+          (
+            np.uint64((alive>>c)&((1<<64)-1)),
+            [
+              np.array([(v>>c)&((1<<64)-1) for v in tab],dtype=np.uint64)
+              for tab in kill],
+            [
+              (np.uint64(shift-c),np.array(tab,dtype=np.uint64))
+              for shift,tab in out if c<=shift<c+64])
+          for c in range(0,len(s.and_plane),64)]
+    
+    if s.table!=None:
+      return s._numpy_tables[sel]
+    
+    sel_bytes=[
+      ((sel>>np.uint64(8*k))&np.uint64(0xff)).astype(np.intp)
+      for k in range(len(s.evaluation.kill))]
+    r=np.zeros(len(sel),dtype=np.uint64)
+    for alive_c,kill_c,out_c in s._numpy_tables:
+      if not out_c: continue
+      killed=np.zeros(len(sel),dtype=np.uint64)
+      for k,tab in enumerate(kill_c):
+        killed|=tab[sel_bytes[k]]
+      and_eval=alive_c&~killed
+      for shift,tab in out_c:
+        r|=tab[((and_eval>>shift)&np.uint64(0xff)).astype(np.intp)]
+    return r
+
+  def sim_sliced(s,sel,ones):
+    if s._sliced_plan==None:
+      # literals (selector bit, expected value) of each satisfiable and plane
+      # row and the rows driving each output bit
+      sel_bits=s.selector_bits
+      literals={
+        i:[(t,0) for t in range(sel_bits) if (v>>t)&1]+
+          [(t,1) for t in range(sel_bits) if (v>>(t+sel_bits))&1]
+        for i,v in enumerate(s.and_plane) if (v>>(2*sel_bits))==0 }
+      or_rows=[
+        [i for i in sorted(literals) if v&(1<<i)]
+        for v in s.or_plane]
+      s._sliced_plan=(literals,or_rows)
+    (literals,or_rows)=s._sliced_plan
+
+    inv=[ones^v for v in sel]
+    rows={}
+    r=[]
+    for driving in or_rows:
+      y=0
+      for i in driving:
+        if i not in rows:
+          v=ones
+          for t,value in literals[i]:
+            v&=sel[t] if value else inv[t]
+          rows[i]=v
+        y|=rows[i]
+      r.append(y)
+    return r
+
 
 ## Control class corresponding to ht_address_translator.
 #
@@ -13,10 +246,7 @@ class PLAControl(IFaceRef):
   specification_t=namedtuple("pla_specification_t","code")
   
   ## Encapsulates an intermediate representation of a PLA.
-  #
-  # Contains information required to configure a hardware instantiation as
-  # well as a method for simulating that PLA.
-  intermediate_t=namedtuple("pla_intermediate_t","and_plane or_plane sim")
+  intermediate_t=PLAIntermediate
   
   ## generates a random PLA specification.
   #
@@ -61,13 +291,30 @@ class PLAControl(IFaceRef):
         term[int(c)]=1
     return sum([v*(1<<i) for i,v in enumerate(term)])
 
+  ## Formats an and-plane row as product, the inverse of parse_product.
+  #
+  # Raises TestFailure if the product references selector bits beyond 9, which
+  # cannot be represented by single digits, or cannot be satisfied.
+  def format_product(s,term):
+    sel_bits=s.iface.SELECTOR_BITS
+    if term>>(2*sel_bits)!=0:
+      raise TestFailure("cannot represent product: invalid term %x"%term)
+    pos=[i for i in range(sel_bits) if term&(1<<(i+sel_bits))]
+    neg=[i for i in range(sel_bits) if term&(1<<i)]
+    if max(pos+neg+[0])>9:
+      raise TestFailure(
+        "cannot represent product: selector bit %i"%max(pos+neg))
+    return "%s!%s"%(
+      "".join([str(i) for i in pos]),
+      "".join([str(i) for i in neg]))
+
   ## Compiles a list of products (one for each output bit) into a PLA
   #
   # Returns the and plane rows, or plane columns and a simulation function of
   # signature integer -> integer.
   def pla_compile(s,spec):
     if len(spec.code)>s.iface.SEGMENT_BITS:
-      raise htlib.TestFailure("cannot represent PLA: too many output bits")
+      raise TestFailure("cannot represent PLA: too many output bits")
 
     arg_products=[
       [s.parse_product(v) for v in arg.split(",")]
@@ -76,7 +323,7 @@ class PLAControl(IFaceRef):
     products={ p for p in sum(arg_products,[]) }
     
     if len(products)>s.iface.PLA_INTERCONNECTS:
-      raise htlib.TestFailure("cannot represent PLA: too many products needd")
+      raise TestFailure("cannot represent PLA: too many products needd")
     
     product_list=list(sorted(products))
     products_map={ p:i for i,p in enumerate(product_list) }
@@ -93,25 +340,31 @@ class PLAControl(IFaceRef):
 
     return s.pla_compile_raw(and_plane,or_plane)
     
+  ## Recovers the specification of a compiled PLA, the inverse of 
+  # pla_compile.
+  #
+  # Raises TestFailure if the PLA has an output bit, other than trailing ones,
+  # without products. Note that pla_compile only yields the same planes if the
+  # and plane holds the sorted, unique products followed by zeros.
+  def pla_specification(s,inter):
+    or_plane=list(inter.or_plane)
+    while or_plane and or_plane[-1]==0:
+      or_plane.pop()
+    
+    code=[]
+    for j,v in enumerate(or_plane):
+      if v==0:
+        raise TestFailure(
+          "cannot represent PLA: output bit %i has no products"%j)
+      code.append(",".join([
+        s.format_product(p) for i,p in enumerate(inter.and_plane) 
+        if v&(1<<i)]))
+    return PLAControl.specification_t(code)
+
   ## Final PLA compilation step operating on and and or planes instead of 
   # string-based specifications.
   def pla_compile_raw(s,and_plane,or_plane):
-    def sim(sel):
-      bits=[ 
-        0 if (sel&(1<<i)) else 1
-        for i in range(s.iface.SELECTOR_BITS)]
-      bits+=[ 
-        1 if (sel&(1<<i)) else 0
-        for i in range(s.iface.SELECTOR_BITS)]
-      
-      sel_ex=sum([ bit<<i for i,bit in enumerate(bits) ])
-      and_eval=sum([1<<i if (sel_ex&v)==v else 0 for i,v in enumerate(and_plane)])
-      or_eval=sum([1<<i if (and_eval&v)!=0 else 0 for i,v in enumerate(or_plane)])
-
-      return or_eval
-
-
-    return PLAControl.intermediate_t(and_plane,or_plane,sim)
+    return PLAIntermediate(s.iface.SELECTOR_BITS,and_plane,or_plane)
 
 
   ## Translates an and and or plane as computed by pla_compile into a stream of
@@ -121,36 +374,33 @@ class PLAControl(IFaceRef):
   # transmitted in reversed order.
   # @input inter intermediate representation of type intermediate_t.
   def pla_words(s,inter):
-    and_words=math.ceil(s.iface.SELECTOR_BITS*2/s.iface.CFG_WORD_SIZE)
-    or_words=math.ceil(s.iface.PLA_INTERCONNECTS/s.iface.CFG_WORD_SIZE)
-    and_plane=sum([
-      [ 
-        (v>>(s.iface.CFG_WORD_SIZE*shamt))&((1<<s.iface.CFG_WORD_SIZE)-1) 
-        for shamt in reversed(range(and_words)) ]
+    arch=s.iface.arch
+    and_words=arch.CFG_PLA_AND_REGISTERS_PER_ROW
+    or_words=arch.CFG_PLA_OR_REGISTERS_PER_COLUMN
+    and_plane=[
+      (v>>(arch.CFG_WORD_SIZE*shamt))&((1<<arch.CFG_WORD_SIZE)-1) 
       for v in inter.and_plane
-    ],[])
-    or_plane=sum([
-      [ 
-        (v>>(s.iface.CFG_WORD_SIZE*shamt))&((1<<s.iface.CFG_WORD_SIZE)-1) 
-        for shamt in reversed(range(and_words)) ]
+      for shamt in reversed(range(and_words)) ]
+    or_plane=[
+      (v>>(arch.CFG_WORD_SIZE*shamt))&((1<<arch.CFG_WORD_SIZE)-1) 
       for v in inter.or_plane
-    ],[])
+      for shamt in reversed(range(and_words)) ]
 
     # This fills up the or_plane with zeros , if one column consits of more than
     # WORD_LEN configuration words. Otherwise the hardware would expect more
     # words for the or plane than we generate here.
     or_plane2=[]
-    used_or_regs = math.ceil(len(or_plane)/s.iface.SEGMENT_BITS)
+    used_or_regs = math.ceil(len(or_plane)/arch.SEGMENT_BITS)
 
     for seg_line in or_plane:
-        or_plane2 = or_plane2 + [0] * (or_words-used_or_regs) + [seg_line]
+        or_plane2.extend([0] * (or_words-used_or_regs))
+        or_plane2.append(seg_line)
     return and_plane+or_plane2
 
   ## Compiles and downloads a PLA onto the connected hardware.
-  def config_pla(s,spec):
+  def config_pla(s,spec,verify=True):
     inter=s.pla_compile(spec)
     words=s.pla_words(inter)
-    for w in reversed(words):
-      s.iface.command(CMD_CFG_WORD,w)
+    s.iface.config_chain(reversed(words),verify)
 
 
@@ -0,0 +1,194 @@
+import math
+from collections import namedtuple
+
+## Immutable set of architecture parameters of a lut core along with all
+# sizes derived from them.
+#
+# The parameters are those queried by IFace.load_config, named as the
+# respective IFace properties, and the derived sizes are computed once on
+# construction. Instances compare equal if their parameters do and are 
+# hashable, thus they can be used as (part of) cache keys.
+#
+# The bitstream layout (see BitstreamLayout) is available as `layout`, its
+# segments (lut, pla_or, pla_and and idec) as `segments`.
+class Arch:
+
+  ## Names of the architecture parameters, in constructor argument order.
+  PARAMS=(
+    "WORD_SIZE",
+    "INPUT_WORDS",
+    "SELECTOR_BITS",
+    "INTERPOLATION_BITS",
+    "SEGMENT_BITS",
+    "PLA_INTERCONNECTS",
+    "BASE_BITS",
+    "INCLINE_BITS",
+    "CONTROLLER_DELAY",
+    "INPUT_DECODER_DELAY",
+    "ADDRESS_TRANSLATOR_DELAY",
+    "INTERPOLATOR_DELAY")
+
+  ## Names of the derived sizes.
+  DERIVED=(
+    "CFG_WORD_SIZE",
+    "INPUT_WORD_SIZE",
+    "LUT_BRAM_WIDTH",
+    "RAM_CONFIG_BUFFER_SIZE",
+    "RAM_CONFIG_BUFFER_SIZE_BITS",
+    "CFG_LUT_REGISTER_COUNT",
+    "CFG_INPUT_DECODER_REGISTERS_PER_BIT",
+    "CFG_INPUT_DECODER_REGISTER_COUNT",
+    "CFG_PLA_AND_REGISTERS_PER_ROW",
+    "CFG_PLA_AND_REGISTER_COUNT",
+    "CFG_PLA_OR_REGISTERS_PER_COLUMN",
+    "CFG_PLA_OR_REGISTER_COUNT",
+    "CFG_PLA_REGISTER_COUNT",
+    "CFG_CHAIN_REGISTER_COUNT",
+    "CFG_REGISTER_COUNT")
+
+  __slots__=PARAMS+DERIVED+("params","layout","segments")
+
+  def __init__(s,*params):
+    if len(params)!=len(Arch.PARAMS):
+      raise TypeError(
+        "Arch expects %i arguments, got %i"%(len(Arch.PARAMS),len(params)))
+    
+    v=dict(zip(Arch.PARAMS,params))
+    v["CFG_WORD_SIZE"]=v["WORD_SIZE"]
+    v["INPUT_WORD_SIZE"]=v["WORD_SIZE"]*v["INPUT_WORDS"]
+    v["LUT_BRAM_WIDTH"]=v["BASE_BITS"]+v["INCLINE_BITS"]
+    v["RAM_CONFIG_BUFFER_SIZE"]=math.ceil(v["LUT_BRAM_WIDTH"]/v["CFG_WORD_SIZE"])
+    v["RAM_CONFIG_BUFFER_SIZE_BITS"]=(
+      v["RAM_CONFIG_BUFFER_SIZE"]*v["CFG_WORD_SIZE"])
+    v["CFG_LUT_REGISTER_COUNT"]=(
+      v["RAM_CONFIG_BUFFER_SIZE"]*(1<<v["SEGMENT_BITS"]))
+    v["CFG_INPUT_DECODER_REGISTERS_PER_BIT"]=math.ceil(
+      v["INPUT_WORD_SIZE"]/v["CFG_WORD_SIZE"])
+    v["CFG_INPUT_DECODER_REGISTER_COUNT"]=(
+      v["CFG_INPUT_DECODER_REGISTERS_PER_BIT"]*
+      (v["SELECTOR_BITS"]+v["INTERPOLATION_BITS"]))
+    v["CFG_PLA_AND_REGISTERS_PER_ROW"]=math.ceil(
+      v["SELECTOR_BITS"]*2/v["CFG_WORD_SIZE"])
+    v["CFG_PLA_AND_REGISTER_COUNT"]=(
+      v["CFG_PLA_AND_REGISTERS_PER_ROW"]*v["PLA_INTERCONNECTS"])
+    v["CFG_PLA_OR_REGISTERS_PER_COLUMN"]=math.ceil(
+      v["PLA_INTERCONNECTS"]/v["CFG_WORD_SIZE"])
+    v["CFG_PLA_OR_REGISTER_COUNT"]=(
+      v["CFG_PLA_OR_REGISTERS_PER_COLUMN"]*v["SEGMENT_BITS"])
+    v["CFG_PLA_REGISTER_COUNT"]=(
+      v["CFG_PLA_AND_REGISTER_COUNT"]+v["CFG_PLA_OR_REGISTER_COUNT"])
+    v["CFG_CHAIN_REGISTER_COUNT"]=(
+      v["CFG_INPUT_DECODER_REGISTER_COUNT"]+v["CFG_PLA_REGISTER_COUNT"])
+    v["CFG_REGISTER_COUNT"]=(
+      v["CFG_LUT_REGISTER_COUNT"]+v["CFG_CHAIN_REGISTER_COUNT"])
+
+    for f,value in v.items():
+      object.__setattr__(s,f,value)
+    object.__setattr__(s,"params",tuple(params))
+    object.__setattr__(s,"layout",BitstreamLayout(s))
+    object.__setattr__(s,"segments",tuple(s.layout.segments))
+
+  ## Creates an instance from the current parameters of an IFace.
+  @staticmethod
+  def from_iface(iface):
+    return Arch(*[getattr(iface,"_%s"%f.lower()) for f in Arch.PARAMS])
+
+  ## Returns the parameters as dict indexed by PARAMS.
+  def asdict(s):
+    return dict(zip(Arch.PARAMS,s.params))
+
+  ## Returns a copy with some parameters replaced, e.g.
+  # arch.replace(SEGMENT_BITS=10).
+  def replace(s,**params):
+    v=s.asdict()
+    for f,value in params.items():
+      if f not in v:
+        raise TypeError("unknown architecture parameter %s"%f)
+      v[f]=value
+    return Arch(*[v[f] for f in Arch.PARAMS])
+
+  def __setattr__(s,name,value):
+    raise AttributeError("Arch is immutable")
+
+  def __eq__(s,other):
+    return isinstance(other,Arch) and s.params==other.params
+
+  def __hash__(s):
+    return hash(s.params)
+
+  def __reduce__(s):
+    return (Arch,s.params)
+
+  def __repr__(s):
+    return "Arch(%s)"%", ".join([
+      "%s=%i"%(f,v) for f,v in zip(Arch.PARAMS,s.params)])
+
+## Layout of a lut core bitstream in download order.
+#
+# A bitstream consists of the RAM config phase (the lut cells, transmitted in
+# correct order) followed by the CHAIN config phase (input decoder and PLA
+# registers, transmitted in reverse order). Thus, in download order, the
+# segments are: lut, pla_or, pla_and and idec.
+#
+# Each segment holds a number of fields (cells, rows, columns, ...) of
+# `words_per_field` words each, which occur in reversed field order for the
+# chain segments. Within each field the words are ordered least significant
+# first.
+#
+# The or plane columns are each transmitted as CFG_PLA_AND_REGISTERS_PER_ROW
+# words, each followed by (CFG_PLA_OR_REGISTERS_PER_COLUMN -
+# CFG_PLA_AND_REGISTERS_PER_ROW) zero words (if positive) in download order,
+# as generated by PLAControl.pla_words. Hence `words_per_field` and `padding`
+# of that segment.
+class BitstreamLayout:
+
+  ## A segment of a bitstream. `offset` and `length` are measured in words.
+  segment_t=namedtuple(
+    "bitstream_segment_t","name offset length fields words_per_field padding")
+  # locate the type by its attribute, as required for pickling
+  segment_t.__qualname__="BitstreamLayout.segment_t"
+
+  ## @param arch An instance of Arch or IFace.
+  def __init__(s,arch):
+    and_words=arch.CFG_PLA_AND_REGISTERS_PER_ROW
+    or_padding=max(0,arch.CFG_PLA_OR_REGISTERS_PER_COLUMN-and_words)
+
+    s.word_size=arch.CFG_WORD_SIZE
+    s.segments=[]
+    offset=0
+    for name,fields,words_per_field,padding in [
+        ("lut",1<<arch.SEGMENT_BITS,arch.RAM_CONFIG_BUFFER_SIZE,0),
+        ("pla_or",arch.SEGMENT_BITS,and_words,or_padding),
+        ("pla_and",arch.PLA_INTERCONNECTS,and_words,0),
+        ("idec",
+          arch.SELECTOR_BITS+arch.INTERPOLATION_BITS,
+          arch.CFG_INPUT_DECODER_REGISTERS_PER_BIT,0)]:
+      length=fields*words_per_field*(1+padding)
+      s.segments.append(BitstreamLayout.segment_t(
+        name,offset,length,fields,words_per_field,padding))
+      offset+=length
+    s.size=offset
+    s._by_name={ seg.name:seg for seg in s.segments }
+
+  ## Returns the segment of the given name.
+  def segment(s,name):
+    return s._by_name[name]
+
+  ## Returns the offset of the words of a field, e.g. the cell of a given
+  # address in the lut segment, and their number.
+  #
+  # For the pla_or segment, the padding words following each word are
+  # included.
+  def field(s,name,i):
+    seg=s.segment(name)
+    if i<0 or i>=seg.fields:
+      raise IndexError("field %i out of range for segment %s"%(i,name))
+    n=seg.words_per_field*(1+seg.padding)
+    if name!="lut":
+      i=seg.fields-i-1
+    return (seg.offset+i*n,n)
+
+  ## Typecode of an array holding a bitstream of this layout.
+  @property
+  def typecode(s):
+    return "I" if s.word_size==32 else "Q"
@@ -0,0 +1,237 @@
+import os
+import asyncio
+from collections import deque
+from .iface import (
+  IFace,
+  CMD_CFG_INPUT_WORDS, CMD_CFG_SELECTOR_BITS, CMD_CFG_INTERPOLATION_BITS,
+  CMD_CFG_SEGMENT_BITS, CMD_CFG_PLA_INTERCONNECTS, CMD_CFG_BASE_BITS,
+  CMD_CFG_INCLINE_BITS, CMD_CFG_CONTROLLER_DELAY, CMD_CFG_INPUT_DECODER_DELAY,
+  CMD_CFG_ADDRESS_TRANSLATOR_DELAY, CMD_CFG_INTERPOLATOR_DELAY)
+from .error import TestFailure
+
+## asyncio counterpart of IFace.
+#
+# Wraps an opened IFace and offers its command set (command0, command0i,
+# command8, command, commandi, command_inter) as coroutines. Requests are
+# written to the port as soon as they are issued and responses are read by
+# non-blocking reads on the file descriptor of the port, each response being
+# handed to the oldest pending request, i.e. in FIFO order as the hardware
+# test processes requests.
+#
+# Thus, a number of commands issued concurrently (e.g. by asyncio.gather) keep
+# the link saturated, while the event loop remains free to run simulation or
+# logging in between. At most `window` requests with response are in flight,
+# see IFace.COMMAND_WINDOW.
+#
+# Architecture parameters and encoders are taken from the wrapped IFace, thus
+# instances may be used wherever constants like SELECTOR_BITS are read.
+# All methods must be called from the thread running the event loop. Only the
+# raw protocol is supported, see IFace.enable_framing.
+class AsyncIFace:
+
+  ## @param iface An instance of IFace connected to a port.
+  # @param window Number of requests in flight, defaults to
+  # IFace.COMMAND_WINDOW.
+  # @param timeout Seconds to wait for a single response, or None to wait
+  # indefinitely.
+  def __init__(s,iface,window=None,timeout=None):
+    if iface.framed:
+      raise ValueError("the framed protocol is not supported asynchronously")
+    s.iface=iface
+    s.window=window if window!=None else IFace.COMMAND_WINDOW
+    s.timeout=timeout
+    s.fd=iface.fileno()
+    s._loop=None
+    s._slots=None
+    s._pending=deque()
+    s._rx=bytearray()
+    s._tx=bytearray()
+    s._drained=None
+    s._error=None
+
+  def __getattr__(s,attr):
+    if attr=="iface":
+      raise AttributeError(attr)
+    return getattr(s.iface,attr)
+
+  async def __aenter__(s):
+    s._attach()
+    return s
+
+  async def __aexit__(s,ty,value,tb):
+    if ty==None:
+      await s.drain()
+    s.close()
+
+  ## Registers the port with the running event loop.
+  def _attach(s):
+    if s._loop!=None:
+      return
+    s._loop=asyncio.get_running_loop()
+    s._error=None
+    s._slots=asyncio.Semaphore(s.window)
+    os.set_blocking(s.fd,False)
+    s._loop.add_reader(s.fd,s._on_readable)
+
+  ## Unregisters the port from the event loop, failing all pending requests.
+  #
+  # The wrapped IFace is left open and in blocking mode, thus it can be used
+  # synchronously afterwards.
+  def close(s):
+    if s._loop==None:
+      return
+    s._loop.remove_reader(s.fd)
+    s._loop.remove_writer(s.fd)
+    os.set_blocking(s.fd,True)
+    s._fail(TestFailure("interface closed"))
+    s._loop=None
+    s._tx.clear()
+
+  def _fail(s,exc):
+    s._error=exc
+    while s._pending:
+      (size,future)=s._pending.popleft()
+      if not future.done():
+        future.set_exception(exc)
+    if s._drained!=None and not s._drained.done():
+      s._drained.set_exception(exc)
+
+  def _on_readable(s):
+    try:
+      data=os.read(s.fd,65536)
+    except BlockingIOError:
+      return
+    except OSError as e:
+      s._fail(e)
+      return
+    s._rx.extend(data)
+
+    while s._pending and len(s._rx)>=s._pending[0][0]:
+      (size,future)=s._pending.popleft()
+      raw=bytes(s._rx[:size])
+      del s._rx[:size]
+      # a cancelled request still consumes its response
+      if not future.done():
+        future.set_result(raw)
+
+  def _on_writable(s):
+    try:
+      n=os.write(s.fd,s._tx)
+    except BlockingIOError:
+      return
+    except OSError as e:
+      s._loop.remove_writer(s.fd)
+      s._fail(e)
+      return
+    del s._tx[:n]
+    if not s._tx:
+      s._loop.remove_writer(s.fd)
+      if s._drained!=None and not s._drained.done():
+        s._drained.set_result(None)
+
+  ## Queues raw data for transmission, writing as much as possible
+  # immediately.
+  def _write(s,raw):
+    if s._tx:
+      s._tx.extend(raw)
+      return
+    try:
+      n=os.write(s.fd,raw)
+    except BlockingIOError:
+      n=0
+    if n<len(raw):
+      s._tx.extend(raw[n:])
+      s._loop.add_writer(s.fd,s._on_writable)
+
+  ## Sends a request and waits for a response of `size` bytes.
+  async def _request(s,raw,size):
+    s._attach()
+    async with s._slots:
+      if s._error!=None:
+        raise s._error
+      future=s._loop.create_future()
+      # enqueueing and writing without suspending keeps the FIFO order
+      s._pending.append((size,future))
+      s._write(raw)
+      try:
+        return await asyncio.wait_for(asyncio.shield(future),s.timeout)
+      except asyncio.TimeoutError:
+        # the link is out of sync from here on
+        future.cancel()
+        exc=TestFailure(
+          "timeout waiting for response (%i requests pending)"
+          %len(s._pending))
+        s._fail(exc)
+        raise exc
+
+  ## Sends a request without response.
+  async def _send(s,raw):
+    s._attach()
+    if s._error!=None:
+      raise s._error
+    s._write(raw)
+
+  ## Waits until all queued data has been written to the port.
+  async def drain(s):
+    if s._loop==None or not s._tx:
+      return
+    if s._drained==None or s._drained.done():
+      s._drained=s._loop.create_future()
+    await s._drained
+
+  ## See IFace.command0.
+  async def command0(s,cmd,data=None):
+    await s._send(s.iface.pack_command(cmd,data))
+
+  ## See IFace.command0i.
+  async def command0i(s,cmd,data=None):
+    await s._send(s.iface.pack_input(cmd,data))
+
+  ## See IFace.command8.
+  async def command8(s,cmd,data=None):
+    raw=await s._request(s.iface.pack_command(cmd,data),1)
+    return raw[0]
+
+  ## See IFace.command.
+  async def command(s,cmd,data=None):
+    raw=await s._request(s.iface.pack_command(cmd,data),s.WORD_SIZE//8)
+    return s.iface.unpack_word(raw)
+
+  ## See IFace.commandi.
+  async def commandi(s,cmd,data):
+    raw=await s._request(s.iface.pack_input(cmd,data),s.WORD_SIZE//8)
+    return s.iface.unpack_word(raw)
+
+  ## See IFace.command_inter.
+  async def command_inter(s,cmd,selector,interpolator,base,incline):
+    raw=await s._request(
+      s.iface.pack_inter(cmd,selector,interpolator,base,incline),
+      s.WORD_SIZE//8)
+    return s.iface.unpack_word(raw)
+
+  ## Executes commandi for each of a number of pipeline inputs concurrently.
+  #
+  # @return a list of the response words, in order of the inputs.
+  async def commandi_many(s,cmd,xs):
+    return await asyncio.gather(*[
+      s.commandi(cmd,xs[i]) for i in range(len(xs))])
+
+  ## See IFace.load_config, the queried parameters are stored in the wrapped
+  # IFace.
+  async def load_config(s):
+    cmds={
+      "_input_words": CMD_CFG_INPUT_WORDS,
+      "_selector_bits": CMD_CFG_SELECTOR_BITS,
+      "_interpolation_bits": CMD_CFG_INTERPOLATION_BITS,
+      "_segment_bits": CMD_CFG_SEGMENT_BITS,
+      "_pla_interconnects": CMD_CFG_PLA_INTERCONNECTS,
+      "_base_bits": CMD_CFG_BASE_BITS,
+      "_incline_bits": CMD_CFG_INCLINE_BITS,
+      "_controller_delay": CMD_CFG_CONTROLLER_DELAY,
+      "_input_decoder_delay": CMD_CFG_INPUT_DECODER_DELAY,
+      "_address_translator_delay": CMD_CFG_ADDRESS_TRANSLATOR_DELAY,
+      "_interpolator_delay": CMD_CFG_INTERPOLATOR_DELAY
+    }
+    values=await asyncio.gather(*[s.command8(cmd) for cmd in cmds.values()])
+    for attr,v in zip(cmds.keys(),values):
+      setattr(s.iface,attr,v)
@@ -0,0 +1,37 @@
+from operator import itemgetter
+
+## Helper functions for bit-sliced simulation.
+#
+# A bit-sliced representation of a list of n values is a list of integers,
+# one for each bit position of the values. Bit k of the i-th integer (slice)
+# holds bit i of the k-th value. This allows the simulation methods to
+# evaluate Boolean logic on all n values at once using arbitrary precision
+# Python integers, without depending on numpy.
+
+## Transposes a list of values into slices.
+#
+# @param xs List of non-negative integers.
+# @param positions Iterable of the bit positions a slice is required for.
+# @param width Number of bits to consider of each value.
+# @return dictionary mapping each position to its slice.
+def bitslice_pack(xs,positions,width):
+  mask=(1<<width)-1
+  fmt="0%ib"%width
+  # the last value ends up in the most significant bit of the slices
+  strs=[format(x&mask,fmt) for x in reversed(xs)]
+  return {
+    j:int("".join(map(itemgetter(width-1-j),strs)) or "0",2)
+    for j in positions }
+
+## Transposes a list of slices back into a list of values.
+#
+# @param slices List of slices, the i-th one representing bit i.
+# @param count Number of values represented by the slices.
+# @return list of count integers.
+def bitslice_unpack(slices,count):
+  if len(slices)<1 or count<1:
+    return [0]*count
+  fmt="0%ib"%count
+  # reversed slice strings start with the first value
+  strs=[format(v,fmt)[::-1] for v in reversed(slices)]
+  return [int("".join(bits),2) for bits in zip(*strs)]
@@ -0,0 +1,393 @@
+from .iface import *
+from .error import ArchMismatch
+from .arch import Arch,BitstreamLayout
+import copy
+import mmap
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+## Writes lut core bitstreams in download order into a preallocated array.
+#
+# The result is bit-identical to the concatenation of lut_words and the
+# reversed idec_words and pla_words, but generated in linear time. Being an
+# array, it exposes its words via the buffer protocol in native byte order.
+#
+# The layout is determined by the architecture parameters at construction.
+class BitstreamBuilder(IFaceRef):
+
+  def __init__(s,iface):
+    IFaceRef.__init__(s,iface)
+    s.layout=iface.arch.layout
+
+  ## Builds the bitstream of a compiled lut core.
+  #
+  # @param intermediate An instance of LUTCoreIntermediate.
+  # @return an array of configuration words.
+  def build(s,intermediate):
+    buf=array(s.layout.typecode)
+    buf.frombytes(bytes(s.layout.size*buf.itemsize))
+    s.write_lut(buf,intermediate.lut)
+    s.write_pla(buf,intermediate.pla)
+    s.write_idec(buf,intermediate.idec)
+    return buf
+
+  def write_lut(s,buf,lut):
+    s.write_segment(buf,"lut",lut.cells)
+
+  def write_pla(s,buf,pla):
+    s.write_segment(buf,"pla_or",pla.or_plane)
+    s.write_segment(buf,"pla_and",pla.and_plane)
+
+  def write_idec(s,buf,idec):
+    s.write_segment(buf,"idec",idec.choices)
+
+  ## Writes the fields of a segment.
+  #
+  # @param values List of field values in specification order.
+  def write_segment(s,buf,name,values):
+    seg=s.layout.segment(name)
+    if len(values)!=seg.fields:
+      raise ValueError(
+        "segment %s expects %i fields, got %i"%(name,seg.fields,len(values)))
+    if name!="lut":
+      values=values[::-1]
+
+    n=seg.words_per_field
+    stride=n*(1+seg.padding)
+    pos=seg.offset
+    for v in values:
+      words=s.split(v,n)
+      if seg.padding==0:
+        buf[pos:pos+n]=words
+      else:
+        buf[pos:pos+stride:1+seg.padding]=words
+      pos+=stride
+
+  ## Writes a single field of a segment, e.g. after modifying a lut cell.
+  def write_field(s,buf,name,i,v):
+    seg=s.layout.segment(name)
+    (pos,n)=s.layout.field(name,i)
+    buf[pos:pos+n:1+seg.padding]=s.split(v,seg.words_per_field)
+
+  ## Splits a value into an array of n words, least significant first.
+  #
+  # Bits exceeding n words are discarded.
+  def split(s,v,n):
+    ws=s.layout.word_size
+    v&=(1<<(ws*n))-1
+    words=array(s.layout.typecode)
+    if words.itemsize*8==ws:
+      words.frombytes(v.to_bytes(n*words.itemsize,"little"))
+      if sys.byteorder!="little":
+        words.byteswap()
+    else:
+      words.extend([(v>>(ws*k))&((1<<ws)-1) for k in range(n)])
+    return words
+
+## Decodes lut core bitstreams into their planes, the inverse of 
+# BitstreamBuilder.
+#
+# The words are converted into a single byte buffer, from which each field is
+# read using int.from_bytes. The padding words of the or plane are ignored.
+#
+# The layout is determined by the architecture parameters at construction.
+class BitstreamDecoder(IFaceRef):
+
+  ## Decoded contents of a bitstream: the lut cells, and plane rows, or plane
+  # columns and input decoder crosspoints, as held by the respective
+  # intermediates.
+  decoded_t=namedtuple("bitstream_decoded_t","cells and_plane or_plane choices")
+  # locate the type by its attribute, as required for pickling
+  decoded_t.__qualname__="BitstreamDecoder.decoded_t"
+
+  def __init__(s,iface):
+    IFaceRef.__init__(s,iface)
+    s.layout=iface.arch.layout
+
+  ## Decodes a bitstream given as sequence of words, e.g. a list, array or the
+  # words of a BitstreamFile.
+  #
+  # @return an instance of decoded_t.
+  def decode(s,words):
+    if len(words)!=s.layout.size:
+      raise ValueError(
+        "bitstream has %i words, expected %i"%(len(words),s.layout.size))
+    
+    if isinstance(words,array) and words.typecode==s.layout.typecode:
+      data=words
+    elif isinstance(words,memoryview) and words.format==s.layout.typecode:
+      data=array(s.layout.typecode)
+      with words.cast("B") as raw:
+        data.frombytes(raw)
+    else:
+      data=array(s.layout.typecode,words)
+    if sys.byteorder!="little":
+      data=array(data.typecode,data)
+      data.byteswap()
+    
+    with memoryview(data) as view:
+      with view.cast("B") as raw:
+        return BitstreamDecoder.decoded_t(
+          s.decode_segment(raw,data.itemsize,"lut"),
+          s.decode_segment(raw,data.itemsize,"pla_and"),
+          s.decode_segment(raw,data.itemsize,"pla_or"),
+          s.decode_segment(raw,data.itemsize,"idec"))
+
+  ## Decodes the fields of a segment in specification order.
+  #
+  # @param raw The little-endian words of the bitstream as bytes-like object.
+  # @param itemsize Size of a word in raw in bytes.
+  def decode_segment(s,raw,itemsize,name):
+    seg=s.layout.segment(name)
+    ws=s.layout.word_size
+    n=seg.words_per_field
+    stride=n*(1+seg.padding)
+    
+    values=[]
+    for pos in range(seg.offset,seg.offset+seg.length,stride):
+      if itemsize*8!=ws:
+        values.append(sum([
+          int.from_bytes(raw[(pos+k)*itemsize:(pos+k+1)*itemsize],"little")
+          <<(ws*j)
+          for j,k in enumerate(range(0,stride,1+seg.padding))]))
+      elif seg.padding==0:
+        values.append(
+          int.from_bytes(raw[pos*itemsize:(pos+n)*itemsize],"little"))
+      else:
+        values.append(int.from_bytes(b"".join([
+          raw[(pos+k)*itemsize:(pos+k+1)*itemsize]
+          for k in range(0,stride,1+seg.padding)]),"little"))
+
+    if name!="lut":
+      values.reverse()
+    return values
+
+## Binary container of a lut core bitstream.
+#
+# The file consists of a header holding the architecture parameters the
+# bitstream was generated for (see HEADER), followed by the configuration 
+# words in download order, each stored as little-endian 64-bit word.
+#
+# Loaded files are memory-mapped, `words` is a view of the mapped words
+# without any parsing. Thus the file must be closed (see close) once its 
+# words are no longer used.
+class BitstreamFile:
+
+  ## Identifies bitstream files.
+  MAGIC=b"HTLUTBS\0"
+  
+  VERSION=1
+
+  ## Header layout: magic, word count, version, followed by the parameters 
+  # listed in ARCH_FIELDS, padded to a multiple of 8 bytes.
+  HEADER=struct.Struct("<8sQH9H4x")
+
+  ## Names of the IFace architecture parameters stored in the header.
+  ARCH_FIELDS=(
+    "WORD_SIZE",
+    "INPUT_WORDS",
+    "SELECTOR_BITS",
+    "INTERPOLATION_BITS",
+    "SEGMENT_BITS",
+    "PLA_INTERCONNECTS",
+    "BASE_BITS",
+    "INCLINE_BITS")
+
+  def __init__(s,arch,words,mapping=None,f=None):
+    s.arch=arch
+    s.words=words
+    s._mapping=mapping
+    s._file=f
+
+  ## Returns the architecture parameters of arch in the form stored in the
+  # header, a dict indexed by ARCH_FIELDS.
+  @staticmethod
+  def arch_fields(arch):
+    return { f:getattr(arch,f) for f in BitstreamFile.ARCH_FIELDS }
+
+  ## Raises ArchMismatch if the bitstream was generated for a different 
+  # architecture than iface's.
+  def check(s,iface):
+    arch=BitstreamFile.arch_fields(iface.arch)
+    diff=[f for f in BitstreamFile.ARCH_FIELDS if arch[f]!=s.arch[f]]
+    if diff:
+      raise ArchMismatch(
+        "bitstream architecture mismatch: %s"%", ".join([
+          "%s=%i (expected %i)"%(f,s.arch[f],arch[f]) for f in diff ]))
+    expected=iface.arch.layout.size
+    if len(s.words)!=expected:
+      raise ArchMismatch(
+        "bitstream has %i words, expected %i"%(len(s.words),expected))
+
+  ## Tests whether a file starts with MAGIC.
+  @staticmethod
+  def detect(fn):
+    with open(fn,"rb") as f:
+      return f.read(len(BitstreamFile.MAGIC))==BitstreamFile.MAGIC
+
+  ## Writes a bitstream file.
+  #
+  # @param words Configuration words, e.g. as returned by core_bitstream or 
+  # core_bitstream_array.
+  @staticmethod
+  def save(fn,iface,words):
+    arch=BitstreamFile.arch_fields(iface.arch)
+    data=array("Q",words)
+    if sys.byteorder!="little":
+      data.byteswap()
+    with open(fn,"wb") as f:
+      f.write(BitstreamFile.HEADER.pack(
+        BitstreamFile.MAGIC,len(data),BitstreamFile.VERSION,
+        *[arch[f] for f in BitstreamFile.ARCH_FIELDS],0))
+      data.tofile(f)
+
+  ## Memory-maps a bitstream file.
+  #
+  # @param iface If not None, the bitstream is checked against its
+  # architecture (see check).
+  # @return an instance of BitstreamFile.
+  @staticmethod
+  def load(fn,iface=None):
+    f=open(fn,"rb")
+    try:
+      mapping=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+    except:
+      f.close()
+      raise
+
+    try:
+      if len(mapping)<BitstreamFile.HEADER.size:
+        raise ValueError("%s: truncated bitstream header"%fn)
+      (magic,count,version,*arch)=BitstreamFile.HEADER.unpack_from(mapping)
+      if magic!=BitstreamFile.MAGIC:
+        raise ValueError("%s: not a bitstream file"%fn)
+      if version!=BitstreamFile.VERSION:
+        raise ValueError("%s: unsupported bitstream version %i"%(fn,version))
+      end=BitstreamFile.HEADER.size+8*count
+      if len(mapping)<end:
+        raise ValueError("%s: truncated bitstream"%fn)
+
+      with memoryview(mapping) as view:
+        data=view[BitstreamFile.HEADER.size:end]
+      if sys.byteorder=="little":
+        words=data.cast("Q")
+        data.release()
+      else:
+        words=array("Q",data.tobytes())
+        words.byteswap()
+        data.release()
+    except:
+      mapping.close()
+      f.close()
+      raise
+
+    r=BitstreamFile(
+      dict(zip(BitstreamFile.ARCH_FIELDS,arch)),words,mapping,f)
+    if iface!=None:
+      try:
+        r.check(iface)
+      except:
+        r.close()
+        raise
+    return r
+
+  ## Releases the words and unmaps the file.
+  def close(s):
+    if isinstance(s.words,memoryview):
+      s.words.release()
+    if s._mapping!=None:
+      s._mapping.close()
+      s._mapping=None
+    if s._file!=None:
+      s._file.close()
+      s._file=None
+
+  def __enter__(s):
+    return s
+
+  def __exit__(s,a,b,c):
+    s.close()
+
+  def __len__(s):
+    return len(s.words)
+
+## Returns the configuration words of a bitstream given either as a sequence
+# of words or an instance of BitstreamFile, which is checked against the
+# architecture of iface.
+def bitstream_words(iface,bitstream):
+  if isinstance(bitstream,BitstreamFile):
+    bitstream.check(iface)
+    return bitstream.words
+  return bitstream
+
+## A bitstream along with the compiled lut core it was generated from, which
+# can be modified in place.
+#
+# Each modification rewrites only the words of the affected field (see
+# BitstreamLayout.field) and updates the simulation tables of the 
+# intermediate built so far incrementally, e.g. only the entries of the fused
+# output table whose selector maps to a modified lut cell. All methods return
+# the offset and number of the rewritten words.
+#
+# The intermediate is copied on construction, thus intermediates shared with
+# the compile cache are never modified.
+class PatchableBitstream(IFaceRef):
+
+  ## @param intermediate The compiled lut core, an instance of 
+  # LUTCoreIntermediate.
+  # @param words Its bitstream, generated if None.
+  def __init__(s,iface,intermediate,words=None):
+    IFaceRef.__init__(s,iface)
+    s.builder=BitstreamBuilder(iface)
+    s.intermediate=copy.deepcopy(intermediate)
+    s.intermediate.load_tables(copy.deepcopy(intermediate.tables()))
+    s.words=(
+      s.builder.build(s.intermediate) if words==None 
+      else array(s.builder.layout.typecode,words))
+    if len(s.words)!=s.builder.layout.size:
+      raise ValueError(
+        "bitstream has %i words, expected %i"
+        %(len(s.words),s.builder.layout.size))
+
+  @property
+  def layout(s):
+    return s.builder.layout
+
+  def _write(s,name,i,v):
+    seg=s.layout.segment(name)
+    if v<0 or v>>(s.layout.word_size*seg.words_per_field)!=0:
+      raise ValueError("value does not fit into field %i of segment %s"%(i,name))
+    s.builder.write_field(s.words,name,i,v)
+    return s.layout.field(name,i)
+
+  ## Sets lut cell x, truncated to LUT_BRAM_WIDTH bits as by lut_compile.
+  def set_lut_cell(s,x,v):
+    v&=(1<<s.iface.LUT_BRAM_WIDTH)-1
+    r=s._write("lut",x,v)
+    s.intermediate.set_cell(x,v)
+    return r
+  
+  ## Sets PLA and plane row i, e.g. to a value returned by parse_product.
+  def set_pla_and_row(s,i,v):
+    r=s._write("pla_and",i,v)
+    s.intermediate.set_and_row(i,v)
+    return r
+  
+  ## Sets PLA or plane column j, the set of interconnects driving output j.
+  def set_pla_or_column(s,j,v):
+    r=s._write("pla_or",j,v)
+    s.intermediate.set_or_column(j,v)
+    return r
+  
+  ## Sets the crosspoints of input decoder output bit i.
+  def set_idec_choice(s,i,arg):
+    r=s._write("idec",i,arg)
+    s.intermediate.set_choice(i,arg)
+    return r
+
+  ## Connects input decoder output bit i to input bit j only, as by 
+  # idec_compile.
+  def set_idec_bit(s,i,j):
+    return s.set_idec_choice(i,1<<j)
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+
+## Memoization layer for compiled lut cores.
+#
+# Entries are addressed by a stable digest of their content (see digest), so
+# compiling an identical specification against an identical architecture
+# returns the shared result of the first compilation. The least recently used
+# entry is evicted once more than `capacity` entries are held. Hits and misses
+# are counted for diagnostic purposes.
+class CompileCache:
+  
+  ## Statistics of a cache as returned by stats.
+  stats_t=namedtuple("compile_cache_stats_t","hits misses size capacity")
+
+  def __init__(s,capacity=256):
+    s.capacity=capacity
+    s.hits=0
+    s.misses=0
+    s._entries=OrderedDict()
+    s._lock=threading.Lock()
+
+  ## Computes a stable digest of a number of values.
+  #
+  # The values must consist of integers, strings, and (named) tuples or lists
+  # thereof, as is the case for all specification types.
+  @staticmethod
+  def digest(*parts):
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+  
+  ## Retrieves the entry stored for key, generating it using build if it is 
+  # missing.
+  #
+  # @param key Key of the entry, e.g. a digest.
+  # @param build Function of no arguments returning the value of the entry.
+  # @return the (possibly shared) value of the entry.
+  def lookup(s,key,build):
+    with s._lock:
+      if key in s._entries:
+        s.hits+=1
+        s._entries.move_to_end(key)
+        return s._entries[key]
+      s.misses+=1
+    
+    value=build()
+    
+    with s._lock:
+      if s.capacity>0:
+        s._entries[key]=value
+        s._entries.move_to_end(key)
+        while len(s._entries)>s.capacity:
+          s._entries.popitem(last=False)
+    return value
+  
+  ## Removes all entries and resets the counters.
+  def clear(s):
+    with s._lock:
+      s._entries.clear()
+      s.hits=0
+      s.misses=0
+
+  ## Returns the current statistics as an instance of stats_t.
+  def stats(s):
+    return CompileCache.stats_t(s.hits,s.misses,len(s._entries),s.capacity)
+
+  def __len__(s):
+    return len(s._entries)
+
+## Persistent cache storing pickled values as files of a directory.
+#
+# Each entry is stored in a file named after its key, which should be a 
+# digest (see CompileCache.digest). Once the files exceed `max_bytes` in 
+# total, the least recently used ones are removed. Usage is tracked using the
+# modification time of the files, which is updated on every hit.
+#
+# Unreadable entries, e.g. ones written by an incompatible version of htlib,
+# are treated as missing. Entries are written atomically, thus a cache
+# directory can be shared by concurrent processes.
+class DiskCache:
+
+  ## Default upper limit of the size of a cache directory in bytes.
+  MAX_BYTES=256<<20
+
+  ## @param directory Cache directory, created if missing. Leave at None to 
+  # use default_directory.
+  # @param max_bytes Upper limit of the total size of all entries in bytes.
+  def __init__(s,directory=None,max_bytes=None):
+    s.directory=directory if directory!=None else DiskCache.default_directory()
+    s.max_bytes=max_bytes if max_bytes!=None else DiskCache.MAX_BYTES
+    s.hits=0
+    s.misses=0
+
+  ## Returns the default cache directory, located in $XDG_CACHE_HOME or 
+  # ~/.cache.
+  @staticmethod
+  def default_directory():
+    base=os.environ.get("XDG_CACHE_HOME") or os.path.join(
+      os.path.expanduser("~"),".cache")
+    return os.path.join(base,"htlib")
+
+  def path(s,key):
+    return os.path.join(s.directory,"%s.pickle"%key)
+
+  ## Returns the value stored for key or None if there is none.
+  def get(s,key):
+    fn=s.path(key)
+    try:
+      with open(fn,"rb") as f:
+        value=pickle.load(f)
+    except (OSError,EOFError,pickle.UnpicklingError,
+        AttributeError,ImportError,TypeError):
+      s.misses+=1
+      return None
+    
+    try:
+      os.utime(fn)
+    except OSError:
+      pass
+    s.hits+=1
+    return value
+
+  ## Stores value for key and evicts entries exceeding max_bytes.
+  def put(s,key,value):
+    os.makedirs(s.directory,exist_ok=True)
+    (fd,tmp)=tempfile.mkstemp(dir=s.directory,suffix=".tmp")
+    try:
+      with os.fdopen(fd,"wb") as f:
+        pickle.dump(value,f,pickle.HIGHEST_PROTOCOL)
+      os.replace(tmp,s.path(key))
+    except:
+      os.unlink(tmp)
+      raise
+    s.evict()
+
+  ## Retrieves the value stored for key, generating and storing it using 
+  # build if it is missing.
+  def lookup(s,key,build):
+    value=s.get(key)
+    if value is None:
+      value=build()
+      s.put(key,value)
+    return value
+
+  ## Removes the least recently used entries until the total size of the
+  # remaining ones does not exceed max_bytes.
+  def evict(s):
+    entries=[]
+    for fn in os.listdir(s.directory):
+      if not fn.endswith(".pickle"): continue
+      try:
+        st=os.stat(os.path.join(s.directory,fn))
+      except OSError:
+        continue
+      entries.append((st.st_mtime,st.st_size,fn))
+    
+    total=sum([size for _,size,_ in entries])
+    for _,size,fn in sorted(entries):
+      if total<=s.max_bytes: break
+      try:
+        os.unlink(os.path.join(s.directory,fn))
+      except OSError:
+        pass
+      total-=size
+
+  ## Removes all entries.
+  def clear(s):
+    if not os.path.isdir(s.directory): return
+    for fn in os.listdir(s.directory):
+      if fn.endswith(".pickle"):
+        os.unlink(os.path.join(s.directory,fn))
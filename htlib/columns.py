@@ -0,0 +1,126 @@
+import sys
+import random
+from array import array
+from .util import require_numpy
+
+## Columnar representation of a list of pipeline inputs.
+#
+# Pipeline inputs consist of INPUT_WORDS words each. Instead of holding each
+# input as a single (up to WORD_SIZE*INPUT_WORDS bit) integer, this holds one
+# array of type 'Q' per input word, the i-th column containing the i-th word
+# of every input, along with the number of inputs `count`.
+# Instances are accepted by the batched and bit-sliced simulation methods as
+# well as the C array emitters below, thus no per-input conversion to and from
+# big integers is needed.
+class InputColumns:
+
+  def __init__(s,columns):
+    s.columns=[c if isinstance(c,array) else array("Q",c) for c in columns]
+    s.count=len(s.columns[0]) if len(s.columns)>0 else 0
+    if any([len(c)!=s.count for c in s.columns]):
+      raise ValueError("input columns differ in length")
+  
+  ## Splits a list of integer inputs into columns.
+  #
+  # @param values List of inputs, each below 2^(word_size*input_words).
+  # @param input_words Number of words per input (INPUT_WORDS).
+  # @param word_size Number of bits per word (WORD_SIZE).
+  @staticmethod
+  def from_values(values,input_words,word_size=64):
+    mask=(1<<word_size)-1
+    return InputColumns([
+      array("Q",[(v>>(word_size*i))&mask for v in values])
+      for i in range(input_words)])
+  
+  ## Generates count random inputs.
+  #
+  # Each column is drawn from a single call to rng.getrandbits, so the result
+  # is reproducible by seeding rng.
+  #
+  # @param masks Optional list of one mask per column, which is applied to each
+  # word of that column.
+  @staticmethod
+  def random(count,input_words,masks=None,rng=random):
+    columns=[]
+    for i in range(input_words):
+      c=array("Q")
+      if count>0:
+        c.frombytes(rng.getrandbits(64*count).to_bytes(8*count,"little"))
+        if sys.byteorder!="little":
+          c.byteswap()
+      if masks!=None and masks[i]!=(1<<64)-1:
+        c=array("Q",[v&masks[i] for v in c])
+      columns.append(c)
+    return InputColumns(columns)
+  
+  def __len__(s):
+    return s.count
+  
+  ## Returns a single input as tuple of words if indexed with an integer, or
+  # a new instance holding a range of inputs if indexed with a slice.
+  def __getitem__(s,idx):
+    if isinstance(idx,slice):
+      return InputColumns([c[idx] for c in s.columns])
+    return tuple([c[idx] for c in s.columns])
+  
+  ## Appends a single input given as tuple of words.
+  def append(s,words):
+    if len(words)!=len(s.columns):
+      raise ValueError(
+        "expected %i input words, got %i"%(len(s.columns),len(words)))
+    for c,v in zip(s.columns,words):
+      c.append(v)
+    s.count+=1
+
+  ## Returns the i-th input as tuple of INPUT_WORDS words, as accepted by
+  # IFace.commandi.
+  def row(s,i):
+    return tuple([c[i] for c in s.columns])
+
+  ## Returns the i-th input as a single integer.
+  def value(s,i,word_size=64):
+    return sum([c[i]<<(word_size*j) for j,c in enumerate(s.columns)])
+
+  ## Returns all inputs as list of integers, as accepted by the scalar
+  # simulation methods.
+  def values(s,word_size=64):
+    return [
+      sum([v<<(word_size*j) for j,v in enumerate(words)])
+      for words in zip(*s.columns)]
+
+  ## Formats the i-th column as comma-seperated list of C literals.
+  def c_column(s,i,suffix="uL"):
+    return ",".join(["%s%s"%(v,suffix) for v in s.columns[i]])
+
+  ## Formats all inputs as C literals, with the words of each input on a
+  # line of its own, each word followed by a comma.
+  def c_rows(s,suffix="UL"):
+    return "".join([
+      "%s\n"%"".join(["%s%s,"%(v,suffix) for v in words])
+      for words in zip(*s.columns)])
+
+
+## Converts a batch of pipeline inputs into a list of uint64 columns, column i
+# holding the i-th word of every input.
+#
+# @param x Either an instance of InputColumns, a one-dimensional array of
+# inputs (only if input_words is 1), a two-dimensional array of shape 
+# (input_words, n) or a sequence of input_words one-dimensional arrays.
+# @param input_words Number of words per input (INPUT_WORDS).
+# @return list of numpy uint64 arrays of equal length.
+def numpy_columns(x,input_words):
+  np=require_numpy()
+  if isinstance(x,InputColumns):
+    cols=[np.frombuffer(col,dtype=np.uint64) for col in x.columns]
+  elif isinstance(x,(list,tuple)) and len(x)>0 and not isinstance(x[0],int):
+    cols=[np.asarray(col,dtype=np.uint64) for col in x]
+  else:
+    x=np.asarray(x,dtype=np.uint64)
+    cols=[x] if x.ndim==1 else list(x)
+  
+  if len(cols)!=input_words:
+    raise ValueError(
+      "expected %i input columns, got %i"%(input_words,len(cols)))
+  if any([len(col)!=len(cols[0]) for col in cols]):
+    raise ValueError("input columns differ in length")
+  return cols
@@ -0,0 +1,184 @@
+from array import array
+from collections import Counter
+
+## Compressed encoding of lut core bitstreams for storage in boot memory.
+#
+# Bitstreams consist mostly of zero words (unused PLA interconnects, or plane
+# padding, zero-extended input decoder registers) and a small number of
+# repeated words. The compressed form consists of a dictionary of repeated
+# words followed by a stream of 32-bit tokens, each holding a kind in its two
+# most significant bits and a count or index in the remaining 30 bits:
+#
+#  - ZERO n:    emit n zero words. ZERO 0 terminates the stream.
+#  - LITERAL n: emit the n words following the token.
+#  - DICT i:    emit dictionary word i.
+#  - REPEAT n:  emit the previously emitted word n more times.
+#
+# Serialized (see data), the encoding is a sequence of 32-bit little-endian
+# words: the dictionary size, the dictionary words, then the tokens with
+# their literal words. 64-bit words are stored as pairs of 32-bit words,
+# least significant first, thus the data only requires 32-bit alignment. This
+# is the format decoded by the startup routine of riscv-lut-startup -z.
+class CompressedBitstream:
+
+  ZERO=0
+  LITERAL=1
+  DICT=2
+  REPEAT=3
+
+  ## Largest count or index of a token.
+  COUNT_MAX=(1<<30)-1
+
+  ## Estimated cycles of the startup routines per token and per emitted word,
+  # by token kind, counting one cycle per executed instruction of the loops
+  # emitted by riscv-lut-startup.
+  CYCLES_PER_TOKEN={ZERO:9,LITERAL:9,DICT:18,REPEAT:11}
+  CYCLES_PER_WORD={ZERO:3,LITERAL:8,DICT:0,REPEAT:3}
+
+  ## Estimated cycles per word of the uncompressed startup routine.
+  CYCLES_PER_WORD_UNCOMPRESSED=36
+
+  ## @param dictionary List of dictionary words.
+  # @param tokens List of pairs (kind, count or index), the literal words
+  # being stored in `literals`, in order.
+  def __init__(s,dictionary,tokens,literals):
+    s.dictionary=dictionary
+    s.tokens=tokens
+    s.literals=literals
+
+  ## Compresses a bitstream given as sequence of 64-bit words.
+  @staticmethod
+  def encode(words):
+    # runs of identical words
+    runs=[]
+    for v in words:
+      if runs and runs[-1][0]==v:
+        runs[-1][1]+=1
+      else:
+        runs.append([v,1])
+
+    # a dictionary entry pays off for words starting at least three runs
+    heads=Counter([v for v,n in runs if v!=0])
+    dictionary=sorted([v for v,c in heads.items() if c>=3])
+    index={ v:i for i,v in enumerate(dictionary) }
+
+    tokens=[]
+    literals=[]
+    pending=0
+    def emit(kind,n):
+      while n>0:
+        tokens.append((kind,min(n,CompressedBitstream.COUNT_MAX)))
+        n-=tokens[-1][1]
+    def flush():
+      nonlocal pending
+      emit(CompressedBitstream.LITERAL,pending)
+      pending=0
+
+    for v,n in runs:
+      if v==0:
+        flush()
+        emit(CompressedBitstream.ZERO,n)
+        continue
+      if v in index:
+        flush()
+        tokens.append((CompressedBitstream.DICT,index[v]))
+      else:
+        literals.append(v)
+        pending+=1
+      if n>1:
+        flush()
+        emit(CompressedBitstream.REPEAT,n-1)
+    flush()
+    tokens.append((CompressedBitstream.ZERO,0))
+
+    return CompressedBitstream(dictionary,tokens,literals)
+
+  ## Serializes the compressed bitstream into an array of 32-bit words.
+  def data(s):
+    r=array("I",[len(s.dictionary)])
+    for v in s.dictionary:
+      r.extend([v&0xffffffff,v>>32])
+    literals=iter(s.literals)
+    for kind,n in s.tokens:
+      r.append((kind<<30)|n)
+      if kind==CompressedBitstream.LITERAL:
+        for i in range(n):
+          v=next(literals)
+          r.extend([v&0xffffffff,v>>32])
+    return r
+
+  ## Parses serialized data as returned by data.
+  @staticmethod
+  def decode(data):
+    data=iter(data)
+    def word():
+      lo=next(data)
+      return lo|(next(data)<<32)
+
+    dictionary=[word() for i in range(next(data))]
+    tokens=[]
+    literals=[]
+    while True:
+      token=next(data)
+      (kind,n)=(token>>30,token&CompressedBitstream.COUNT_MAX)
+      tokens.append((kind,n))
+      if kind==CompressedBitstream.ZERO and n==0:
+        break
+      if kind==CompressedBitstream.LITERAL:
+        literals.extend([word() for i in range(n)])
+    return CompressedBitstream(dictionary,tokens,literals)
+
+  ## Decompresses the bitstream into an array of 64-bit words.
+  def words(s):
+    r=array("Q")
+    literals=iter(s.literals)
+    prev=0
+    for kind,n in s.tokens:
+      if kind==CompressedBitstream.ZERO:
+        r.frombytes(bytes(8*n))
+        prev=0
+      elif kind==CompressedBitstream.LITERAL:
+        for i in range(n):
+          prev=next(literals)
+          r.append(prev)
+      elif kind==CompressedBitstream.DICT:
+        prev=s.dictionary[n]
+        r.append(prev)
+      else:
+        r.extend([prev]*n)
+    return r
+
+  ## Size of the serialized data in bytes.
+  @property
+  def size(s):
+    return 4*(1+2*len(s.dictionary)+len(s.tokens)+2*len(s.literals))
+
+  ## Number of words of the uncompressed bitstream.
+  def __len__(s):
+    return sum([
+      1 if kind==CompressedBitstream.DICT else n
+      for kind,n in s.tokens])
+
+  ## Ratio of the uncompressed to the compressed size.
+  @property
+  def ratio(s):
+    return 8*len(s)/s.size
+
+  ## Estimates the cycles taken by the decompressing startup routine.
+  def estimate_cycles(s):
+    r=0
+    for kind,n in s.tokens:
+      r+=CompressedBitstream.CYCLES_PER_TOKEN[kind]
+      if kind!=CompressedBitstream.DICT:
+        r+=n*CompressedBitstream.CYCLES_PER_WORD[kind]
+    return r
+
+  ## Estimates the cycles taken by the uncompressed startup routine for a
+  # bitstream of the same size.
+  def estimate_uncompressed_cycles(s):
+    return len(s)*CompressedBitstream.CYCLES_PER_WORD_UNCOMPRESSED
+
+  ## Returns a C definition of the serialized data as array of uint32_t.
+  def c_array(s,ident):
+    return "const uint32_t %s[%i] = {%s};\n"%(
+      ident,s.size//4,",".join(["%suL"%v for v in s.data()]))
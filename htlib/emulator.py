@@ -0,0 +1,374 @@
+import os
+import pty
+import tty
+import time
+import select
+import socket
+import struct
+import random
+import threading
+from collections import deque
+from .iface import (
+  CMD_ECHO,
+  CMD_CFG_INPUT_WORDS, CMD_CFG_SELECTOR_BITS, CMD_CFG_INTERPOLATION_BITS,
+  CMD_CFG_SEGMENT_BITS, CMD_CFG_PLA_INTERCONNECTS, CMD_CFG_BASE_BITS,
+  CMD_CFG_INCLINE_BITS, CMD_CFG_CONTROLLER_DELAY, CMD_CFG_INPUT_DECODER_DELAY,
+  CMD_CFG_ADDRESS_TRANSLATOR_DELAY, CMD_CFG_INTERPOLATOR_DELAY,
+  CMD_CORE_RST, CMD_CORE_STAT, CMD_CORE_EXE, CMD_CORE_CFG, CMD_CORE_EXE_BEGIN,
+  CMD_DIAG_CLOCK_COUNTER, CMD_DIAG_OUTPUT_COUNTER)
+from .lut_core import LUTCoreControl
+from .framing import FRAME_IDLE_TIMEOUT, FrameDecoder, pack_frame
+
+## Software emulation of the lut core hardware test (ht_lut_core.vhd).
+#
+# Implements the command set of the hardware test state machine: echo, the
+# CMD_CFG_* architecture queries, CMD_CORE_RST/STAT/EXE/CFG/EXE_BEGIN and the
+# DIAG counters. The architecture is taken from an IFace (e.g. one without a
+# port, see IFace.load_arch_file), results are computed by the simulation of
+# the configured bitstream and the status word follows the state machine of
+# lut_controller.vhd, as decoded by LUTCoreControl.core_status.
+#
+# Also modelled are two quirks of the state machine: CMD_CORE_EXE waits for a
+# result only if the last of CMD_CORE_CFG and CMD_CORE_EXE_BEGIN was a
+# CMD_CORE_CFG, and an execution requested before configuration completes
+# never yields a result, leaving the state machine stuck until reset.
+#
+# Timing is modelled on a virtual clock if a baud rate is given: each byte
+# takes 10 bit times on the line in either direction (8N1), the state machine
+# handles one command at a time and returns to idle only after transmitting
+# its response, and executions take the datapath delay in clock cycles.
+# Unlike the UART receiver of the hardware test, received bytes are buffered
+# while the state machine is busy, as host-side pipelining assumes.
+#
+# With framed set, the emulator implements the framed protocol of
+# uart_framer.vhd (see framing) on top of the state machine, each request
+# frame's payload being handled as received at the end of the frame. For
+# testing recovery, bytes may be dropped or corrupted at random in either
+# direction at a given error rate.
+#
+# The emulator is served on a pseudo-terminal (open_pty) or TCP socket
+# (serve_socket), responses being written once their virtual transmission
+# completes. feed may be used directly to drive the emulator without I/O.
+class DeviceEmulator:
+
+  ## Clock frequency of the hardware test (C_CLK_FREQ).
+  CLOCK_FREQ=100000000
+
+  ## Interval in seconds in which the serving thread checks for close.
+  POLL_INTERVAL=0.1
+
+  ## @param iface IFace holding the architecture to emulate.
+  # @param baud Line rate in baud, or None to respond without delay.
+  # @param clock_freq Clock frequency of the state machine and core.
+  # @param framed Set to true to emulate a hardware test built for the framed
+  # protocol.
+  # @param error_rate Probability of each byte received or transmitted to be
+  # dropped or to have a bit flipped, half of the errors being drops.
+  # @param seed Seed of the random error injection.
+  def __init__(s,iface,baud=None,clock_freq=None,framed=False,error_rate=0.0,
+    seed=None):
+    s.iface=iface
+    s.ctrl=LUTCoreControl(iface)
+    s.baud=baud
+    s.clock_freq=clock_freq if clock_freq!=None else DeviceEmulator.CLOCK_FREQ
+    s.framed=framed
+    s.error_rate=error_rate
+    s.errors=0
+    s._random=random.Random(seed)
+    s._thread=None
+    s._stop=threading.Event()
+    s._listener=None
+
+    arch=iface.arch
+    s.queries={
+      CMD_CFG_INPUT_WORDS: arch.INPUT_WORDS,
+      CMD_CFG_SELECTOR_BITS: arch.SELECTOR_BITS,
+      CMD_CFG_INTERPOLATION_BITS: arch.INTERPOLATION_BITS,
+      CMD_CFG_SEGMENT_BITS: arch.SEGMENT_BITS,
+      CMD_CFG_PLA_INTERCONNECTS: arch.PLA_INTERCONNECTS,
+      CMD_CFG_BASE_BITS: arch.BASE_BITS,
+      CMD_CFG_INCLINE_BITS: arch.INCLINE_BITS,
+      CMD_CFG_CONTROLLER_DELAY: arch.CONTROLLER_DELAY,
+      CMD_CFG_INPUT_DECODER_DELAY: arch.INPUT_DECODER_DELAY,
+      CMD_CFG_ADDRESS_TRANSLATOR_DELAY: arch.ADDRESS_TRANSLATOR_DELAY,
+      CMD_CFG_INTERPOLATOR_DELAY: arch.INTERPOLATOR_DELAY
+    }
+    s.reset()
+
+  ## Resets the emulated board, as by its reset button.
+  def reset(s):
+    s._rx=bytearray()
+    s._rx_times=deque()
+    s._rx_free=0.0
+    s._busy=0.0
+    s.stuck=False
+    s.post_exe_wait=False
+    s.clock_counter=0
+    s.output_counter=0
+    s._decoder=FrameDecoder(FRAME_IDLE_TIMEOUT)
+    # sequence number and response of the last executed frame
+    s._kept=None
+    s.core_reset()
+
+  ## Resets the emulated core, as by CMD_CORE_RST.
+  def core_reset(s):
+    s.cfg_words=[]
+    s.ready=False
+    s.error=False
+    s.e_invalid_cfg=0
+    s.e_premature_exe=0
+    s.e_status=0
+    s.intermediate=None
+
+  ## Number of clock cycles from execution request to result.
+  @property
+  def latency(s):
+    arch=s.iface.arch
+    return (arch.CONTROLLER_DELAY+arch.INPUT_DECODER_DELAY+
+      arch.ADDRESS_TRANSLATOR_DELAY+1+arch.INTERPOLATOR_DELAY)
+
+  ## The status word as reported by CMD_CORE_STAT.
+  def status(s):
+    return (
+      (len(s.cfg_words)&0xffff)<<8 | s.e_status<<3 |
+      s.e_premature_exe<<1 | s.e_invalid_cfg)
+
+  def _word(s,v):
+    return struct.pack("<I" if s.iface.WORD_SIZE==32 else "<Q",
+      v&((1<<s.iface.WORD_SIZE)-1))
+
+  def _configure(s,w):
+    arch=s.iface.arch
+    if s.ready or s.error:
+      s.error=True
+      s.ready=False
+      s.e_invalid_cfg=1
+      s.e_status=3
+      return
+    s.cfg_words.append(w)
+    if len(s.cfg_words)>arch.CFG_LUT_REGISTER_COUNT:
+      s.e_status=1
+    if len(s.cfg_words)==arch.CFG_REGISTER_COUNT:
+      s.ready=True
+      s.e_status=2
+
+  ## Executes an input on the core, returning the result or None if the core
+  # is not configured.
+  def _execute(s,words):
+    if not s.ready:
+      s.error=True
+      s.e_premature_exe=1
+      return None
+    if s.intermediate==None:
+      s.intermediate=s.ctrl.decompile_bitstream(s.cfg_words)
+    s.output_counter+=1
+    x=0
+    for i,v in enumerate(words):
+      x|=v<<(i*s.iface.WORD_SIZE)
+    return s.intermediate.sim(x)
+
+  ## Number of data bytes following a command byte.
+  def _request_size(s,cmd):
+    word=s.iface.WORD_SIZE//8
+    if cmd in (CMD_ECHO,CMD_CORE_CFG):
+      return word
+    if cmd in (CMD_CORE_EXE,CMD_CORE_EXE_BEGIN):
+      return word*s.iface.INPUT_WORDS
+    return 0
+
+  ## Handles a single command, returning the response and the number of clock
+  # cycles taken before transmitting it.
+  def _command(s,cmd,data):
+    if cmd==CMD_ECHO:
+      return (data,0)
+    if cmd in s.queries:
+      return (bytes([s.queries[cmd]&0xff]),0)
+    if cmd==CMD_CORE_RST:
+      s.core_reset()
+    elif cmd==CMD_CORE_STAT:
+      return (s._word(s.status()),2)
+    elif cmd==CMD_CORE_CFG:
+      s.post_exe_wait=True
+      s._configure(s.iface.unpack_word(data))
+    elif cmd in (CMD_CORE_EXE,CMD_CORE_EXE_BEGIN):
+      if cmd==CMD_CORE_EXE_BEGIN:
+        s.post_exe_wait=False
+      word=s.iface.WORD_SIZE//8
+      y=s._execute([
+        s.iface.unpack_word(data[i:i+word]) for i in range(0,len(data),word)])
+      if s.post_exe_wait:
+        if y==None:
+          s.stuck=True
+          return (b"",0)
+        s.clock_counter=s.latency
+        return (s._word(y),s.latency)
+    elif cmd==CMD_DIAG_CLOCK_COUNTER:
+      return (s._word(s.clock_counter),0)
+    elif cmd==CMD_DIAG_OUTPUT_COUNTER:
+      return (s._word(s.output_counter),0)
+    return (b"",0)
+
+  ## Drops or corrupts bytes at random, see error_rate.
+  def _inject(s,data):
+    if not s.error_rate:
+      return data
+    r=bytearray()
+    for b in data:
+      if s._random.random()<s.error_rate:
+        s.errors+=1
+        if s._random.random()<0.5:
+          continue
+        b^=1<<s._random.randrange(8)
+      r.append(b)
+    return bytes(r)
+
+  ## Passes bytes received at virtual time t to the emulated state machine.
+  #
+  # @return a list of tuples (time, data) of responses, time being the virtual
+  # time at which the transmission of data completes.
+  def feed(s,data,t=0.0):
+    byte_time=10/s.baud if s.baud else 0.0
+    data=s._inject(data)
+    if s.framed:
+      r=[]
+      for b in data:
+        s._rx_free=max(s._rx_free,t)+byte_time
+        for frame in s._decoder.feed((b,),s._rx_free):
+          r.extend(s._frame(frame,s._rx_free,byte_time))
+      return r
+
+    for b in data:
+      s._rx_free=max(s._rx_free,t)+byte_time
+      s._rx.append(b)
+      s._rx_times.append(s._rx_free)
+    return s._process(byte_time)
+
+  ## Handles a request frame received at virtual time t, see feed.
+  def _frame(s,frame,t,byte_time):
+    if s.stuck:
+      return []
+    if not frame.payload:
+      # resync
+      response=b""
+    elif s._kept!=None and s._kept[0]==frame.seq:
+      response=s._kept[1]
+    else:
+      s._rx.extend(frame.payload)
+      s._rx_times.extend([t]*len(frame.payload))
+      # responses are collected by the framer at the clock rate
+      response=b"".join([data for (_,data) in s._process(0.0)])
+      if s.stuck:
+        return []
+      s._kept=(frame.seq,response)
+    
+    raw=pack_frame(frame.seq,response)
+    s._busy=max(s._busy,t)+len(raw)*byte_time
+    return [(s._busy,s._inject(raw))]
+
+  ## Runs the state machine on the bytes received, see feed.
+  def _process(s,byte_time):
+    r=[]
+    while s._rx and not s.stuck:
+      cmd=s._rx[0]
+      n=1+s._request_size(cmd)
+      if len(s._rx)<n:
+        break
+      received=s._rx_times[n-1]
+      data=bytes(s._rx[1:n])
+      del s._rx[:n]
+      for i in range(n):
+        s._rx_times.popleft()
+
+      (response,cycles)=s._command(cmd,data)
+      start=max(s._busy,received)+cycles/s.clock_freq
+      s._busy=start+len(response)*byte_time
+      if response:
+        r.append((s._busy,response))
+
+    if s.stuck:
+      s._rx.clear()
+      s._rx_times.clear()
+    return r
+
+  ## Serves the emulator on a file descriptor until closed.
+  def _serve(s,fd):
+    t0=time.monotonic()
+    pending=deque()
+    try:
+      while not s._stop.is_set():
+        now=time.monotonic()-t0
+        while pending and pending[0][0]<=now:
+          os.write(fd,pending.popleft()[1])
+        timeout=DeviceEmulator.POLL_INTERVAL
+        if pending:
+          timeout=min(timeout,pending[0][0]-now)
+
+        (ready,_,_)=select.select([fd],[],[],max(0,timeout))
+        if not ready:
+          continue
+        data=os.read(fd,65536)
+        if not data:
+          break
+        pending.extend(s.feed(data,time.monotonic()-t0))
+    except OSError:
+      # the other end was closed
+      pass
+
+  def _start(s,target,*args):
+    s._stop.clear()
+    s._thread=threading.Thread(target=target,args=args,daemon=True)
+    s._thread.start()
+
+  ## Serves the emulator on a new pseudo-terminal.
+  #
+  # @return the name of the terminal, to be passed to IFace as port.
+  def open_pty(s):
+    (master,slave)=pty.openpty()
+    tty.setraw(slave)
+    s._fds=(master,slave)
+    s._start(s._serve,master)
+    return os.ttyname(slave)
+
+  ## Serves the emulator on a TCP socket, accepting one connection at a time.
+  #
+  # Connect with serial.serial_for_url("socket://host:port").
+  #
+  # @return the address the socket is bound to.
+  def serve_socket(s,address=("localhost",0)):
+    s._listener=socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+    s._listener.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+    s._listener.bind(address)
+    s._listener.listen(1)
+    s._listener.settimeout(DeviceEmulator.POLL_INTERVAL)
+    s._fds=()
+    s._start(s._accept)
+    return s._listener.getsockname()
+
+  def _accept(s):
+    while not s._stop.is_set():
+      try:
+        (conn,peer)=s._listener.accept()
+      except socket.timeout:
+        continue
+      with conn:
+        s.reset()
+        s._serve(conn.fileno())
+
+  ## Stops serving and closes the pseudo-terminal or socket.
+  def close(s):
+    if s._thread==None:
+      return
+    s._stop.set()
+    s._thread.join()
+    s._thread=None
+    for fd in s._fds:
+      os.close(fd)
+    if s._listener!=None:
+      s._listener.close()
+      s._listener=None
+
+  def __enter__(s):
+    return s
+
+  def __exit__(s,ty,value,tb):
+    s.close()
@@ -1,2 +1,3 @@
 
 class TestFailure(Exception) : pass
+class ArchMismatch(Exception) : pass
@@ -0,0 +1,106 @@
+from collections import namedtuple
+
+## @package framing
+# Framed, checksummed variant of the UART protocol of the hardware tests, see
+# IFace.enable_framing and uart_framer.vhd.
+#
+# A frame consists of the sync byte FRAME_SYNC, a sequence number, the length
+# of the payload, the payload of at most FRAME_MAX_PAYLOAD bytes and a CRC-8
+# over sequence number, length and payload (see crc8):
+#
+#   | SYNC | SEQ | LEN | PAYLOAD ... | CRC |
+#
+# The payload of a request frame is a sequence of commands as sent by the raw
+# protocol, which the hardware test executes in order. Each valid request
+# frame is answered by a response frame of the same sequence number, carrying
+# the concatenated responses of the commands. Frames with a bad CRC are
+# dropped, receiving resuming at the next sync byte, as are partial frames
+# once the line has been idle for FRAME_IDLE_TIMEOUT.
+#
+# The response of the last executed request frame is kept. A request frame
+# repeating its sequence number is not executed again but answered by the kept
+# response, thus a frame whose response was lost may be retransmitted without
+# repeating commands like CMD_CFG_WORD.
+#
+# An empty request frame is a resync command: it is answered by an empty
+# response frame of its sequence number, leaving the kept response intact.
+
+FRAME_SYNC = 0xa5
+FRAME_MAX_PAYLOAD = 255
+## Number of bytes of a frame besides its payload.
+FRAME_OVERHEAD = 4
+## Time in seconds after which the hardware test drops a partial frame.
+FRAME_IDLE_TIMEOUT = 0.001
+
+FRAME_CRC_POLY = 0x07
+FRAME_CRC_INIT = 0xff
+
+def _crc8_table():
+  r=[]
+  for v in range(256):
+    for i in range(8):
+      v=((v<<1)^FRAME_CRC_POLY if v&0x80 else v<<1)&0xff
+    r.append(v)
+  return r
+
+_CRC8_TABLE=_crc8_table()
+
+## Computes the CRC-8 (polynomial FRAME_CRC_POLY, not reflected) of bytes-like
+# data, continuing from crc.
+def crc8(data,crc=FRAME_CRC_INIT):
+  for b in data:
+    crc=_CRC8_TABLE[crc^b]
+  return crc
+
+## Encodes a frame of a sequence number and a bytes-like payload.
+def pack_frame(seq,payload):
+  if len(payload)>FRAME_MAX_PAYLOAD:
+    raise ValueError(
+      "frame payload of %i bytes exceeds %i bytes"
+      %(len(payload),FRAME_MAX_PAYLOAD))
+  head=bytes([seq&0xff,len(payload)])
+  return bytes([FRAME_SYNC])+head+bytes(payload)+bytes([
+    crc8(payload,crc8(head))])
+
+## Incremental decoder of a stream of frames, as run by the receiving side of
+# uart_framer.vhd.
+class FrameDecoder:
+
+  frame_t=namedtuple("frame_t","seq payload")
+  # locate the type by its attribute, as required for pickling
+  frame_t.__qualname__="FrameDecoder.frame_t"
+
+  ## @param timeout Idle time in seconds after which a partial frame is
+  # dropped, or None to keep partial frames.
+  def __init__(s,timeout=None):
+    s.timeout=timeout
+    s.errors=0
+    s.reset()
+
+  ## Drops a partial frame.
+  def reset(s):
+    s._buf=bytearray()
+    s._last=None
+
+  ## Decodes bytes received at time t.
+  #
+  # @return a list of frame_t of the frames completed.
+  def feed(s,data,t=0.0):
+    r=[]
+    if (s._buf and s.timeout!=None and s._last!=None and
+      t-s._last>s.timeout):
+      s._buf.clear()
+    s._last=t
+    for b in data:
+      buf=s._buf
+      if not buf and b!=FRAME_SYNC:
+        continue
+      buf.append(b)
+      if len(buf)<3 or len(buf)<buf[2]+FRAME_OVERHEAD:
+        continue
+      if crc8(buf[1:-1])==buf[-1]:
+        r.append(FrameDecoder.frame_t(buf[1],bytes(buf[3:-1])))
+      else:
+        s.errors+=1
+      buf.clear()
+    return r
@@ -5,6 +5,15 @@ import math
 import os
 import re
 from .error import TestFailure
+from .arch import Arch
+from .columns import InputColumns
+from .metrics import TransportMetrics
+from .framing import (
+  FRAME_SYNC, FRAME_MAX_PAYLOAD, FRAME_IDLE_TIMEOUT, crc8, pack_frame)
+import sys
+import time
+from array import array
+from collections import deque
 
 CMD_ECHO = 0x01
 CMD_CFG_WORD = 0x10
@@ -43,6 +52,11 @@ CMD_DIAG_OUTPUT_COUNTER = 0x41
 class IFace(serial.Serial):
   
   def __init__(s,port=None,baud=921600):
+    s._arch=None
+    s.metrics=None
+    s.framed=False
+    s.retransmissions=0
+    s._seq=0
     if port!=None:
       serial.Serial.__init__(s,port=port,baudrate=baud)
     s._word_size=64
@@ -61,33 +75,236 @@ class IFace(serial.Serial):
 
     s.load_config_file()
   
+  ## Names of the attributes holding the architecture parameters.
+  _ARCH_ATTRS=frozenset(["_%s"%f.lower() for f in Arch.PARAMS])
+
+  def __setattr__(s,name,value):
+    serial.Serial.__setattr__(s,name,value)
+    if name in IFace._ARCH_ATTRS:
+      serial.Serial.__setattr__(s,"_arch",None)
+
+  ## The current architecture parameters and derived sizes as instance of
+  # Arch.
+  #
+  # The instance is created on first access and replaced whenever a parameter
+  # changes, e.g. by load_config, load_config_file or load_arch_file.
+  @property
+  def arch(s):
+    if s._arch==None:
+      s._arch=Arch.from_iface(s)
+    return s._arch
+
+  ## Enables collecting transport metrics, see TransportMetrics.
+  #
+  # @return the TransportMetrics instance, also available as `metrics`.
+  def enable_metrics(s):
+    if s.metrics==None:
+      names={ 
+        v:k for k,v in globals().items() 
+        if k.startswith("CMD_") and isinstance(v,int) }
+      s.metrics=TransportMetrics(getattr(s,"_baudrate",None),names)
+    return s.metrics
+  
+  def disable_metrics(s):
+    s.metrics=None
+
+  def write(s,data):
+    if s.metrics==None:
+      return serial.Serial.write(s,data)
+    t=time.perf_counter()
+    r=serial.Serial.write(s,data)
+    s.metrics.record_write(len(data),time.perf_counter()-t)
+    return r
+
+  def read(s,size=1):
+    if s.metrics==None:
+      return serial.Serial.read(s,size)
+    t=time.perf_counter()
+    r=serial.Serial.read(s,size)
+    s.metrics.record_read(len(r),time.perf_counter()-t)
+    return r
+
+  ## Default timeout in seconds waiting for a response frame.
+  FRAME_TIMEOUT=0.1
+  ## Default number of retransmissions of a request frame before giving up.
+  FRAME_RETRIES=8
+
+  ## Switches to the framed protocol (see framing), which the hardware test
+  # must have been built for (C_FRAMED of test_package.vhd).
+  #
+  # Each command, or batch of commands, is sent as a request frame and its
+  # response frame is awaited. A request frame whose response does not arrive
+  # in time or arrives corrupted is retransmitted after a resync, thus
+  # dropped or corrupted bytes no longer desynchronize the session.
+  #
+  # @param timeout Timeout in seconds waiting for a response frame, defaults
+  # to FRAME_TIMEOUT.
+  # @param retries Number of retransmissions, defaults to FRAME_RETRIES.
+  def enable_framing(s,timeout=None,retries=None):
+    s.frame_timeout=timeout if timeout!=None else s.FRAME_TIMEOUT
+    s.frame_retries=retries if retries!=None else s.FRAME_RETRIES
+    if getattr(s,"is_open",False):
+      s.timeout=s.frame_timeout
+    s.framed=True
+    s.resync()
+
+  def disable_framing(s):
+    s.framed=False
+
+  ## Reads the response frame of sequence number seq.
+  #
+  # @return the payload, or None on a timeout or bad CRC.
+  def _read_frame(s,seq):
+    while True:
+      b=s.read(1)
+      if len(b)==0:
+        return None
+      if b[0]!=FRAME_SYNC:
+        continue
+      head=s.read(2)
+      if len(head)!=2:
+        return None
+      rest=s.read(head[1]+1)
+      if len(rest)!=head[1]+1 or crc8(rest[:-1],crc8(head))!=rest[-1]:
+        return None
+      # skip stale responses, e.g. to a retransmitted frame
+      if head[0]==seq:
+        return rest[:-1]
+
+  ## Resynchronizes with the hardware test after a lost or corrupted frame.
+  #
+  # Drops any pending input, waits for the hardware test to drop a partial
+  # frame and exchanges a resync frame.
+  #
+  # @throws TestFailure The hardware test does not respond.
+  def resync(s):
+    for attempt in range(s.frame_retries+1):
+      if getattr(s,"is_open",False):
+        s.reset_input_buffer()
+      time.sleep(FRAME_IDLE_TIMEOUT*2)
+      # distinct from the sequence numbers of request frames in flight
+      seq=(s._seq+0x80)&0xff
+      s.write(pack_frame(seq,b""))
+      if s._read_frame(seq)!=None:
+        return
+    raise TestFailure("no response to resync")
+
+  ## Sends a request frame and returns the payload of its response frame,
+  # retransmitting the request frame as needed.
+  #
+  # @param size Expected number of response bytes.
+  # @throws TestFailure The response frame does not arrive after all
+  # retransmissions or differs in size.
+  def _exchange(s,payload,size):
+    s._seq=(s._seq+1)&0xff
+    frame=pack_frame(s._seq,payload)
+    for attempt in range(s.frame_retries+1):
+      if attempt>0:
+        s.retransmissions+=1
+        s.resync()
+      s.write(frame)
+      r=s._read_frame(s._seq)
+      if r==None:
+        continue
+      if len(r)!=size:
+        raise TestFailure(
+          "expected %i response bytes in frame %i, got %i"
+          %(size,s._seq,len(r)))
+      return r
+    raise TestFailure(
+      "no response to frame %i after %i retransmissions"
+      %(s._seq,s.frame_retries))
+
+  ## Sends a request without response.
+  def _send(s,cmd,raw):
+    if s.framed:
+      s._exchange(raw,0)
+    else:
+      s.write(raw)
+    if s.metrics!=None:
+      s.metrics.count(cmd)
+  
+  ## Sends a request and reads a response of `size` bytes.
+  def _request(s,cmd,raw,size):
+    t=time.perf_counter()
+    if s.framed:
+      r=s._exchange(raw,size)
+    else:
+      s.write(raw)
+      r=s.read(size)
+    if s.metrics!=None:
+      s.metrics.count(cmd)
+      s.metrics.record_rtt(time.perf_counter()-t)
+    return r
+
+  ## Encodes a command with zero or one words of data, as sent by command0,
+  # command8 and command.
+  def pack_command(s,cmd,data=None):
+    if data==None:
+      return struct.pack("<B",cmd)
+    if s._word_size==32:
+      return struct.pack("<BI",cmd,data)
+    return struct.pack("<BQ",cmd,data)
+  
+  ## Encodes a command with a data value represented as pipeline input, as
+  # sent by command0i and commandi.
+  def pack_input(s,cmd,data):
+    words=s.split_input(data)
+    
+    ty="I" if s._word_size==32 else "Q"
+    return struct.pack("<B%s"%(ty*s.INPUT_WORDS),cmd,*words)
+  
+  ## Number of data bytes of a command sent by command_inter.
+  def inter_byte_count(s):
+    return math.ceil(
+      (s.SELECTOR_BITS+s.INTERPOLATION_BITS+s.BASE_BITS+s.INCLINE_BITS)/32)*4
+  
+  ## Encodes a command with a 4-tuple of data represented as input to the 
+  # interpolation unit, as sent by command_inter.
+  def pack_inter(s,cmd,selector,interpolator,base,incline):
+    word=0
+    word=(word<<s.SELECTOR_BITS) | selector
+    word=(word<<s.INTERPOLATION_BITS) | interpolator 
+    word=(word<<s.BASE_BITS) | base
+    word=(word<<s.INCLINE_BITS) | incline
+    
+    return bytes([cmd])+word.to_bytes(s.inter_byte_count(),"little")
+  
+  ## Decodes a single word response.
+  def unpack_word(s,raw):
+    if s._word_size==32:
+      return struct.unpack("<I",raw[:4])[0]
+    return struct.unpack("<Q",raw[:8])[0]
+
   ## Executes a command with no response and zero or one words of details.
   #
   # @param cmd command (`CMD_*`) constant to execute, must be between 0 and 255.
   # @param data Optional word of data (must be between 0 and 2^WORD_SIZE-1).
   def command0(s,cmd,data=None):
-    if data==None:
-      raw=struct.pack("<B",cmd)
-    else:
-      if s._word_size==32:
-        raw=struct.pack("<BI",cmd,data)
-      else:
-        raw=struct.pack("<BQ",cmd,data)
-    s.write(raw)
+    s._send(cmd,s.pack_command(cmd,data))
+  
+  ## Splits a pipeline input into a tuple of INPUT_WORDS words.
+  #
+  # @param data Either an integer or a tuple (or list) of words, which is
+  # returned as is.
+  def split_input(s,data):
+    if isinstance(data,(tuple,list)):
+      if len(data)!=s.INPUT_WORDS:
+        raise ValueError(
+          "expected %i input words, got %i"%(s.INPUT_WORDS,len(data)))
+      return data
+    return [
+      (data>>(s.WORD_SIZE*shamt))&((1<<s.WORD_SIZE)-1)
+      for shamt in range(s.INPUT_WORDS)]
   
   ## Executes a command with no response and a single data value represented as
   # a pipeline input.
   #
   # @param cmd command (`CMD_*`) constant to execute, must be between 0 and 255.
-  # @param data Data value to be encoded as a tuple of INPUT_WORDS words.
+  # @param data Data value to be encoded as a tuple of INPUT_WORDS words. May
+  # also be given as such a tuple, e.g. a row of InputColumns.
   def command0i(s,cmd,data=None):
-    words=[
-      (data>>(s.WORD_SIZE*shamt))&((1<<s.WORD_SIZE)-1)
-      for shamt in range(s.INPUT_WORDS)]
-
-    ty="I" if s._word_size==32 else "Q"
-    raw=struct.pack("<B%s"%(ty*s.INPUT_WORDS),cmd,*words)
-    s.write(raw)
+    s._send(cmd,s.pack_input(cmd,data))
   
   ## Executes a command with a single byte response and zero or one words of
   # data.
@@ -97,15 +314,7 @@ class IFace(serial.Serial):
   # @return A single byte, as integer
 
   def command8(s,cmd,data=None):
-    if data==None:
-      raw=struct.pack("<B",cmd)
-    else:
-      if s._word_size==32:
-        raw=struct.pack("<BI",cmd,data)
-      else:
-        raw=struct.pack("<BQ",cmd,data)
-    s.write(raw)
-    raw=s.read(1)
+    raw=s._request(cmd,s.pack_command(cmd,data),1)
     return struct.unpack("<B",raw)[0]
     
   ## Executes a command with a single word response and zero or one words of
@@ -115,20 +324,8 @@ class IFace(serial.Serial):
   # @param data Optional word of data (must be between 0 and 2^WORD_SIZE-1).
   # @return A single word, as integer
   def command(s,cmd,data=None):
-    if data==None:
-      raw=struct.pack("<B",cmd)
-    else:
-      if s._word_size==32:
-        raw=struct.pack("<BI",cmd,data)
-      else:
-        raw=struct.pack("<BQ",cmd,data)
-    s.write(raw)
-    if s._word_size==32:
-      raw=s.read(4)
-      return struct.unpack("<I",raw[:4])[0]
-    else:
-      raw=s.read(8)
-      return struct.unpack("<Q",raw[:8])[0]
+    return s.unpack_word(
+      s._request(cmd,s.pack_command(cmd,data),s._word_size//8))
 
   ## Executes a command with a single word response and a 4-tuple of data
   # represented as input to the interpolation unit.
@@ -144,46 +341,188 @@ class IFace(serial.Serial):
   # @param incline Fourth part of the 4-tuple of data.
   # @return A single word, as integer
   def command_inter(s,cmd,selector,interpolator,base,incline):
-    word=0
-    word=(word<<s.SELECTOR_BITS) | selector
-    word=(word<<s.INTERPOLATION_BITS) | interpolator 
-    word=(word<<s.BASE_BITS) | base
-    word=(word<<s.INCLINE_BITS) | incline
-    
-    byte_count=math.ceil(
-      (s.SELECTOR_BITS+s.INTERPOLATION_BITS+s.BASE_BITS+s.INCLINE_BITS)/32)*4
-
-    raw=bytes([cmd]+[(word>>(8*shamt))&0xff for shamt in range(byte_count)])
-    
-    s.write(raw)
-    if s._word_size==32:
-      raw=s.read(4)
-      return struct.unpack("<I",raw[:4])[0]
-    else:
-      raw=s.read(8)
-      return struct.unpack("<Q",raw[:8])[0]
+    return s.unpack_word(s._request(
+      cmd,s.pack_inter(cmd,selector,interpolator,base,incline),
+      s._word_size//8))
   
   ## Executes a command with a single word response and a single data value 
   # represented as a pipeline input.
   #
   # @param cmd command (`CMD_*`) constant to execute, must be between 0 and 255.
-  # @param data Data value to be encoded as a tuple of INPUT_WORDS words.
+  # @param data Data value to be encoded as a tuple of INPUT_WORDS words. May
+  # also be given as such a tuple, e.g. a row of InputColumns.
   # @return A single word, as integer
   def commandi(s,cmd,data):
-    words=[
-      (data>>(s.WORD_SIZE*shamt))&((1<<s.WORD_SIZE)-1)
-      for shamt in range(s.INPUT_WORDS)]
+    return s.unpack_word(
+      s._request(cmd,s.pack_input(cmd,data),s._word_size//8))
+
+  ## Default number of batched requests kept in flight, see commandi_many.
+  #
+  # The hardware test processes one request at a time, thus requests sent
+  # ahead wait in the UART receiver. The window bounds the amount of data
+  # sent before the responses to earlier requests are read.
+  COMMAND_WINDOW=32
+
+  ## Sends requests of equal size and reads their responses of equal size,
+  # keeping at most `window` requests in flight.
+  #
+  # With framing enabled, the requests are sent in frames instead, one frame
+  # at a time, see enable_framing.
+  #
+  # @param requests Bytes-like object holding the concatenated requests.
+  # @param request_size Size of a single request in bytes.
+  # @param response_size Size of a single response in bytes, may be zero.
+  # @return a bytearray of the concatenated responses.
+  def transfer_many(s,requests,request_size,response_size,window=None):
+    window=window if window!=None else s.COMMAND_WINDOW
+    count=len(requests)//request_size
+    requests=memoryview(requests)
+    if s.metrics!=None and count>0:
+      # batches consist of a single command
+      s.metrics.count(requests[0],count)
+
+    if s.framed:
+      return s._transfer_framed(requests,request_size,response_size)
+
+    # without responses, nothing limits the requests in flight
+    if response_size==0:
+      s.write(requests)
+      return bytearray()
+    
+    responses=bytearray(count*response_size)
+    sent=0
+    received=0
+    # end index and time of the writes in flight, for the metrics
+    writes=deque()
+    while received<count:
+      n=min(count-sent,window-(sent-received))
+      if n>0:
+        s.write(requests[sent*request_size:(sent+n)*request_size])
+        sent+=n
+        if s.metrics!=None:
+          writes.append((sent,time.perf_counter()))
+      
+      # read half a window, to overlap transfers in both directions
+      n=min(sent-received,max(1,window//2))
+      raw=s.read(n*response_size)
+      if len(raw)!=n*response_size:
+        raise TestFailure(
+          "timeout waiting for response %i of %i"%(received+len(raw)//response_size,count))
+      responses[received*response_size:(received+n)*response_size]=raw
+      if s.metrics!=None:
+        now=time.perf_counter()
+        first=received
+        while first<received+n:
+          (end,t)=writes[0]
+          last=min(end,received+n)
+          s.metrics.record_rtt(now-t,last-first)
+          first=last
+          if end==last:
+            writes.popleft()
+      received+=n
+    return responses
+
+  ## Framed counterpart of transfer_many, sending as many requests per frame
+  # as fit the payloads of request and response frame.
+  def _transfer_framed(s,requests,request_size,response_size):
+    count=len(requests)//request_size
+    n=FRAME_MAX_PAYLOAD//request_size
+    if response_size>0:
+      n=min(n,FRAME_MAX_PAYLOAD//response_size)
+    if n==0:
+      raise ValueError(
+        "request of %i bytes exceeds the frame payload"%request_size)
     
+    responses=bytearray()
+    for i in range(0,count,n):
+      m=min(n,count-i)
+      t=time.perf_counter()
+      responses+=s._exchange(
+        requests[i*request_size:(i+m)*request_size],m*response_size)
+      if s.metrics!=None and response_size>0:
+        s.metrics.record_rtt(time.perf_counter()-t,m)
+    return responses
+
+  ## Converts concatenated little-endian word responses into an array.
+  def _response_words(s,raw):
+    r=array("I" if s._word_size==32 else "Q")
+    r.frombytes(bytes(raw))
+    if sys.byteorder!="little":
+      r.byteswap()
+    return r
+
+  ## Packs a command with a single data word per element of data into a 
+  # buffer.
+  def _pack_words(s,cmd,data):
     ty="I" if s._word_size==32 else "Q"
-
-    raw=struct.pack("<B%s"%(ty*s.INPUT_WORDS),cmd,*words)
-    s.write(raw)
-    if s._word_size==32:
-      raw=s.read(4)
-      return struct.unpack("<I",raw[:4])[0]
+    fmt=struct.Struct("<B%s"%ty)
+    buf=bytearray(fmt.size*len(data))
+    for i,v in enumerate(data):
+      fmt.pack_into(buf,i*fmt.size,cmd,v)
+    return (buf,fmt.size)
+
+  ## Packs a command with a pipeline input per element of xs into a buffer.
+  def _pack_inputs(s,cmd,xs):
+    if isinstance(xs,InputColumns):
+      rows=zip(*[xs.columns[i] for i in range(s.INPUT_WORDS)])
     else:
-      raw=s.read(8)
-      return struct.unpack("<Q",raw[:8])[0]
+      rows=[s.split_input(x) for x in xs]
+    
+    ty="I" if s._word_size==32 else "Q"
+    fmt=struct.Struct("<B%s"%(ty*s.INPUT_WORDS))
+    buf=bytearray(fmt.size*len(xs))
+    for i,words in enumerate(rows):
+      fmt.pack_into(buf,i*fmt.size,cmd,*words)
+    return (buf,fmt.size)
+
+  ## Executes a command with no response for each of a number of data words,
+  # see command0.
+  def command0_many(s,cmd,data,window=None):
+    (buf,size)=s._pack_words(cmd,data)
+    s.transfer_many(buf,size,0,window)
+  
+  ## Executes a command with a single word response for each of a number of
+  # data words, see command.
+  #
+  # @return an array of the response words.
+  def command_many(s,cmd,data,window=None):
+    (buf,size)=s._pack_words(cmd,data)
+    return s._response_words(
+      s.transfer_many(buf,size,s._word_size//8,window))
+
+  ## Executes a command with no response for each of a number of pipeline
+  # inputs, see command0i.
+  def command0i_many(s,cmd,xs,window=None):
+    (buf,size)=s._pack_inputs(cmd,xs)
+    s.transfer_many(buf,size,0,window)
+
+  ## Executes a command with a single word response for each of a number of 
+  # pipeline inputs, see commandi.
+  #
+  # All requests are packed into a single buffer, which is sent in chunks
+  # such that at most `window` requests are pending at a time.
+  #
+  # @param xs Sequence of pipeline inputs, either integers or tuples of 
+  # INPUT_WORDS words, or an instance of InputColumns.
+  # @param window Number of requests in flight, defaults to COMMAND_WINDOW.
+  # @return an array of the response words.
+  def commandi_many(s,cmd,xs,window=None):
+    (buf,size)=s._pack_inputs(cmd,xs)
+    return s._response_words(
+      s.transfer_many(buf,size,s._word_size//8,window))
+
+  ## Executes a command with a single word response for each of a number of 
+  # interpolation unit inputs, see command_inter.
+  #
+  # @param args Sequence of 4-tuples (selector, interpolator, base, incline).
+  # @return an array of the response words.
+  def command_inter_many(s,cmd,args,window=None):
+    size=1+s.inter_byte_count()
+    buf=bytearray(size*len(args))
+    for i,v in enumerate(args):
+      buf[i*size:(i+1)*size]=s.pack_inter(cmd,*v)
+    return s._response_words(
+      s.transfer_many(buf,size,s._word_size//8,window))
 
   ## Queries architecture-specific parameters from the connected hardware test
   # core.
@@ -281,6 +620,32 @@ class IFace(serial.Serial):
         print(
           "echo did not respond properly: expected %.8x, got %.8x"%(x,y))
   
+  ## Shifts words into a configuration daisy-chain in a single batched
+  # transfer.
+  #
+  # With verify set, the words are shifted in twice, the second pass shifting
+  # out the words left in the chain by the first one, which must match them.
+  # Thus, the chain ends up holding the words, which is confirmed by reading
+  # back its whole contents once.
+  #
+  # @param words Words in shifting order, i.e. the last word of the chain
+  # first.
+  # @return the words shifted out by the first pass, i.e. the previous 
+  # contents of the chain.
+  # @throws TestFailure The contents read back differ from the words.
+  def config_chain(s,words,verify=True):
+    words=list(words)
+    n=len(words)
+    shifted=s.command_many(CMD_CFG_WORD,words*2 if verify else words)
+    if verify:
+      diff=[i for i in range(n) if shifted[n+i]!=words[i]]
+      if diff:
+        raise TestFailure(
+          "chain readback differs in %i of %i words, first at %i: "
+          "expected %.8x, got %.8x"
+          %(len(diff),n,diff[0],words[diff[0]],shifted[n+diff[0]]))
+    return shifted[:n]
+
   ## Tests a configuration daisy-chain by filling it, emptying it and checking
   # the returned words.
   def test_config(s,count):
@@ -372,68 +737,63 @@ class IFace(serial.Serial):
   def INTERPOLATOR_DELAY(s):
     return s._interpolator_delay
   
+  # derived sizes, see Arch
+
   @property
   def INPUT_WORD_SIZE(s):
-    return s.WORD_SIZE*s.INPUT_WORDS
+    return s.arch.INPUT_WORD_SIZE
 
   @property
   def LUT_BRAM_WIDTH(s):
-    return s.BASE_BITS+s.INCLINE_BITS
+    return s.arch.LUT_BRAM_WIDTH
 
   @property
   def RAM_CONFIG_BUFFER_SIZE(s):
-    return math.ceil(s.LUT_BRAM_WIDTH/s.CFG_WORD_SIZE)
+    return s.arch.RAM_CONFIG_BUFFER_SIZE
 
   @property
   def RAM_CONFIG_BUFFER_SIZE_BITS(s):
-    return s.RAM_CONFIG_BUFFER_SIZE*s.CFG_WORD_SIZE
+    return s.arch.RAM_CONFIG_BUFFER_SIZE_BITS
 
   @property
   def CFG_LUT_REGISTER_COUNT(s):
-    return s.RAM_CONFIG_BUFFER_SIZE*(1<<s.SEGMENT_BITS)
+    return s.arch.CFG_LUT_REGISTER_COUNT
 
   @property
   def CFG_INPUT_DECODER_REGISTERS_PER_BIT(s):
-    return math.ceil(s.INPUT_WORD_SIZE/s.CFG_WORD_SIZE)
+    return s.arch.CFG_INPUT_DECODER_REGISTERS_PER_BIT
 
   @property
   def CFG_INPUT_DECODER_REGISTER_COUNT(s):
-    return (
-      s.CFG_INPUT_DECODER_REGISTERS_PER_BIT*
-      (s.SELECTOR_BITS+s.INTERPOLATION_BITS)
-      )
+    return s.arch.CFG_INPUT_DECODER_REGISTER_COUNT
 
   @property
   def CFG_PLA_AND_REGISTERS_PER_ROW(s):
-    return math.ceil(s.SELECTOR_BITS*2/s.CFG_WORD_SIZE)
+    return s.arch.CFG_PLA_AND_REGISTERS_PER_ROW
 
   @property
   def CFG_PLA_AND_REGISTER_COUNT(s):
-    return s.CFG_PLA_AND_REGISTERS_PER_ROW*s.PLA_INTERCONNECTS
+    return s.arch.CFG_PLA_AND_REGISTER_COUNT
 
   @property
   def CFG_PLA_OR_REGISTERS_PER_COLUMN(s):
-    return math.ceil(s.PLA_INTERCONNECTS/s.CFG_WORD_SIZE)
+    return s.arch.CFG_PLA_OR_REGISTERS_PER_COLUMN
 
   @property
   def CFG_PLA_OR_REGISTER_COUNT(s):
-    return s.CFG_PLA_OR_REGISTERS_PER_COLUMN*s.SEGMENT_BITS
+    return s.arch.CFG_PLA_OR_REGISTER_COUNT
 
   @property
   def CFG_PLA_REGISTER_COUNT(s):
-    return (
-      s.CFG_PLA_AND_REGISTER_COUNT +
-      s.CFG_PLA_OR_REGISTER_COUNT )
+    return s.arch.CFG_PLA_REGISTER_COUNT
 
   @property
   def CFG_CHAIN_REGISTER_COUNT(s):
-    return (
-      s.CFG_INPUT_DECODER_REGISTER_COUNT +
-      s.CFG_PLA_REGISTER_COUNT )
+    return s.arch.CFG_CHAIN_REGISTER_COUNT
 
   @property
   def CFG_REGISTER_COUNT(s):
-    return s.CFG_LUT_REGISTER_COUNT+s.CFG_CHAIN_REGISTER_COUNT
+    return s.arch.CFG_REGISTER_COUNT
 
 class IFaceRef:
   def __init__(s,iface):
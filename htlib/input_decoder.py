@@ -1,7 +1,160 @@
 from .iface import *
+from .util import require_numpy
+from .bitslice import bitslice_pack
+from .columns import InputColumns, numpy_columns
+from .intermediate import Intermediate
 import random
 from collections import namedtuple
 
+## Compiled input processor.
+#
+# Holds the crosspoint masks `choices` (one per output bit) along with the
+# word size and number of input words. Contains information for generating a
+# bitstream and a method `sim` used for simulating a hardware unit.
+# `sim_batch` performs the same simulation on a batch of inputs (see 
+# numpy_columns) and returns a uint64 array. `sim_sliced` simulates a list of
+# inputs (or an instance of InputColumns) and returns the output bits as slices
+# (see bitslice_pack).
+#
+# All simulation methods evaluate a gather plan (see plan) which is compiled
+# on first use.
+class IDECIntermediate(Intermediate):
+  __slots__=(
+    "word_size","input_words","choices",
+    "_plan","_scalar_plan","_numpy_plan","_sliced_plan")
+  fields=("word_size","input_words","choices")
+
+  ## Gather plan extracting the output bits of an input decoder from an input.
+  #
+  # `shifts` is a list of triples (word, mask, shift) each moving the bits
+  # `mask` of input word `word` to the output by shifting right by `shift`
+  # (left, if negative). These cover groups of single-bit crosspoints sharing
+  # the same distance between input and output bit, e.g. contiguous runs.
+  # `tables` is a list of triples (word, shift, tab), where `tab` maps the 
+  # byte of input word `word` starting at bit `shift` to the output bits it
+  # sets. These cover the remaining, scattered crosspoints.
+  plan_t=namedtuple("idec_plan_t","shifts tables")
+  # locate the type by its attribute, as required for pickling
+  plan_t.__qualname__="IDECIntermediate.plan_t"
+
+  ## The gather plan of this input processor, an instance of plan_t.
+  @property
+  def plan(s):
+    if s._plan==None:
+      s._plan=s.compile_plan()
+    return s._plan
+
+  ## Compiles the crosspoints into an instance of plan_t.
+  def compile_plan(s):
+    ws=s.word_size
+
+    # group single-bit crosspoints by word and distance
+    groups={}
+    scattered=[]
+    for i,arg in enumerate(s.choices):
+      if arg==0: continue
+      if arg&(arg-1)!=0:
+        scattered.append((i,arg))
+        continue
+      j=arg.bit_length()-1
+      groups.setdefault((j//ws,j%ws-i),[]).append((i,arg))
+
+    shifts=[]
+    for (word,shift),members in sorted(groups.items()):
+      if len(members)<2:
+        scattered+=members
+        continue
+      mask=sum([arg>>(ws*word) for i,arg in members])
+      shifts.append((word,mask,shift))
+
+    tabs={}
+    for i,arg in scattered:
+      for k in range(0,arg.bit_length(),8):
+        m=(arg>>k)&0xff
+        if m==0: continue
+        tab=tabs.setdefault(k,[0]*256)
+        for b in range(256):
+          if b&m: tab[b]|=1<<i
+    tables=[(k//ws,k%ws,tab) for k,tab in sorted(tabs.items())]
+    
+    return IDECIntermediate.plan_t(shifts,tables)
+
+  ## Replaces the crosspoints of output bit i.
+  #
+  # The gather plan depends on the distances between all connected input and
+  # output bits, thus it is recompiled on next use.
+  def set_choice(s,i,arg):
+    s.choices[i]=arg
+    s.reset()
+
+  def sim(s,x):
+    if s._scalar_plan==None:
+      # the scalar simulation operates on the whole input at once
+      ws=s.word_size
+      s._scalar_plan=(
+        [ 
+          (mask<<(ws*word),shift+ws*word) 
+          for word,mask,shift in s.plan.shifts ],
+        [ (shift+ws*word,tab) for word,shift,tab in s.plan.tables ])
+    (shifts,tables)=s._scalar_plan
+
+    r=0
+    for mask,shift in shifts:
+      r|=(x&mask)>>shift if shift>=0 else (x&mask)<<-shift
+    for shift,tab in tables:
+      r|=tab[(x>>shift)&0xff]
+    return r 
+
+  def sim_batch(s,x):
+    np=require_numpy()
+    cols=numpy_columns(x,s.input_words)
+    if s._numpy_plan==None:
+      s._numpy_plan=[
+        (word,np.uint64(shift),np.array(tab,dtype=np.uint64))
+        for word,shift,tab in s.plan.tables ]
+
+    r=np.zeros(len(cols[0]),dtype=np.uint64)
+    for word,mask,shift in s.plan.shifts:
+      if word>=len(cols): continue
+      v=cols[word]&np.uint64(mask)
+      r|=v>>np.uint64(shift) if shift>=0 else v<<np.uint64(-shift)
+    for word,shift,tab in s._numpy_plan:
+      if word>=len(cols): continue
+      r|=tab[((cols[word]>>shift)&np.uint64(0xff)).astype(np.intp)]
+    return r
+
+  def sim_sliced(s,xs):
+    ws=s.word_size
+    if s._sliced_plan==None:
+      # input bits connected to each output bit
+      choice_bits=[
+        [j for j in range(arg.bit_length()) if arg&(1<<j)]
+        for arg in s.choices]
+      positions=set(sum(choice_bits,[]))
+      s._sliced_plan=(
+        choice_bits,
+        positions,
+        max([arg.bit_length() for arg in s.choices]+[1]),
+        [
+          [j-ws*i for j in positions if j//ws==i]
+          for i in range(s.input_words)])
+    (choice_bits,positions,width,word_positions)=s._sliced_plan
+
+    if isinstance(xs,InputColumns):
+      bits={ j:0 for j in positions }
+      for i,col in enumerate(xs.columns[:len(word_positions)]):
+        for j,v in bitslice_pack(col,word_positions[i],ws).items():
+          bits[j+ws*i]=v
+    else:
+      bits=bitslice_pack(xs,positions,width)
+    r=[]
+    for connected in choice_bits:
+      v=0
+      for j in connected:
+        v|=bits[j]
+      r.append(v)
+    return r
+
 ## Control class corresponding to ht_input_processor.
 #
 # Offers facilities for generating a random input processor as well as an
@@ -15,10 +168,7 @@ class IDECControl(IFaceRef):
   specification_t=namedtuple("idec_specification_t","choices")
 
   ## type representing a compiled input processor.
-  #
-  # Contains information for generating a bitstream and a method `sim` used
-  # for simulating a hardware unit.
-  intermediate_t=namedtuple("idec_intermediate_t","choices sim")
+  intermediate_t=IDECIntermediate
   
 
   ## Generates a random input processor
@@ -46,6 +196,22 @@ class IDECControl(IFaceRef):
   def random_idec_input(s):
     return random.randint(0,(1<<(s.iface.WORD_SIZE*s.iface.INPUT_WORDS))-1)
   
+  ## Generates a number of random input decoder inputs in columnar form.
+  #
+  # @param singleInput Set to 1, 2 or 3 to only generate non-zero values for
+  # the respective input word, e.g. to match random_idec(singleInput).
+  # @param mask Mask applied to the non-zero input words.
+  # @return an instance of InputColumns.
+  def random_idec_inputs(s,count,singleInput=False,mask=(1<<64)-1):
+    masks=[
+      mask if singleInput not in {1,2,3} or singleInput==i+1 else 0
+      for i in range(s.iface.INPUT_WORDS)]
+    return InputColumns.random(count,s.iface.INPUT_WORDS,masks)
+
+  ## Converts a batch of input decoder inputs into a list of INPUT_WORDS
+  # uint64 columns (see numpy_columns).
+  def idec_columns(s,x):
+    return numpy_columns(x,s.iface.INPUT_WORDS)
   
   ## Compiles an input processor specification into an intermediate 
   # representation.
@@ -59,18 +225,27 @@ class IDECControl(IFaceRef):
 
     return s.idec_compile_raw(choices)
   
+  ## Recovers the specification of a compiled input processor, the inverse of
+  # idec_compile.
+  #
+  # Raises TestFailure if a crosspoint does not select exactly one input bit.
+  # Unconnected trailing output bits are omitted from the specification.
+  def idec_specification(s,inter):
+    choices=list(inter.choices)
+    while choices and choices[-1]==0:
+      choices.pop()
+    for i,arg in enumerate(choices):
+      if arg==0 or arg&(arg-1)!=0:
+        raise TestFailure(
+          "cannot represent input processor: output bit %i has %i inputs"
+          %(i,bin(arg).count("1")))
+    return IDECControl.specification_t(
+      [arg.bit_length()-1 for arg in choices])
+
   ## Compiles an list of crosspoints for input values into an intermediate
   # representation, used by idec_compile.
   def idec_compile_raw(s,choices):
-    def sim(x):
-      bits=[ 
-        (x>>i)&1 
-        for i in range(s.iface.INPUT_WORD_SIZE)]
-      r=0
-      for i,arg in enumerate(choices):
-        r+=(1<<i) if (x&arg)!=0 else 0
-      return r 
-    return IDECControl.intermediate_t(choices,sim)
+    return IDECIntermediate(s.iface.WORD_SIZE,s.iface.INPUT_WORDS,choices)
   
   ## compiles an input processor intermediate into configuration words used
   # by the configuration logic.
@@ -79,20 +254,18 @@ class IDECControl(IFaceRef):
   # input processor hardware. As it is daisy-chained by configuration logic,
   # this sequence must be _reversed_ during configuration.
   def idec_words(s,inter):
-    nwords=s.iface.CFG_INPUT_DECODER_REGISTERS_PER_BIT
-    words=sum([
-      [ 
-        (v>>(s.iface.CFG_WORD_SIZE*shamt))&((1<<s.iface.CFG_WORD_SIZE)-1) 
-        for shamt in reversed(range(nwords)) ]
+    arch=s.iface.arch
+    nwords=arch.CFG_INPUT_DECODER_REGISTERS_PER_BIT
+    words=[
+      (v>>(arch.CFG_WORD_SIZE*shamt))&((1<<arch.CFG_WORD_SIZE)-1) 
       for v in inter.choices
-    ],[])
+      for shamt in reversed(range(nwords)) ]
     return words
 
   ## Compiles an input processor specification and downloads it to a connected
   # hardware test.
-  def config_idec(s,spec):
+  def config_idec(s,spec,verify=True):
     words=s.idec_words(spec)
-    for w in reversed(words):
-      s.iface.command(CMD_CFG_WORD,w)
+    s.iface.config_chain(reversed(words),verify)
 
 
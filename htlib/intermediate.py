@@ -0,0 +1,68 @@
+## Base class of compiled pipeline stage intermediates.
+#
+# An intermediate holds the architecture parameters and configuration data
+# (planes, cells, ...) of a compiled pipeline stage as listed in `fields`,
+# which are also the constructor arguments. Any further slots declared by a
+# subclass hold acceleration tables, which are built on first use and are not
+# part of the pickled state. Thus intermediates are small, picklable objects
+# that can be sent to worker processes, e.g. using multiprocessing.
+class Intermediate:
+  __slots__=()
+  
+  ## Names of the slots holding the data of the intermediate, in constructor
+  # argument order.
+  fields=()
+
+  def __init__(s,*args):
+    if len(args)!=len(s.fields):
+      raise TypeError(
+        "%s expects %i arguments, got %i"
+        %(type(s).__name__,len(s.fields),len(args)))
+    for f,v in zip(s.fields,args):
+      setattr(s,f,v)
+    s.reset()
+  
+  ## Discards all acceleration tables, which are rebuilt on next use.
+  def reset(s):
+    for cls in type(s).__mro__:
+      for f in getattr(cls,"__slots__",()):
+        if f not in s.fields:
+          setattr(s,f,None)
+
+  ## Returns the acceleration tables built so far, e.g. to store them along
+  # with a pickled intermediate.
+  #
+  # Tables of nested intermediates are included under the name of the field
+  # holding them. Tables depending on numpy (prefixed _numpy) are omitted.
+  #
+  # @return a dict mapping slot names to tables.
+  def tables(s):
+    r={}
+    for cls in type(s).__mro__:
+      for f in getattr(cls,"__slots__",()):
+        v=getattr(s,f)
+        if f in s.fields:
+          if isinstance(v,Intermediate):
+            r[f]=v.tables()
+        elif v is not None and not f.startswith("_numpy"):
+          r[f]=v
+    return r
+
+  ## Restores acceleration tables as returned by tables.
+  def load_tables(s,tables):
+    for f,v in tables.items():
+      if f in s.fields:
+        getattr(s,f).load_tables(v)
+      else:
+        setattr(s,f,v)
+
+  def __getstate__(s):
+    return tuple([getattr(s,f) for f in s.fields])
+
+  def __setstate__(s,state):
+    Intermediate.__init__(s,*state)
+
+  def __repr__(s):
+    return "%s(%s)"%(
+      type(s).__name__,
+      ", ".join(["%s=%r"%(f,getattr(s,f)) for f in s.fields]))
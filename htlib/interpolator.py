@@ -1,8 +1,61 @@
 from .iface import *
+from .util import require_numpy
+from .intermediate import Intermediate
 import random
 from collections import namedtuple
 import sys
 
+## Compiled interpolator.
+#
+# Holds the architecture parameters of the interpolator. `sim` operates on
+# integers, `sim_batch` on uint64 arrays of selectors, interpolators, bases 
+# and inclines.
+class InterIntermediate(Intermediate):
+  __slots__=("interpolation_bits","base_bits","incline_bits","word_size")
+  fields=("interpolation_bits","base_bits","incline_bits","word_size")
+
+  ## Perfoms a conversion from two's complement value represented as unsigned
+  # integer into a signed integer for incline values.
+  def incline_sex(s,incline):
+    if incline&(1<<(s.incline_bits-1)):
+      incline=incline-(1<<s.incline_bits)
+    return incline
+  
+  ## Perfoms a conversion from two's complement value represented as unsigned
+  # integer into a signed integer for base values.
+  def base_sex(s,base):
+    if base&(1<<(s.base_bits-1)):
+      base=base-(1<<s.base_bits)
+    return base
+
+  ## Sign-extends an array of two's complement values of the given width into
+  # 64 bit two's complement values, represented as uint64 array.
+  @staticmethod
+  def sex_batch(v,bits):
+    np=require_numpy()
+    if bits>=64:
+      return v
+    v=v&np.uint64((1<<bits)-1)
+    sign=(v>>np.uint64(bits-1))&np.uint64(1)
+    return v|(sign*np.uint64(((1<<64)-1)^((1<<bits)-1)))
+
+  def sim(s,selector,interpolator,base,incline):
+    incline=s.incline_sex(incline)
+    base=s.base_sex(base)
+    mult=(selector<<s.interpolation_bits) | interpolator
+    return (base+mult*incline)&((1<<s.word_size)-1)
+    
+  # uint64 arithmetic wraps around modulo 2^64, thus the result matches the
+  # arbitrary precision computation of sim for word_size<=64.
+  def sim_batch(s,selector,interpolator,base,incline):
+    np=require_numpy()
+    selector=np.asarray(selector,dtype=np.uint64)
+    interpolator=np.asarray(interpolator,dtype=np.uint64)
+    incline=s.sex_batch(np.asarray(incline,dtype=np.uint64),s.incline_bits)
+    base=s.sex_batch(np.asarray(base,dtype=np.uint64),s.base_bits)
+    mult=(selector<<np.uint64(s.interpolation_bits))|interpolator
+    return (base+mult*incline)&np.uint64((1<<s.word_size)-1)
+
 ## Control class corresponding to ht_interpolator.
 #
 # As the interpolator is stateles, no random specification is generated.
@@ -10,7 +63,8 @@ import sys
 # exists that will only return a simulation method.
 
 class InterControl(IFaceRef):
-  intermediate_t=namedtuple("inter_intermediate_t","sim")
+  ## Encapsulates the interpolator simulation methods.
+  intermediate_t=InterIntermediate
   
   ## Generates a random input for the interpolator.
   # 
@@ -39,11 +93,8 @@ class InterControl(IFaceRef):
   
   ## Generates a simulation method for the interpolator.
   def inter_compile(s):
-    def sim(selector,interpolator,base,incline):
-      incline=s.incline_sex(incline)
-      base=s.base_sex(base)
-      mult=(selector<<s.iface.INTERPOLATION_BITS) | interpolator
-      return (base+mult*incline)&((1<<s.iface.WORD_SIZE)-1)
-    
-    return InterControl.intermediate_t(sim)
-
+    return InterIntermediate(
+      s.iface.INTERPOLATION_BITS,
+      s.iface.BASE_BITS,
+      s.iface.INCLINE_BITS,
+      s.iface.WORD_SIZE)
@@ -1,7 +1,23 @@
 from .iface import *
+from .intermediate import Intermediate
 import random
 from collections import namedtuple
 
+## Compiled lookup table.
+#
+# Holds the list of cells, each truncated to LUT_BRAM_WIDTH bits, which are
+# used for generating bitstreams and by the simulation method validating the 
+# lookup stage.
+class LUTIntermediate(Intermediate):
+  __slots__=("cells",)
+  fields=("cells",)
+
+  def sim(s,x):
+    return s.cells[x]
+
+  def set_cell(s,x,v):
+    s.cells[x]=v
+
 ## Control class for the lookup table pipeline stage.
 #
 # Offers facilities for generating random lookup tables, inputs and a simulation
@@ -15,7 +31,7 @@ class LUTControl(IFaceRef):
   
   ## Represents a compiled lookup table for use in generating bitstreams
   # and a simulation method used for validating the lookup stage.
-  intermediate_t=namedtuple("lut_intermediate_t","cells sim") 
+  intermediate_t=LUTIntermediate
   
 
   ## Generates a random lookup table specification
@@ -35,36 +51,28 @@ class LUTControl(IFaceRef):
 
   ## Compiles a lookup specification into a lookup intermediate.
   #
-  # Outputs the intermediate words and simulation method as an instance of
-  # intermediate_t.
+  # Outputs the intermediate words as an instance of intermediate_t.
   def lut_compile(s,spec):
-    
-    bits=[
-      [ (v>>shamt)&1 for shamt in range(s.iface.LUT_BRAM_WIDTH) ]
-      for v in spec.cells]
-
-    words=[
-      sum([ bit<<shamt for shamt,bit in enumerate(bv)])
-      for bv in bits]
-    
-    def sim(x):
-      return spec.cells[x]
-    
-    return LUTControl.intermediate_t(words,sim)
+    words=[v&((1<<s.iface.LUT_BRAM_WIDTH)-1) for v in spec.cells]
+    return LUTIntermediate(words)
   
+  ## Recovers the specification of a compiled lookup table, the inverse of
+  # lut_compile.
+  def lut_specification(s,inter):
+    return LUTControl.specification_t(list(inter.cells))
+
   ## Translates an intermediate lookup table representation into a list of
   # configuration words.
   #
   # Note that in contrast to all other cores, this data is transmitted via a
   # random-access interface, thus the words occur in _correct_ order.
   def lut_words(s,inter):
-    nwords=s.iface.RAM_CONFIG_BUFFER_SIZE
-    words=sum([
-      [ 
-        (v>>(s.iface.CFG_WORD_SIZE*shamt))&((1<<s.iface.CFG_WORD_SIZE)-1) 
-        for shamt in range(nwords) ]
+    arch=s.iface.arch
+    nwords=arch.RAM_CONFIG_BUFFER_SIZE
+    words=[
+      (v>>(arch.CFG_WORD_SIZE*shamt))&((1<<arch.CFG_WORD_SIZE)-1) 
       for v in inter.cells
-    ],[])
+      for shamt in range(nwords) ]
     return words
 
 
@@ -3,9 +3,301 @@ from .input_decoder import *
 from .address_translator import *
 from .lut import *
 from .interpolator import *
+from .util import require_numpy
+from .bitslice import bitslice_unpack
+from .intermediate import Intermediate
+from .cache import CompileCache
+from .bitstream import BitstreamBuilder,BitstreamDecoder,PatchableBitstream,bitstream_words
+from .profiler import Profiler,ProfiledStage
+import contextlib
+import hashlib
 import random
+from array import array
 from collections import namedtuple
 
+## Compiled lut core with simulation and configuration data.
+#
+# This combines the intermediate representation of the input decoder (idec)
+# class, the address translator (pla) class, the lookup class (lut) and the
+# interpolator class (inter). These types are defined by the
+# IDECControl, PLAControl, LUTControl and InterControl classes, respectively.
+# Additionally, sim is a wrapper method executing all the pipeline stages
+# at once using just an input word and outputting the final result.
+# sim_ex performs the same simulation but returns a value of type
+# sim_result_t.
+# sim_batch and sim_ex_batch are their counterparts operating on batches of
+# inputs, as accepted by numpy_columns. They return uint64 arrays (or an
+# instance of sim_result_t holding uint64 arrays) and require numpy.
+# sim_sliced and sim_ex_sliced simulate a list of integer inputs (or an
+# instance of InputColumns) using bit-sliced evaluation of the input decoder
+# and PLA, returning a list (or an instance of sim_result_t holding lists). 
+# They do not depend on numpy.
+#
+# If fused_max_bytes is not None, a fused output table (see compile_fused) of
+# at most that size is built on first use, which all simulation methods use
+# instead of the PLA, LUT and interpolator stages.
+class LUTCoreIntermediate(Intermediate):
+  __slots__=(
+    "idec","pla","lut","inter","fused_max_bytes",
+    "_cells","_numpy_cells","_fused")
+  fields=("idec","pla","lut","inter","fused_max_bytes")
+
+  ## For a more in-depth look into the lut core, simulation can return a 
+  # compound value with more information. This is the type of that value.
+  sim_result_t=namedtuple(
+    "lut_core_sim_result_t","selector interpolator address result")
+  # locate the type by its attribute, as required for pickling
+  sim_result_t.__qualname__="LUTCoreIntermediate.sim_result_t"
+
+  ## Number of inputs evaluated at once by the bit-sliced simulation methods.
+  SLICE_WIDTH=1<<14
+
+  @property
+  def selector_bits(s):
+    return s.pla.selector_bits
+
+  @property
+  def interpolation_bits(s):
+    return s.inter.interpolation_bits
+
+  ## Signed base and incline of each lut cell as list of pairs.
+  @property
+  def cells(s):
+    if s._cells==None:
+      s._cells=[
+        (
+          s.inter.base_sex(
+            (v>>s.inter.incline_bits)&((1<<s.inter.base_bits)-1)),
+          s.inter.incline_sex(v&((1<<s.inter.incline_bits)-1)))
+        for v in [s.lut.sim(a) for a in range(len(s.lut.cells))]]
+    return s._cells
+
+  ## The fused output table (see compile_fused) or None if no fusion was
+  # requested or the table would exceed fused_max_bytes.
+  @property
+  def fused(s):
+    if s._fused==None:
+      if s.fused_max_bytes==None:
+        return None
+      s._fused=s.compile_fused(s.fused_max_bytes)
+      if s._fused==None:
+        s._fused=False
+    return s._fused if s._fused is not False else None
+
+  ## Computes the output of the lut core for every possible output of its
+  # input decoder.
+  #
+  # The output of a lut core only depends on the SELECTOR_BITS +
+  # INTERPOLATION_BITS bits extracted by the input decoder, thus it can be
+  # tabulated, reducing simulation to decoding the input and indexing the
+  # table.
+  #
+  # @param max_bytes Memory limit of the table in bytes.
+  # @return An array of type 'Q', indexed by input decoder output, or None if
+  # the table would exceed max_bytes.
+  def compile_fused(s,max_bytes):
+    ib=s.interpolation_bits
+    entries=1<<(s.selector_bits+ib)
+    if entries*array("Q").itemsize>max_bytes:
+      return None
+    
+    table=array("Q")
+    for selector in range(1<<s.selector_bits):
+      table.extend(s.fused_block(selector))
+    return table
+
+  ## Computes the entries of the fused output table for a selector, which
+  # form an arithmetic sequence along the interpolator.
+  def fused_block(s,selector):
+    ib=s.interpolation_bits
+    mask=(1<<s.inter.word_size)-1
+    (base,incline)=s.cells[s.pla.sim(selector)]
+    first=base+(selector<<ib)*incline
+    return [(first+i*incline)&mask for i in range(1<<ib)]
+
+  def _update_fused(s,selectors):
+    if not s._fused: return
+    n=1<<s.interpolation_bits
+    for selector in selectors:
+      s._fused[selector*n:(selector+1)*n]=array("Q",s.fused_block(selector))
+
+  ## Replaces the crosspoints of input decoder output bit i.
+  def set_choice(s,i,arg):
+    s.idec.set_choice(i,arg)
+
+  ## Replaces lut cell x, updating the tables built so far.
+  def set_cell(s,x,v):
+    s.lut.set_cell(x,v)
+    if s._cells!=None:
+      s._cells[x]=(
+        s.inter.base_sex((v>>s.inter.incline_bits)&((1<<s.inter.base_bits)-1)),
+        s.inter.incline_sex(v&((1<<s.inter.incline_bits)-1)))
+      if s._numpy_cells is not None:
+        s._numpy_cells[0][x]=s._cells[x][0]&((1<<64)-1)
+        s._numpy_cells[1][x]=s._cells[x][1]&((1<<64)-1)
+    if s._fused:
+      s._update_fused([
+        sel for sel in range(1<<s.selector_bits) if s.pla.sim(sel)==x])
+
+  ## Replaces PLA and plane row i, updating the tables built so far.
+  def set_and_row(s,i,v):
+    s._update_pla(lambda: s.pla.set_and_row(i,v))
+  
+  ## Replaces PLA or plane column j, updating the tables built so far.
+  def set_or_column(s,j,v):
+    s._update_pla(lambda: s.pla.set_or_column(j,v))
+
+  def _update_pla(s,update):
+    if not s._fused:
+      update()
+      return
+    selectors=range(1<<s.selector_bits)
+    before=[s.pla.sim(sel) for sel in selectors]
+    update()
+    s._update_fused([
+      sel for sel in selectors if s.pla.sim(sel)!=before[sel]])
+
+  ## Builds the tables used by the scalar and bit-sliced simulation methods
+  # in advance.
+  def prepare(s):
+    s.idec.plan
+    if s.pla.table==None:
+      s.pla.evaluation
+    s.cells
+    s.fused
+
+  def sim_ex(s,x):
+    ib=s.interpolation_bits
+    table=s.fused
+    if table!=None:
+      y_idec=s.idec.sim(x)&((1<<(s.selector_bits+ib))-1)
+      selector=y_idec>>ib
+      return LUTCoreIntermediate.sim_result_t(
+        selector,y_idec&((1<<ib)-1),s.pla.sim(selector),table[y_idec])
+
+    y_idec=s.idec.sim(x)
+    interpolator=(y_idec)&((1<<ib)-1)
+    selector=(y_idec>>ib)&((1<<s.selector_bits)-1)
+
+    y_pla=s.pla.sim(selector)
+    address=y_pla
+    
+    y_lut =s.lut.sim(address)
+    incline=(y_lut)&((1<<s.inter.incline_bits)-1)
+    base=(y_lut>>s.inter.incline_bits)&((1<<s.inter.base_bits)-1)
+    
+    y_inter=s.inter.sim(selector,interpolator,base,incline)
+
+    return LUTCoreIntermediate.sim_result_t(
+      selector,interpolator,address,y_inter)
+
+  def sim(s,x):
+    table=s.fused
+    if table!=None:
+      return table[
+        s.idec.sim(x)&((1<<(s.selector_bits+s.interpolation_bits))-1)]
+    return s.sim_ex(x).result
+
+  def sim_ex_batch(s,x):
+    np=require_numpy()
+    ib=s.interpolation_bits
+
+    y_idec=s.idec.sim_batch(x)
+    table=s.fused
+    if table!=None:
+      y_idec&=np.uint64((1<<(s.selector_bits+ib))-1)
+      selector=y_idec>>np.uint64(ib)
+      return LUTCoreIntermediate.sim_result_t(
+        selector,
+        y_idec&np.uint64((1<<ib)-1),
+        s.pla.sim_batch(selector),
+        np.frombuffer(table,dtype=np.uint64)[y_idec.astype(np.intp)])
+
+    interpolator=y_idec&np.uint64((1<<ib)-1)
+    selector=(
+      (y_idec>>np.uint64(ib))&np.uint64((1<<s.selector_bits)-1))
+
+    address=s.pla.sim_batch(selector)
+
+    # base and incline of each lut cell, truncated to 64 bits
+    if s._numpy_cells is None:
+      s._numpy_cells=(
+        np.array([v&((1<<64)-1) for v,_ in s.cells],dtype=np.uint64),
+        np.array([v&((1<<64)-1) for _,v in s.cells],dtype=np.uint64))
+    (base_table,incline_table)=s._numpy_cells
+    
+    base=base_table[address]
+    incline=incline_table[address]
+
+    y_inter=s.inter.sim_batch(selector,interpolator,base,incline)
+    
+    return LUTCoreIntermediate.sim_result_t(
+      selector,interpolator,address,y_inter)
+
+  def sim_batch(s,x):
+    table=s.fused
+    if table!=None:
+      np=require_numpy()
+      y_idec=s.idec.sim_batch(x)&np.uint64(
+        (1<<(s.selector_bits+s.interpolation_bits))-1)
+      return np.frombuffer(table,dtype=np.uint64)[y_idec.astype(np.intp)]
+    return s.sim_ex_batch(x).result
+
+  ## Evaluates the input decoder and, if with_address is set, the PLA of a
+  # group of inputs bit-sliced.
+  #
+  # @return a list of pairs of input decoder output and address (or None).
+  def evaluate_sliced(s,xs,with_address):
+    n=len(xs)
+    ib=s.interpolation_bits
+    idec_bits=s.selector_bits+ib
+
+    y_idec=s.idec.sim_sliced(xs)
+    y_idec=(y_idec+[0]*idec_bits)[:idec_bits]
+    if not with_address:
+      return [(v,None) for v in bitslice_unpack(y_idec,n)]
+
+    address=s.pla.sim_sliced(y_idec[ib:],(1<<n)-1)
+    return [
+      (v&((1<<idec_bits)-1),v>>idec_bits) 
+      for v in bitslice_unpack(y_idec+address,n) ]
+
+  # The input decoder output and address are transposed back per input, these
+  # are used to look up the LUT cell and compute the interpolation, or to index
+  # the fused output table.
+  def sim_ex_sliced(s,xs):
+    ib=s.interpolation_bits
+    word_mask=(1<<s.inter.word_size)-1
+    table=s.fused
+    cells=s.cells if table==None else None
+    width=LUTCoreIntermediate.SLICE_WIDTH
+
+    r=LUTCoreIntermediate.sim_result_t([],[],[],[])
+    for i in range(0,len(xs),width):
+      for y_idec,address in s.evaluate_sliced(xs[i:i+width],True):
+        r.selector.append(y_idec>>ib)
+        r.interpolator.append(y_idec&((1<<ib)-1))
+        r.address.append(address)
+        if table!=None:
+          r.result.append(table[y_idec])
+        else:
+          # the interpolator's multiplicand is the input decoder output
+          (base,incline)=cells[address]
+          r.result.append((base+y_idec*incline)&word_mask)
+    return r
+
+  def sim_sliced(s,xs):
+    table=s.fused
+    if table==None:
+      return s.sim_ex_sliced(xs).result
+    width=LUTCoreIntermediate.SLICE_WIDTH
+    r=[]
+    for i in range(0,len(xs),width):
+      r.extend([
+        table[y_idec] 
+        for y_idec,address in s.evaluate_sliced(xs[i:i+width],False)])
+    return r
+
 ## Control class corresponding to ht_lut_core.
 #
 # Offers facilities for generating random lut core configurations within the
@@ -22,22 +314,11 @@ class LUTCoreControl(IDECControl,PLAControl,LUTControl,InterControl):
 
   ## type encapsulating a compiled lut core with simulation and configuration
   # data
-  #
-  # This combines the intermediate representation of the input decoder (idec)
-  # class, the address translator (pla) class, the lookup class (lut) and the
-  # interpolator class (inter). These types are defined by the
-  # IDECControl, PLAControl, LUTControl and InterControl classes, respectively.
-  # Additionally, sim is a wrapper function executing all the pipeline stages
-  # at once using just an input word and outputting the final result.
-  # sim_ex performs the same simulation but returns a value of type
-  # sim_result_t.
-  intermediate_t=namedtuple(
-    "lut_core_intermediate_t","idec pla lut inter sim sim_ex")
+  intermediate_t=LUTCoreIntermediate
 
   ## For a more in-depth look into the lut core, simulation can return a 
   # compound value with more information. This is the type of that value.
-  sim_result_t=namedtuple(
-    "lut_core_sim_result_t","selector interpolator address result")
+  sim_result_t=LUTCoreIntermediate.sim_result_t
 
   ## Structure holding information on the current status of an instantiated
   # lut hardware core.
@@ -53,6 +334,65 @@ class LUTCoreControl(IDECControl,PLAControl,LUTControl,InterControl):
     "lut_core_status_t",
     "raw flags e_invalid_cfg e_premature_exe e_instr_code cfg_count")
 
+  ## Default upper limit of the memory occupied by a fused output table (see
+  # LUTCoreIntermediate.compile_fused) in bytes.
+  FUSED_TABLE_MAX_BYTES=64<<20
+
+  ## Type of the entries of the compile cache, holding the intermediate and
+  # configuration words of a lut core.
+  #
+  # `words` is an array filled on first use by core_bitstream, thus it is
+  # empty until then.
+  compiled_t=namedtuple("lut_core_compiled_t","intermediate words")
+
+  ## @param cache Instance of CompileCache memoizing core_compile and 
+  # core_bitstream. Leave at None to create a private one.
+  def __init__(s,iface,cache=None):
+    IFaceRef.__init__(s,iface)
+    s.compile_cache=cache if cache!=None else CompileCache()
+    s.profiler=None
+
+  ## Enables instrumentation of compilation and simulation.
+  #
+  # While enabled, the compile phases (idec_compile, pla_compile, lut_compile,
+  # core_bitstream and decompile_bitstream) are timed, and the intermediates
+  # returned by core_compile and decompile_bitstream time each simulation
+  # call per pipeline stage (see ProfiledStage). The time of core.sim_ex not
+  # spent in its stages is overhead, e.g. the construction of its result.
+  #
+  # @param profiler Instance of Profiler to record to. Leave at None to create
+  # a new one.
+  # @return the profiler in use.
+  def enable_profiling(s,profiler=None):
+    s.profiler=profiler if profiler!=None else Profiler()
+    return s.profiler
+
+  def disable_profiling(s):
+    s.profiler=None
+
+  ## Returns a context manager timing a compile phase if profiling is
+  # enabled.
+  def profile_section(s,name):
+    if s.profiler==None:
+      return contextlib.nullcontext()
+    return s.profiler.section(name)
+  
+  ## Returns an instrumented copy of a lut core intermediate if profiling is
+  # enabled, otherwise the intermediate itself.
+  def profile_core(s,intermediate):
+    if s.profiler==None:
+      return intermediate
+    profiled=LUTCoreIntermediate(
+      ProfiledStage(intermediate.idec,"idec",s.profiler),
+      ProfiledStage(intermediate.pla,"pla",s.profiler),
+      ProfiledStage(intermediate.lut,"lut",s.profiler),
+      ProfiledStage(intermediate.inter,"inter",s.profiler),
+      intermediate.fused_max_bytes)
+    profiled.load_tables({
+      f:v for f,v in intermediate.tables().items() 
+      if f not in intermediate.fields })
+    return ProfiledStage(profiled,"core",s.profiler)
+
   ## Generates a random LUT hardware core
   def random_core(s,singleInput=False):
     idec=s.random_idec(singleInput=singleInput)
@@ -66,45 +406,26 @@ class LUTCoreControl(IDECControl,PLAControl,LUTControl,InterControl):
   def random_core_input(s):
     return s.random_idec_input()
   
+  ## Generates a number of random inputs to a hardware core in columnar form.
+  #
+  # @return an instance of InputColumns (see random_idec_inputs).
+  def random_core_inputs(s,count,singleInput=False,mask=(1<<64)-1):
+    return s.random_idec_inputs(count,singleInput=singleInput,mask=mask)
+  
 
   ## Reads a bitstream encoded as a list of configuration words and compiles it
   # into an intermediate lut core representation
+  #
+  # The bitstream may also be given as an instance of BitstreamFile, which must
+  # match the architecture of the interface.
   def decompile_bitstream(s,words):
-    ram=words[:s.iface.CFG_LUT_REGISTER_COUNT]
-    chain=list(reversed(words[s.iface.CFG_LUT_REGISTER_COUNT:]))
-    idec=chain[:s.iface.CFG_INPUT_DECODER_REGISTER_COUNT]
-    chain=chain[s.iface.CFG_INPUT_DECODER_REGISTER_COUNT:]
-    pla_and=chain[:s.iface.CFG_PLA_AND_REGISTER_COUNT]
-    chain=chain[s.iface.CFG_PLA_AND_REGISTER_COUNT:]
-    pla_or=chain
-    chain=[]
-
-    def decode_words(words,n,m,ws):
-      return [
-        sum([v<<(ws*(m-j-1)) for j,v in enumerate(words[i:i+m])])
-        for i in range(0,n*m,m)]
-    def decode_words_rev(words,n,m,ws):
-      return [
-        sum([v<<(ws*(j)) for j,v in enumerate(words[i:i+m])])
-        for i in range(0,n*m,m)]
+    words=bitstream_words(s.iface,words)
+    with s.profile_section("decompile_bitstream"):
+      intermediate=s._decompile_bitstream(words)
+    return s.profile_core(intermediate)
 
-    
-    ram=decode_words_rev(ram,
-      2**s.iface.SEGMENT_BITS,
-      s.iface.RAM_CONFIG_BUFFER_SIZE,
-      s.iface.WORD_SIZE)
-    idec=decode_words(idec,
-      s.iface.SELECTOR_BITS+s.iface.INTERPOLATION_BITS,
-      s.iface.CFG_INPUT_DECODER_REGISTERS_PER_BIT,
-      s.iface.WORD_SIZE)
-    pla_and=decode_words(pla_and,
-      s.iface.PLA_INTERCONNECTS,
-      s.iface.CFG_PLA_AND_REGISTERS_PER_ROW,
-      s.iface.WORD_SIZE)
-    pla_or=decode_words(pla_or,
-      s.iface.SEGMENT_BITS,
-      s.iface.CFG_PLA_OR_REGISTERS_PER_COLUMN,
-      s.iface.WORD_SIZE)
+  def _decompile_bitstream(s,words):
+    (ram,pla_and,pla_or,idec)=BitstreamDecoder(s.iface).decode(words)
 
     idec =s.idec_compile_raw(idec)
     pla  =s.pla_compile_raw(pla_and,pla_or)
@@ -113,63 +434,144 @@ class LUTCoreControl(IDECControl,PLAControl,LUTControl,InterControl):
     
     return s.core_compile_raw(idec,pla,lut,inter)
 
+  ## Recovers the specification of a compiled lut core.
+  #
+  # @param intermediate An instance of intermediate_t, e.g. as returned by
+  # decompile_bitstream.
+  # @return an instance of specification_t.
+  def core_specification(s,intermediate):
+    return LUTCoreControl.specification_t(
+      s.idec_specification(intermediate.idec),
+      s.pla_specification(intermediate.pla),
+      s.lut_specification(intermediate.lut))
+
+  ## Reads a bitstream and recovers the specification it was generated from.
+  #
+  # The specification is verified by re-encoding it, raising TestFailure if
+  # the bitstream cannot be reproduced exactly, e.g. if it was not generated by
+  # core_bitstream.
+  #
+  # @param words The bitstream as passed to decompile_bitstream.
+  # @return an instance of specification_t.
+  def decompile_specification(s,words):
+    words=bitstream_words(s.iface,words)
+    with s.profile_section("decompile_bitstream"):
+      intermediate=s._decompile_bitstream(words)
+    spec=s.core_specification(intermediate)
+
+    encoded=s.core_bitstream_array(spec)
+    if len(encoded)!=len(words) or any(
+        a!=b for a,b in zip(encoded,words)):
+      raise TestFailure(
+        "cannot represent lut core: bitstream differs after re-encoding")
+    return spec
+
+  ## Compiles a lut core specification into a bitstream which can be modified
+  # in place, see PatchableBitstream.
+  def core_bitstream_patchable(s,spec,fused=False,fused_max_bytes=None):
+    compiled=s.core_compile_cached(spec,fused,fused_max_bytes)
+    return PatchableBitstream(s.iface,compiled.intermediate,
+      s.core_bitstream_array(spec))
+
+  ## Decompiles a bitstream using a persistent cache.
+  #
+  # The intermediate is stored along with its precomputed simulation tables
+  # (see LUTCoreIntermediate.prepare), keyed by the architecture parameters
+  # and a digest of the bitstream. Thus repeatedly loading the same bitstream
+  # skips decoding and table generation.
+  #
+  # @param words The bitstream as passed to decompile_bitstream.
+  # @param cache An instance of DiskCache.
+  def decompile_bitstream_cached(s,words,cache):
+    words=bitstream_words(s.iface,words)
+    key=CompileCache.digest(
+      "decompile_bitstream",s.iface.arch,
+      hashlib.sha1(array("Q",words).tobytes()).hexdigest())
+
+    def build():
+      with s.profile_section("decompile_bitstream"):
+        intermediate=s._decompile_bitstream(words)
+      intermediate.prepare()
+      return (intermediate,intermediate.tables())
+    
+    (intermediate,tables)=cache.lookup(key,build)
+    intermediate.load_tables(tables)
+    return s.profile_core(intermediate)
+
   ## translates a lut core specification into its intermediate form
   #
   # @param spec An instance of specification_t e.g. generated by random_core.
+  # @param fused Set to true to use a fused output table for simulation (see
+  # LUTCoreIntermediate.compile_fused).
+  # @param fused_max_bytes Memory limit of the fused output table, defaults to
+  # FUSED_TABLE_MAX_BYTES.
   # @return an instance of intermediate_t.
-  def core_compile(s,spec):
-    idec =s.idec_compile(spec.idec)
-    pla  =s.pla_compile(spec.pla)
-    lut  =s.lut_compile(spec.lut)
-    inter=s.inter_compile()
-    return s.core_compile_raw(idec,pla,lut,inter)
+  def core_compile(s,spec,fused=False,fused_max_bytes=None):
+    return s.profile_core(
+      s.core_compile_cached(spec,fused,fused_max_bytes).intermediate)
+
+  ## Compiles a lut core specification using the compile cache.
+  #
+  # Identical specifications compiled for identical architecture parameters
+  # and fusion options yield the same, shared instance of compiled_t. Neither
+  # its intermediate nor its word list must be modified.
+  #
+  # @return an instance of compiled_t.
+  def core_compile_cached(s,spec,fused=False,fused_max_bytes=None):
+    if fused and fused_max_bytes==None:
+      fused_max_bytes=LUTCoreControl.FUSED_TABLE_MAX_BYTES
+    if not fused:
+      fused_max_bytes=None
+
+    def build():
+      with s.profile_section("idec_compile"):
+        idec =s.idec_compile(spec.idec)
+      with s.profile_section("pla_compile"):
+        pla  =s.pla_compile(spec.pla)
+      with s.profile_section("lut_compile"):
+        lut  =s.lut_compile(spec.lut)
+      inter=s.inter_compile()
+      return LUTCoreControl.compiled_t(
+        s.core_compile_raw(idec,pla,lut,inter,
+          fused=fused,fused_max_bytes=fused_max_bytes),
+        array("I" if s.iface.WORD_SIZE==32 else "Q"))
+    
+    return s.compile_cache.lookup(
+      CompileCache.digest(s.iface.arch,spec,fused_max_bytes),build)
 
   ## Assembles compiled input decoder PLA, LUT and interpolator intermediates
   # into a lut core intermediate
-  def core_compile_raw(s,idec,pla,lut,inter):
-    def sim_ex(x):
-      y_idec=idec.sim(x)
-      interpolator=(y_idec)&((1<<s.iface.INTERPOLATION_BITS)-1)
-      selector=(y_idec>>s.iface.INTERPOLATION_BITS)&((1<<s.iface.SELECTOR_BITS)-1)
-
-      y_pla=pla.sim(selector)
-      address=y_pla
-      
-      y_lut =lut.sim(address)
-      incline=(y_lut)&((1<<s.iface.INCLINE_BITS)-1)
-      base=(y_lut>>s.iface.INCLINE_BITS)&((1<<s.iface.BASE_BITS)-1)
-      
-      y_inter=inter.sim(selector,interpolator,base,incline)
-
-      return LUTCoreControl.sim_result_t(selector,interpolator,address,y_inter)
-
-    def sim(x):
-      return sim_ex(x).result
-
-    return LUTCoreControl.intermediate_t(idec,pla,lut,inter,sim,sim_ex)
+  #
+  # @param fused Set to true to use a fused output table for simulation. If it
+  # exceeds fused_max_bytes, the intermediate is not fused.
+  def core_compile_raw(s,idec,pla,lut,inter,fused=False,fused_max_bytes=None):
+    if fused and fused_max_bytes==None:
+      fused_max_bytes=LUTCoreControl.FUSED_TABLE_MAX_BYTES
+    return LUTCoreIntermediate(
+      idec,pla,lut,inter,fused_max_bytes if fused else None)
   
   ## Translates a lut core specification into a list of configuration words
   # ready to be sent as configuration data to a lut core instantiation.
+  #
+  # The words are memoized along with the intermediate in the compile cache.
   def core_bitstream(s,spec):
-    intermediate=s.core_compile(spec)
-    words=(
-      # RAM config phase
-      s.lut_words(intermediate.lut) +
-      # CHAIN config phase
-      list(reversed(
-        s.idec_words(intermediate.idec) +
-        s.pla_words(intermediate.pla)
-      )))
-    return words
+    return s.core_bitstream_array(spec).tolist()
+
+  ## Translates a lut core specification into an array of configuration 
+  # words, see core_bitstream and BitstreamBuilder.
+  def core_bitstream_array(s,spec):
+    with s.profile_section("core_bitstream"):
+      compiled=s.core_compile_cached(spec)
+      if not compiled.words:
+        compiled.words.extend(
+          BitstreamBuilder(s.iface).build(compiled.intermediate))
+      return array(compiled.words.typecode,compiled.words)
     
   ## Translates a lut core specification into configuration words and utilizes 
   # the configuration facilities of ht_lut_core to apply this bitstream to
   # an instantiation.
   def config_core(s,spec):
-    words=s.core_bitstream(spec)
-
-    for w in words:
-      s.iface.command0(CMD_CORE_CFG,w)
+    s.iface.command0_many(CMD_CORE_CFG,s.core_bitstream_array(spec))
     s.core_assert(raw=(s.iface.CFG_REGISTER_COUNT<<8)|0x00)
   
   ## Resets a lut hardware core
@@ -204,6 +606,19 @@ class LUTCoreControl(IDECControl,PLAControl,LUTControl,InterControl):
     else:
       s.iface.command0i(CMD_CORE_EXE,v)
   
+  ## Executes the computation of a number of inputs on a lut hardware core
+  # instantiation, pipelining the requests, see IFace.commandi_many.
+  #
+  # @param xs Sequence of inputs as accepted by core_exec, or an instance of
+  # InputColumns as returned by random_core_inputs.
+  # @param block Set to true to wait for the result words (default).
+  # @return an array of the result words, if block is set.
+  def core_exec_many(s,xs,block=True,window=None):
+    if block:
+      return s.iface.commandi_many(CMD_CORE_EXE,xs,window)
+    else:
+      s.iface.command0i_many(CMD_CORE_EXE,xs,window)
+  
   # Requests a single execution of a lut hardware core, disregarding any
   # result.
   #
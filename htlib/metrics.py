@@ -0,0 +1,226 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+from collections import namedtuple
+
+## Transport metrics of an IFace, see IFace.enable_metrics.
+#
+# Counts the requests per command, the bytes written and read, the time
+# blocked in writes and reads (stall time) and the round-trip latency of each
+# request with response as histogram, from which the effective throughput and
+# its ratio to the line rate are derived. Updates may come from any thread.
+class TransportMetrics:
+
+  ## Upper bounds in seconds of the latency histogram buckets, powers of two
+  # from 16us to about 4s. Larger latencies fall into a final, unbounded
+  # bucket.
+  BUCKETS=tuple([2**k/1e6 for k in range(4,23)])
+
+  ## Cumulative histogram, counts[i] being the number of samples up to
+  # bounds[i] and counts[-1] the total.
+  histogram_t=namedtuple("histogram_t","bounds counts sum count")
+  # locate the type by its attribute, as required for pickling
+  histogram_t.__qualname__="TransportMetrics.histogram_t"
+
+  ## A snapshot of all metrics, see snapshot.
+  #
+  # Throughputs are given in bytes per second, utilizations as ratio of the
+  # bits transferred (10 per byte, 8N1) to the line rate, or None if the baud
+  # rate is unknown.
+  snapshot_t=namedtuple("snapshot_t",
+    "elapsed baud commands bytes_out bytes_in writes reads stall_time rtt "
+    "throughput_out throughput_in utilization_out utilization_in")
+  snapshot_t.__qualname__="TransportMetrics.snapshot_t"
+
+  ## @param baud Line rate of the port in baud, if known.
+  # @param names Optional dict mapping command codes to names.
+  def __init__(s,baud=None,names=None):
+    s.baud=baud
+    s.names=names if names!=None else {}
+    s._lock=threading.Lock()
+    s.reset()
+
+  def reset(s):
+    with s._lock:
+      s.start=time.monotonic()
+      s.commands={}
+      s.bytes_out=0
+      s.bytes_in=0
+      s.writes=0
+      s.reads=0
+      s.stall_time=0.0
+      s.rtt_counts=[0]*(len(TransportMetrics.BUCKETS)+1)
+      s.rtt_sum=0.0
+
+  ## Counts n requests of a command.
+  def count(s,cmd,n=1):
+    with s._lock:
+      s.commands[cmd]=s.commands.get(cmd,0)+n
+
+  def record_write(s,n,duration):
+    with s._lock:
+      s.writes+=1
+      s.bytes_out+=n
+      s.stall_time+=duration
+
+  def record_read(s,n,duration):
+    with s._lock:
+      s.reads+=1
+      s.bytes_in+=n
+      s.stall_time+=duration
+
+  ## Records n requests with a round-trip latency of rtt seconds each.
+  def record_rtt(s,rtt,n=1):
+    i=0
+    while i<len(TransportMetrics.BUCKETS) and rtt>TransportMetrics.BUCKETS[i]:
+      i+=1
+    with s._lock:
+      s.rtt_counts[i]+=n
+      s.rtt_sum+=rtt*n
+
+  ## Returns an instance of snapshot_t of the current metrics.
+  def snapshot(s):
+    with s._lock:
+      elapsed=time.monotonic()-s.start
+      counts=[]
+      total=0
+      for n in s.rtt_counts:
+        total+=n
+        counts.append(total)
+      rtt=TransportMetrics.histogram_t(
+        TransportMetrics.BUCKETS,tuple(counts),s.rtt_sum,total)
+      commands={
+        s.names.get(cmd,"0x%.2x"%cmd):n for cmd,n in sorted(s.commands.items())}
+      (bytes_out,bytes_in)=(s.bytes_out,s.bytes_in)
+      (writes,reads,stall_time)=(s.writes,s.reads,s.stall_time)
+
+    rate=lambda n: n/elapsed if elapsed>0 else 0.0
+    utilization=lambda n: (
+      rate(n)*10/s.baud if s.baud else None)
+    return TransportMetrics.snapshot_t(
+      elapsed,s.baud,commands,bytes_out,bytes_in,writes,reads,stall_time,rtt,
+      rate(bytes_out),rate(bytes_in),
+      utilization(bytes_out),utilization(bytes_in))
+
+  ## Formats a snapshot as a single line summary.
+  @staticmethod
+  def format(snapshot):
+    (rtt,n)=(snapshot.rtt,snapshot.rtt.count)
+    r="out %.1f kB/s, in %.1f kB/s"%(
+      snapshot.throughput_out/1e3,snapshot.throughput_in/1e3)
+    if snapshot.baud:
+      r+=" (%.0f%%/%.0f%% of %i baud)"%(
+        snapshot.utilization_out*100,snapshot.utilization_in*100,
+        snapshot.baud)
+    r+=", stalled %.1fs of %.1fs, %i requests, rtt avg %.3fms"%(
+      snapshot.stall_time,snapshot.elapsed,sum(snapshot.commands.values()),
+      rtt.sum/n*1e3 if n>0 else 0.0)
+    return r
+
+  ## Formats snapshots in the Prometheus text exposition format.
+  #
+  # @param snapshots Dict mapping a label (e.g. the port) to a snapshot.
+  @staticmethod
+  def export(snapshots):
+    lines=[]
+    def metric(name,ty,doc,samples):
+      lines.append("# HELP htlib_%s %s"%(name,doc))
+      lines.append("# TYPE htlib_%s %s"%(name,ty))
+      for labels,value in samples:
+        lines.append("htlib_%s{%s} %s"%(name,",".join([
+          '%s="%s"'%(k,v) for k,v in labels]),repr(float(value))))
+    def simple(name,ty,doc,f):
+      metric(name,ty,doc,[
+        ((("board",board),),f(v)) for board,v in snapshots.items()])
+
+    simple("elapsed_seconds","gauge","Time since the metrics were reset.",
+      lambda v: v.elapsed)
+    metric("requests_total","counter","Requests sent per command.",[
+      ((("board",board),("command",cmd)),n)
+      for board,v in snapshots.items() for cmd,n in v.commands.items()])
+    simple("bytes_out_total","counter","Bytes written to the port.",
+      lambda v: v.bytes_out)
+    simple("bytes_in_total","counter","Bytes read from the port.",
+      lambda v: v.bytes_in)
+    simple("stall_seconds_total","counter","Time blocked in writes and reads.",
+      lambda v: v.stall_time)
+    simple("throughput_out_bytes","gauge","Bytes written per second.",
+      lambda v: v.throughput_out)
+    simple("throughput_in_bytes","gauge","Bytes read per second.",
+      lambda v: v.throughput_in)
+    metric("utilization_ratio","gauge",
+      "Ratio of the transferred bits to the line rate.",[
+        ((("board",board),("direction",d)),u)
+        for board,v in snapshots.items() if v.baud
+        for d,u in (("out",v.utilization_out),("in",v.utilization_in))])
+
+    samples=[]
+    for board,v in snapshots.items():
+      for bound,n in zip(v.rtt.bounds,v.rtt.counts):
+        samples.append(((("board",board),("le",repr(bound))),n))
+      samples.append(((("board",board),("le","+Inf")),v.rtt.count))
+    metric("rtt_seconds_bucket","histogram","Round-trip latency of requests.",
+      samples)
+    for name,f in (("sum",lambda v: v.rtt.sum),("count",lambda v: v.rtt.count)):
+      lines.extend(["htlib_rtt_seconds_%s{board=\"%s\"} %r"%(
+        name,board,float(f(v))) for board,v in snapshots.items()])
+    return "\n".join(lines)+"\n"
+
+## Periodically prints the metrics of a number of interfaces and optionally
+# exports them to a text file, e.g. for the textfile collector of the
+# Prometheus node exporter.
+#
+# The file is replaced atomically, thus it may be scraped at any time.
+class MetricsReporter:
+
+  ## @param metrics Dict mapping a label (e.g. the port) to TransportMetrics.
+  # @param interval Seconds between reports.
+  # @param fn Optional file name to export to.
+  def __init__(s,metrics,interval=10.0,fn=None,f=sys.stderr):
+    s.metrics=metrics
+    s.interval=interval
+    s.fn=fn
+    s.f=f
+    s._stop=threading.Event()
+    s._thread=None
+
+  ## Prints and exports the current metrics.
+  def report(s):
+    snapshots={ k:v.snapshot() for k,v in s.metrics.items() }
+    for k,v in snapshots.items():
+      s.f.write("\r\x1b[34;1mMetrics\x1b[30;0m: %s: %s\n"%(
+        k,TransportMetrics.format(v)))
+    s.f.flush()
+    if s.fn!=None:
+      (fd,tmp)=tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(s.fn)),prefix=".metrics")
+      with os.fdopen(fd,"w") as f:
+        f.write(TransportMetrics.export(snapshots))
+      os.replace(tmp,s.fn)
+
+  def _run(s):
+    while not s._stop.wait(s.interval):
+      s.report()
+
+  def start(s):
+    s._stop.clear()
+    s._thread=threading.Thread(target=s._run,daemon=True)
+    s._thread.start()
+    return s
+
+  ## Stops reporting, reporting a final time.
+  def stop(s):
+    if s._thread==None:
+      return
+    s._stop.set()
+    s._thread.join()
+    s._thread=None
+    s.report()
+
+  def __enter__(s):
+    return s.start()
+
+  def __exit__(s,ty,value,tb):
+    s.stop()
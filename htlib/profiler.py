@@ -0,0 +1,90 @@
+import time
+from collections import namedtuple
+
+## Collects call counts and cumulative run times of named sections.
+#
+# Sections are timed either explicitly using section or by wrapping a
+# pipeline stage intermediate into a ProfiledStage. Nested sections are
+# accounted for independently, i.e. the time of a section includes the time
+# of all sections entered within.
+class Profiler:
+
+  ## Statistics of a single section.
+  stat_t=namedtuple("profiler_stat_t","calls seconds")
+  # locate the type by its attribute, as required for pickling
+  stat_t.__qualname__="Profiler.stat_t"
+
+  def __init__(s):
+    s.calls={}
+    s.seconds={}
+
+  ## Accounts a single call of a section taking the given time.
+  def record(s,name,seconds):
+    s.calls[name]=s.calls.get(name,0)+1
+    s.seconds[name]=s.seconds.get(name,0.0)+seconds
+
+  ## Returns a context manager timing a section.
+  def section(s,name):
+    return Profiler._section(s,name)
+
+  class _section:
+    def __init__(s,profiler,name):
+      s.profiler=profiler
+      s.name=name
+
+    def __enter__(s):
+      s.t0=time.perf_counter()
+      return s
+
+    def __exit__(s,a,b,c):
+      s.profiler.record(s.name,time.perf_counter()-s.t0)
+  
+  ## Returns a dict mapping section names to instances of stat_t.
+  def stats(s):
+    return {
+      name:Profiler.stat_t(s.calls[name],s.seconds[name]) 
+      for name in s.calls }
+
+  ## Discards all statistics.
+  def reset(s):
+    s.calls.clear()
+    s.seconds.clear()
+  
+  ## Renders the statistics as a table, one section per line.
+  def report(s):
+    lines=["%-32s %10s %12s %12s"%("section","calls","total [s]","call [us]")]
+    for name,stat in sorted(s.stats().items()):
+      lines.append("%-32s %10i %12.6f %12.3f"%(
+        name,stat.calls,stat.seconds,1e6*stat.seconds/stat.calls))
+    return "\n".join(lines)
+
+## Proxy of a pipeline stage intermediate timing its simulation methods.
+#
+# Calls of all methods whose name starts with "sim" or "evaluate" are 
+# recorded as section "<name>.<method>", all other attributes are forwarded
+# unchanged.
+class ProfiledStage:
+  def __init__(s,inner,name,profiler):
+    s.inner=inner
+    s.name=name
+    s.profiler=profiler
+  
+  def __getattr__(s,attr):
+    if attr=="inner":
+      raise AttributeError(attr)
+    v=getattr(s.inner,attr)
+    if not attr.startswith(("sim","evaluate")) or not callable(v):
+      return v
+    
+    section="%s.%s"%(s.name,attr)
+    profiler=s.profiler
+    def timed(*args,**kwargs):
+      t0=time.perf_counter()
+      try:
+        return v(*args,**kwargs)
+      finally:
+        profiler.record(section,time.perf_counter()-t0)
+    return timed
+
+  def __repr__(s):
+    return "ProfiledStage(%r, %r)"%(s.name,s.inner)
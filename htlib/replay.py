@@ -0,0 +1,150 @@
+import time
+import atexit
+import struct
+from collections import namedtuple
+from .iface import IFace
+from .error import TestFailure
+
+## Binary log of the bytes exchanged with a hardware test.
+#
+# The log consists of a header (MAGIC, VERSION) followed by one record per
+# write to or read from the port, each record consisting of the direction
+# (TX for data sent by the host, RX for data received), the time since the
+# previous record in microseconds, the data length and the data itself.
+class SessionLog:
+
+  MAGIC=b"HTLOG\0\0\0"
+  VERSION=1
+  HEADER=struct.Struct("<8sH")
+  RECORD=struct.Struct("<BII")
+
+  TX=0
+  RX=1
+
+  ## A record, time being the number of seconds since the log was started.
+  record_t=namedtuple("session_record_t","time direction data")
+  # locate the type by its attribute, as required for pickling
+  record_t.__qualname__="SessionLog.record_t"
+
+  ## Creates a new log.
+  def __init__(s,fn):
+    s.f=open(fn,"wb")
+    s.f.write(SessionLog.HEADER.pack(SessionLog.MAGIC,SessionLog.VERSION))
+    s._last=time.monotonic()
+    # scripts leave the interface open until exiting
+    atexit.register(s.close)
+
+  ## Appends a record, data being bytes-like.
+  def append(s,direction,data):
+    now=time.monotonic()
+    delta=min(int((now-s._last)*1e6),0xffffffff)
+    s._last=now
+    s.f.write(SessionLog.RECORD.pack(direction,delta,len(data)))
+    s.f.write(data)
+
+  def close(s):
+    s.f.close()
+
+  ## Reads all records of a log.
+  #
+  # @return a list of record_t.
+  @staticmethod
+  def read(fn):
+    with open(fn,"rb") as f:
+      raw=f.read()
+
+    (magic,version)=SessionLog.HEADER.unpack_from(raw,0)
+    if magic!=SessionLog.MAGIC:
+      raise ValueError("%s is not a session log"%fn)
+    if version!=SessionLog.VERSION:
+      raise ValueError(
+        "unsupported session log version %i (expected %i)"
+        %(version,SessionLog.VERSION))
+
+    r=[]
+    t=0
+    pos=SessionLog.HEADER.size
+    while pos<len(raw):
+      (direction,delta,n)=SessionLog.RECORD.unpack_from(raw,pos)
+      pos+=SessionLog.RECORD.size
+      if pos+n>len(raw):
+        raise ValueError("truncated session log record at offset %i"%pos)
+      t+=delta
+      r.append(SessionLog.record_t(t/1e6,direction,raw[pos:pos+n]))
+      pos+=n
+    return r
+
+## IFace recording all data written to and read from the port into a
+# SessionLog, see ReplayIFace.
+class RecordingIFace(IFace):
+
+  def __init__(s,port,baud,fn):
+    s.log=SessionLog(fn)
+    IFace.__init__(s,port,baud)
+
+  def write(s,data):
+    r=IFace.write(s,data)
+    s.log.append(SessionLog.TX,data)
+    return r
+
+  def read(s,size=1):
+    data=IFace.read(s,size)
+    s.log.append(SessionLog.RX,data)
+    return data
+
+  def close(s):
+    IFace.close(s)
+    s.log.close()
+
+## IFace serving the responses of a recorded session without hardware.
+#
+# Data written is compared with the recorded requests, and reads return the
+# recorded responses in order, thus a test run with the same random seed
+# as the recorded one re-checks the simulation against the recorded hardware
+# results at memory speed. Since both directions are treated as streams, the
+# replayed run may batch its requests differently than the recorded one.
+#
+# Reads past the end of the recording return short, as on a timeout.
+class ReplayIFace(IFace):
+
+  ## @param strict Set to true to raise TestFailure once the written data
+  # diverges from the recorded requests (default). Otherwise, written data is
+  # discarded.
+  def __init__(s,fn,strict=True):
+    IFace.__init__(s)
+    s.strict=strict
+    s.fn=fn
+    records=SessionLog.read(fn)
+    s._tx=b"".join([
+      r.data for r in records if r.direction==SessionLog.TX])
+    s._rx=b"".join([
+      r.data for r in records if r.direction==SessionLog.RX])
+    s._tx_pos=0
+    s._rx_pos=0
+
+  def write(s,data):
+    data=bytes(data)
+    if s.strict:
+      expected=s._tx[s._tx_pos:s._tx_pos+len(data)]
+      if expected!=data:
+        pos=s._tx_pos
+        while pos-s._tx_pos<len(expected) and (
+          expected[pos-s._tx_pos]==data[pos-s._tx_pos]):
+          pos+=1
+        raise TestFailure(
+          "request diverges from recording %s at byte %i"%(s.fn,pos))
+    s._tx_pos+=len(data)
+    return len(data)
+
+  def read(s,size=1):
+    data=s._rx[s._rx_pos:s._rx_pos+size]
+    s._rx_pos+=len(data)
+    return data
+
+  ## Number of recorded response bytes not read yet.
+  @property
+  def in_waiting(s):
+    return len(s._rx)-s._rx_pos
+
+  def close(s):
+    pass
@@ -0,0 +1,366 @@
+import threading
+import queue
+from collections import namedtuple, deque
+from .error import TestFailure, ArchMismatch
+from .iface import IFace
+from .replay import RecordingIFace, ReplayIFace
+
+## Overlapped verification of a hardware unit against its simulation.
+#
+# Verification consists of three stages, each running on its own thread and
+# connected by bounded queues, such that simulation of upcoming inputs and the
+# comparison of earlier results overlap with the UART transfers:
+#
+#  - producer: takes jobs from an iterable and turns each into a chunk of
+#    inputs along with their simulated outputs by calling `produce(job)`.
+#  - hardware: calls `execute(chunk)` for each chunk in order, which applies
+#    any configuration and returns the outputs of the hardware for the chunk's
+#    inputs, typically by a batched command such as IFace.commandi_many.
+#  - comparator: compares the outputs and calls `on_mismatch` for each
+#    differing output and `on_chunk` for each chunk. This stage runs on the
+#    thread calling run, thus callbacks may safely print or update progress
+#    bars.
+#
+# The jobs iterable is consumed by the producer thread, thus it may be a
+# generator doing expensive work like compiling random configurations.
+# An exception raised by any stage stops all stages and is re-raised by run.
+class VerificationRunner:
+
+  ## A chunk of inputs as produced from a job.
+  #
+  # @param job The job the chunk was produced from.
+  # @param inputs Sequence of inputs to the hardware unit.
+  # @param expected Sequence of simulated outputs, one per input.
+  chunk_t=namedtuple("verification_chunk_t","job inputs expected")
+  # locate the type by its attribute, as required for pickling
+  chunk_t.__qualname__="VerificationRunner.chunk_t"
+
+  ## A differing output, `index` referring to the inputs of `chunk`.
+  mismatch_t=namedtuple("verification_mismatch_t","chunk index y_sim y_phy")
+  mismatch_t.__qualname__="VerificationRunner.mismatch_t"
+
+  ## Number of chunks, inputs and mismatches of a run.
+  stats_t=namedtuple("verification_stats_t","chunks inputs mismatches")
+  stats_t.__qualname__="VerificationRunner.stats_t"
+
+  ## A job of chunked_jobs, covering `count` inputs starting at `offset` for
+  # a single configuration `config`.
+  job_t=namedtuple("verification_job_t","config offset count")
+  job_t.__qualname__="VerificationRunner.job_t"
+
+  ## Default number of chunks buffered between two stages.
+  DEPTH=4
+
+  ## Interval in seconds in which blocked stages check for a stop request.
+  POLL_INTERVAL=0.1
+
+  _END=object()
+
+  def __init__(s,produce,execute,on_mismatch=None,on_chunk=None,depth=None):
+    s.produce=produce
+    s.execute=execute
+    s.on_mismatch=on_mismatch
+    s.on_chunk=on_chunk
+    s.depth=depth if depth!=None else VerificationRunner.DEPTH
+
+  ## Splits the verification of a number of configurations into jobs of at
+  # most chunk_size inputs each.
+  #
+  # A job with offset zero is the first one of its configuration, which
+  # `execute` may use to apply the configuration to the hardware.
+  #
+  # @param configs Iterable of configurations, e.g. a generator yielding
+  # random specifications along with their compiled intermediates.
+  @staticmethod
+  def chunked_jobs(configs,count,chunk_size):
+    for config in configs:
+      for offset in range(0,count,chunk_size):
+        yield VerificationRunner.job_t(
+          config,offset,min(chunk_size,count-offset))
+
+  ## Runs all stages until all jobs are verified.
+  #
+  # @return an instance of stats_t.
+  def run(s,jobs):
+    s._stop=threading.Event()
+    s._error=None
+    produced=queue.Queue(s.depth)
+    executed=queue.Queue(s.depth)
+
+    threads=[
+      threading.Thread(
+        target=s._stage,args=(s._producer,jobs,produced),daemon=True),
+      threading.Thread(
+        target=s._stage,args=(s._hardware,produced,executed),daemon=True)
+    ]
+    for t in threads:
+      t.start()
+
+    try:
+      stats=s._comparator(executed)
+    except BaseException as e:
+      s._fail(e)
+    finally:
+      s._stop.set()
+      for t in threads:
+        t.join()
+
+    if s._error!=None:
+      raise s._error
+    return stats
+
+  def _fail(s,e):
+    if s._error==None:
+      s._error=e
+    s._stop.set()
+
+  def _stage(s,fn,source,sink):
+    try:
+      fn(source,sink)
+    except BaseException as e:
+      s._fail(e)
+    finally:
+      s._put(sink,VerificationRunner._END)
+
+  ## Puts an item into a queue, giving up if the run is stopped.
+  def _put(s,q,item):
+    while not s._stop.is_set():
+      try:
+        q.put(item,timeout=VerificationRunner.POLL_INTERVAL)
+        return True
+      except queue.Full:
+        pass
+    return False
+
+  ## Gets an item from a queue, returning _END if the run is stopped.
+  def _get(s,q):
+    while True:
+      try:
+        return q.get(timeout=VerificationRunner.POLL_INTERVAL)
+      except queue.Empty:
+        if s._stop.is_set():
+          return VerificationRunner._END
+
+  def _producer(s,jobs,sink):
+    for job in jobs:
+      chunk=s.produce(job)
+      if len(chunk.inputs)!=len(chunk.expected):
+        raise TestFailure(
+          "expected %i simulated outputs, got %i"
+          %(len(chunk.inputs),len(chunk.expected)))
+      if not s._put(sink,chunk):
+        break
+
+  def _hardware(s,source,sink):
+    while True:
+      chunk=s._get(source)
+      if chunk is VerificationRunner._END:
+        break
+      ys=s.execute(chunk)
+      if not s._put(sink,(chunk,ys)):
+        break
+
+  def _comparator(s,source):
+    (chunks,inputs,mismatches)=(0,0,0)
+    while True:
+      item=s._get(source)
+      if item is VerificationRunner._END:
+        break
+      (chunk,ys)=item
+      if len(ys)!=len(chunk.inputs):
+        raise TestFailure(
+          "expected %i hardware outputs, got %i"%(len(chunk.inputs),len(ys)))
+
+      for i,(y_sim,y_phy) in enumerate(zip(chunk.expected,ys)):
+        if y_sim!=y_phy:
+          mismatches+=1
+          if s.on_mismatch!=None:
+            s.on_mismatch(VerificationRunner.mismatch_t(chunk,i,y_sim,y_phy))
+      chunks+=1
+      inputs+=len(ys)
+      if s.on_chunk!=None:
+        s.on_chunk(chunk)
+    return VerificationRunner.stats_t(chunks,inputs,mismatches)
+
+
+## Verification on a number of boards, each running a hardware test
+# instantiation of the same architecture.
+#
+# Tasks (e.g. the indices of random configurations to test) are sharded
+# round-robin onto one deque per board. Each board runs a VerificationRunner,
+# taking tasks from the front of its own deque and, once that is empty,
+# stealing from the back of the fullest deque of another board. Thus, slower
+# boards or more expensive configurations do not stall the run.
+#
+# Callbacks are invoked with the originating board and serialized by a lock,
+# such that progress may be aggregated in a single progress bar.
+class ShardedRunner:
+
+  ## A board, `index` being its position in the list of ports.
+  board_t=namedtuple("sharded_board_t","index port iface")
+  board_t.__qualname__="ShardedRunner.board_t"
+
+  ## A mismatch (VerificationRunner.mismatch_t) along with its board.
+  mismatch_t=namedtuple("sharded_mismatch_t","board mismatch")
+  mismatch_t.__qualname__="ShardedRunner.mismatch_t"
+
+  ## Merged stats (VerificationRunner.stats_t) along with a list of stats per
+  # board, the tasks taken by each board and all mismatches.
+  result_t=namedtuple("sharded_result_t","stats boards tasks mismatches")
+  result_t.__qualname__="ShardedRunner.result_t"
+
+  ## @param ifaces List of IFace instances, one per board.
+  # @param ports Optional list of names of the boards, defaults to the ports
+  # of the interfaces.
+  def __init__(s,ifaces,ports=None):
+    if ports==None:
+      ports=[getattr(iface,"port",None) or str(i) 
+        for i,iface in enumerate(ifaces)]
+    s.boards=[
+      ShardedRunner.board_t(i,port,iface)
+      for i,(port,iface) in enumerate(zip(ports,ifaces))]
+    s._lock=threading.Lock()
+
+  ## Opens an IFace per port and queries the architecture parameters of each
+  # board, see check_arch.
+  @staticmethod
+  def open(ports,baud=921600):
+    r=ShardedRunner([IFace(port,baud) for port in ports],ports)
+    for board in r.boards:
+      board.iface.load_config()
+    r.check_arch()
+    return r
+
+  ## Connects to a number of boards without querying their architecture.
+  #
+  # @param record Optional file name of a session log to record into (see
+  # RecordingIFace), suffixed by the index of the board if there are multiple
+  # ports.
+  # @param replay Optional list of session logs, each replaying a board in
+  # place of the ports (see ReplayIFace).
+  @staticmethod
+  def connect(ports,baud=921600,record=None,replay=None):
+    if replay:
+      return ShardedRunner([ReplayIFace(fn) for fn in replay],replay)
+    if record!=None:
+      return ShardedRunner([
+        RecordingIFace(port,baud,
+          record if len(ports)==1 else "%s.%i"%(record,i))
+        for i,port in enumerate(ports)],ports)
+    return ShardedRunner([IFace(port,baud) for port in ports],ports)
+
+  ## The interfaces of all boards.
+  @property
+  def ifaces(s):
+    return [board.iface for board in s.boards]
+
+  ## The architecture common to all boards.
+  #
+  # @throws ArchMismatch The boards implement different architectures.
+  def check_arch(s):
+    arch=s.boards[0].iface.arch
+    diff=[board for board in s.boards[1:] if board.iface.arch!=arch]
+    if diff:
+      expected=arch.asdict()
+      raise ArchMismatch(
+        "boards differ in architecture from %s: %s"%(
+          s.boards[0].port,"; ".join([
+            "%s: %s"%(board.port,", ".join([
+              "%s=%i (expected %i)"%(f,v,expected[f])
+              for f,v in board.iface.arch.asdict().items()
+              if v!=expected[f]]))
+            for board in diff])))
+    return arch
+
+  ## Takes the next task for a board, stealing one if its deque is empty.
+  def _take(s,board):
+    with s._lock:
+      if s._stop:
+        return None
+      own=s._shards[board.index]
+      if own:
+        return (own.popleft(),)
+      victim=max(s._shards,key=len)
+      if victim:
+        return (victim.pop(),)
+      return None
+
+  def _tasks(s,board):
+    while True:
+      task=s._take(board)
+      if task==None:
+        return
+      s._done[board.index].append(task[0])
+      yield task[0]
+
+  ## Verifies all tasks on all boards.
+  #
+  # @param tasks Sequence of tasks.
+  # @param stages Function of a board_t returning a tuple (configure, produce,
+  # execute) of functions bound to that board. configure is called with a
+  # task and returns the configuration of the jobs (see
+  # VerificationRunner.chunked_jobs), produce and execute are those of
+  # VerificationRunner.
+  # @param count Number of inputs to verify per task.
+  # @param chunk_size Number of inputs per chunk.
+  # @param on_mismatch Called with a mismatch_t for each differing output.
+  # @param on_chunk Called with the board and the chunk for each verified
+  # chunk.
+  # @return an instance of result_t.
+  # @throws TestFailure A board failed, naming the board. All boards are 
+  # stopped.
+  def run(s,tasks,stages,count,chunk_size,on_mismatch=None,on_chunk=None):
+    s._stop=False
+    s._shards=[deque() for board in s.boards]
+    s._done=[[] for board in s.boards]
+    for i,task in enumerate(tasks):
+      s._shards[i%len(s.boards)].append(task)
+
+    stats=[None]*len(s.boards)
+    mismatches=[]
+    errors=[]
+
+    def worker(board):
+      (configure,produce,execute)=stages(board)
+      
+      def mismatch(m):
+        m=ShardedRunner.mismatch_t(board,m)
+        with s._lock:
+          mismatches.append(m)
+          if on_mismatch!=None:
+            on_mismatch(m)
+
+      def chunk(c):
+        if on_chunk!=None:
+          with s._lock:
+            on_chunk(board,c)
+
+      try:
+        runner=VerificationRunner(produce,execute,mismatch,chunk)
+        stats[board.index]=runner.run(VerificationRunner.chunked_jobs(
+          (configure(task) for task in s._tasks(board)),count,chunk_size))
+      except BaseException as e:
+        with s._lock:
+          errors.append((board,e))
+          s._stop=True
+
+    threads=[
+      threading.Thread(target=worker,args=(board,),daemon=True)
+      for board in s.boards]
+    for t in threads:
+      t.start()
+    try:
+      for t in threads:
+        t.join()
+    except BaseException:
+      with s._lock:
+        s._stop=True
+      raise
+
+    if errors:
+      (board,e)=errors[0]
+      raise TestFailure("board %s: %s"%(board.port,e)) from e
+    
+    return ShardedRunner.result_t(
+      VerificationRunner.stats_t(*[sum(v) for v in zip(*stats)]),
+      stats,s._done,mismatches)
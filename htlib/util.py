@@ -72,3 +72,18 @@ class ProgressBar:
       self.cur=self.max
 
 
+
+## Imports numpy on demand.
+#
+# numpy is an optional dependency of htlib which is only required for the
+# batched simulation facilities. As the installed version of htlib is commonly
+# used in environments without numpy, it is not imported at module level.
+#
+# @return the numpy module.
+# @throws ImportError numpy is not available.
+def require_numpy():
+  try:
+    import numpy
+  except ImportError:
+    raise ImportError("numpy is required for batched simulation")
+  return numpy
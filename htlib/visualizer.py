@@ -1,4 +1,5 @@
 from .iface import *
+from .bitstream import BitstreamDecoder,bitstream_words
 from collections import namedtuple
 
 class ASCIIRenderer:
@@ -54,41 +55,9 @@ class BitstreamVisualizer(IFaceRef):
     "visualization_t","points_empty points_full texts lines")
 
   def visualize(s,words):
-    ram=words[:s.iface.CFG_LUT_REGISTER_COUNT]
-    chain=list(reversed(words[s.iface.CFG_LUT_REGISTER_COUNT:]))
-    idec=chain[:s.iface.CFG_INPUT_DECODER_REGISTER_COUNT]
-    chain=chain[s.iface.CFG_INPUT_DECODER_REGISTER_COUNT:]
-    pla_and=chain[:s.iface.CFG_PLA_AND_REGISTER_COUNT]
-    chain=chain[s.iface.CFG_PLA_AND_REGISTER_COUNT:]
-    pla_or=chain
-    chain=[]
-
-    def decode_words(words,n,m,ws):
-      return [
-        sum([v<<(ws*(m-j-1)) for j,v in enumerate(words[i:i+m])])
-        for i in range(0,n*m,m)]
-    def decode_words_rev(words,n,m,ws):
-      return [
-        sum([v<<(ws*(j)) for j,v in enumerate(words[i:i+m])])
-        for i in range(0,n*m,m)]
-    
-    ram=decode_words_rev(ram,
-      2**s.iface.SEGMENT_BITS,
-      s.iface.RAM_CONFIG_BUFFER_SIZE,
-      s.iface.WORD_SIZE)
-    idec=decode_words(idec,
-      s.iface.SELECTOR_BITS+s.iface.INTERPOLATION_BITS,
-      s.iface.CFG_INPUT_DECODER_REGISTERS_PER_BIT,
-      s.iface.WORD_SIZE)
-    pla_and=decode_words(pla_and,
-      s.iface.PLA_INTERCONNECTS,
-      s.iface.CFG_PLA_AND_REGISTERS_PER_ROW,
-      s.iface.WORD_SIZE)
-    pla_or=decode_words(pla_or,
-      s.iface.SEGMENT_BITS,
-      s.iface.CFG_PLA_OR_REGISTERS_PER_COLUMN,
-      s.iface.WORD_SIZE)
-    
+    words=bitstream_words(s.iface,words)
+    arch=s.iface.arch
+    (ram,pla_and,pla_or,idec)=BitstreamDecoder(s.iface).decode(words)
 
     points_empty=set()
     points_full=set()
@@ -97,8 +66,8 @@ class BitstreamVisualizer(IFaceRef):
 
     print("ram (raw, base, incline):")
     for raw in ram:
-      incline=raw&((1<<s.iface.INCLINE_BITS)-1)
-      base=(raw>>s.iface.INCLINE_BITS)
+      incline=raw&((1<<arch.INCLINE_BITS)-1)
+      base=(raw>>arch.INCLINE_BITS)
       print("  %24i %12i %12i"%(raw, base,incline))
 
 
@@ -120,10 +89,10 @@ class BitstreamVisualizer(IFaceRef):
     #     +-+-+
     #       n_inputs
 
-    n_inputs=s.iface.SELECTOR_BITS+s.iface.INTERPOLATION_BITS
-    h_inputs=s.iface.INPUT_WORDS*s.iface.WORD_SIZE
-    h_interconnects=s.iface.PLA_INTERCONNECTS
-    n_segbits=s.iface.SEGMENT_BITS
+    n_inputs=arch.SELECTOR_BITS+arch.INTERPOLATION_BITS
+    h_inputs=arch.INPUT_WORDS*arch.WORD_SIZE
+    h_interconnects=arch.PLA_INTERCONNECTS
+    n_segbits=arch.SEGMENT_BITS
     
 
     for i in range(n_inputs):
@@ -132,14 +101,14 @@ class BitstreamVisualizer(IFaceRef):
         else: points_empty.add((i+4,j))
     
     y_pla=-h_interconnects-1
-    x_pla=4+s.iface.INTERPOLATION_BITS
+    x_pla=4+arch.INTERPOLATION_BITS
 
-    for i in range(s.iface.SELECTOR_BITS*2):
+    for i in range(arch.SELECTOR_BITS*2):
       for j in range(h_interconnects):
         if pla_and[j]&(1<<i): points_full.add((i+x_pla,j+y_pla))
         else: points_empty.add((i+x_pla,j+y_pla))
 
-    x_or=x_pla+s.iface.SELECTOR_BITS*2+1
+    x_or=x_pla+arch.SELECTOR_BITS*2+1
 
     for i in range(n_segbits):
       for j in range(h_interconnects):
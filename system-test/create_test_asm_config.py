@@ -25,19 +25,13 @@ intermediate3=ctrl.core_compile(specification3)
 raw_words3 = ctrl.core_bitstream(specification3)
 
 
-iopairs=[
-  (lambda x:(x,intermediate.sim(x<<64)))(ctrl.random_core_input()&0xffffffff)
-  for i in range(randomInputCount)
-  ]+[ 
-    (0,intermediate.sim(0)) 
-  ]
+inputs=ctrl.random_core_inputs(randomInputCount,singleInput=2,mask=0xffffffff)
+inputs.append((0,)*iface.INPUT_WORDS)
+outputs=intermediate.sim_sliced(inputs)
 
-iopairs3=[
-  (lambda x:(x,intermediate3.sim(x)))(ctrl.random_core_input())
-  for i in range(randomInputCount)
-  ]+[ 
-    (0,intermediate3.sim(0)) 
-  ]
+inputs3=ctrl.random_core_inputs(randomInputCount)
+inputs3.append((0,)*iface.INPUT_WORDS)
+outputs3=intermediate3.sim_sliced(inputs3)
 
 # generate bitstream
 with open('test_data.c', 'w') as f:
@@ -56,15 +50,15 @@ with open('test_data.c', 'w') as f:
 
     %(
       len(raw_words),
-      len(iopairs),
+      len(inputs),
       ",".join(["%suL"%v for v in raw_words]),
-      ",".join(["%suL"%i for i,o in iopairs]),
-      ",".join(["%suL"%o for i,o in iopairs]),
+      inputs.c_column(1),
+      ",".join(["%suL"%o for o in outputs]),
 
       ",".join(["%suL"%v for v in raw_words3]),
-      ",".join(["%suL"%((i>>  0)%(1<<64)) for i,o in iopairs3]),
-      ",".join(["%suL"%((i>> 64)%(1<<64)) for i,o in iopairs3]),
-      ",".join(["%suL"%((i>>128)%(1<<64)) for i,o in iopairs3]),
-      ",".join(["%suL"%o for i,o in iopairs3])
+      inputs3.c_column(0),
+      inputs3.c_column(1),
+      inputs3.c_column(2),
+      ",".join(["%suL"%o for o in outputs3])
       ))
 
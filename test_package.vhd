@@ -12,6 +12,13 @@ package test_package is
   constant C_CLK_FREQ : integer := 100000000;
   constant C_BAUD_RATE : integer := 921600;
 
+  -- framed protocol (see uart_framer and htlib/framing.py), to be enabled on
+  -- the host by IFace.enable_framing
+  constant C_FRAMED : boolean := false;
+  constant C_FRAME_SYNC : std_logic_vector(7 downto 0) := x"a5";
+  constant C_FRAME_CRC_INIT : std_logic_vector(7 downto 0) := x"ff";
+  constant C_FRAME_CRC_POLY : std_logic_vector(7 downto 0) := x"07";
+
   constant CMD_ECHO : std_logic_vector(7 downto 0) := x"01";
   constant CMD_CFG_WORD : std_logic_vector(7 downto 0) := x"10";
   constant CMD_COMPUTE_PLA : std_logic_vector(7 downto 0) := x"21";
@@ -125,11 +132,33 @@ package test_package is
     signal tx_valid : out std_logic;
     signal tx_data  : out std_logic_vector); 
 
+  function crc8(
+    crc : std_logic_vector(7 downto 0);
+    data : std_logic_vector(7 downto 0)) return std_logic_vector;
+
 
 end package;
 
 package body test_package is
 
+  --! CRC-8 of the framed protocol (polynomial C_FRAME_CRC_POLY, not
+  --! reflected), updated by a byte of data.
+  function crc8(
+    crc : std_logic_vector(7 downto 0);
+    data : std_logic_vector(7 downto 0)) return std_logic_vector is
+    variable c : std_logic_vector(7 downto 0);
+  begin
+    c := crc xor data;
+    for i in 0 to 7 loop
+      if c(7)='1' then
+        c := (c(6 downto 0) & '0') xor C_FRAME_CRC_POLY;
+      else
+        c := c(6 downto 0) & '0';
+      end if;
+    end loop;
+    return c;
+  end function;
+
   procedure ht_common_cmd(
     signal rx_data : std_logic_vector;
     signal tx_valid : out std_logic;
@@ -0,0 +1,258 @@
+library ieee;
+use ieee.std_logic_1164.all;
+use ieee.std_logic_arith.all;
+use ieee.std_logic_unsigned.all;
+
+library work;
+use work.test_package.all;
+
+--! @brief Framing layer of the framed UART protocol (see htlib/framing.py).
+--! @details Sits between UART receiver and transmitter and the state machine
+--! of a hardware test, which keeps using the byte interface of the raw
+--! protocol.
+--! A request frame is received into a buffer and checked. The payload of a
+--! valid frame is passed on to the state machine byte by byte whenever it is
+--! ready to receive (up_rx_ready), its responses are collected until it has
+--! returned to idle (up_idle) and sent as response frame.
+--! The response of the last executed frame is kept and sent again for a frame
+--! repeating its sequence number. An empty frame (resync) is answered by an
+--! empty frame. Frames with a bad CRC are dropped, as are partial frames once
+--! no byte has been received for IDLE_TIMEOUT clock cycles.
+entity uart_framer is
+  generic(
+    IDLE_TIMEOUT : integer := 100000
+  );
+  port(
+    clk : in std_logic;
+    rst : in std_logic;
+
+    -- UART receiver and transmitter
+    rx_valid : in std_logic;
+    rx_data : in std_logic_vector(7 downto 0);
+    tx_valid : out std_logic;
+    tx_ready : in std_logic;
+    tx_data : out std_logic_vector(7 downto 0);
+
+    -- state machine of the hardware test
+    up_rx_valid : out std_logic;
+    up_rx_data : out std_logic_vector(7 downto 0);
+    up_rx_ready : in std_logic;
+    up_idle : in std_logic;
+    up_tx_valid : in std_logic;
+    up_tx_ready : out std_logic;
+    up_tx_data : in std_logic_vector(7 downto 0)
+  );
+end entity;
+
+architecture implementation of uart_framer is
+  type buffer_t is array(0 to 255) of std_logic_vector(7 downto 0);
+  signal rx_buffer : buffer_t;
+  signal tx_buffer : buffer_t;
+
+  type state_t is (
+    HUNT,
+    RX_SEQ,RX_LEN,RX_PAYLOAD,RX_CRC,
+    FORWARD,COLLECT,
+    TX_SYNC,TX_SEQ,TX_LEN,TX_PAYLOAD,TX_CRC
+    );
+  signal state : state_t;
+
+  signal crc : std_logic_vector(7 downto 0);
+  signal seq : std_logic_vector(7 downto 0);
+  signal len : integer range 0 to 255;
+  signal index : integer range 0 to 255;
+  signal idle_counter : integer range 0 to IDLE_TIMEOUT-1;
+  signal settle_counter : integer range 0 to 2;
+
+  -- last executed frame and its response (in tx_buffer)
+  signal kept_valid : std_logic;
+  signal kept_seq : std_logic_vector(7 downto 0);
+  signal kept_len : integer range 0 to 255;
+  signal collecting : std_logic;
+
+  signal tx_seq : std_logic_vector(7 downto 0);
+  signal tx_len : integer range 0 to 255;
+
+begin
+
+  up_tx_ready <= collecting;
+
+  process(clk,rst) is begin
+    if rst='1' then
+      state <= HUNT;
+      idle_counter <= 0;
+      kept_valid <= '0';
+      kept_len <= 0;
+      collecting <= '0';
+      up_rx_valid <= '0';
+      tx_valid <= '0';
+
+    elsif rising_edge(clk) then
+      up_rx_valid <= '0';
+      tx_valid <= '0';
+
+      if (collecting='1') and (up_tx_valid='1') and (kept_len<255) then
+        tx_buffer(kept_len) <= up_tx_data;
+        kept_len <= kept_len+1;
+      end if;
+
+      case state is
+        when RX_SEQ|RX_LEN|RX_PAYLOAD|RX_CRC =>
+          if rx_valid='1' then
+            idle_counter <= 0;
+          elsif idle_counter=IDLE_TIMEOUT-1 then
+            idle_counter <= 0;
+            state <= HUNT;
+          else
+            idle_counter <= idle_counter+1;
+          end if;
+        when others =>
+          idle_counter <= 0;
+      end case;
+
+      case state is
+        when HUNT =>
+          if (rx_valid='1') and (rx_data=C_FRAME_SYNC) then
+            crc <= C_FRAME_CRC_INIT;
+            state <= RX_SEQ;
+          end if;
+
+        when RX_SEQ =>
+          if rx_valid='1' then
+            seq <= rx_data;
+            crc <= crc8(crc,rx_data);
+            state <= RX_LEN;
+          end if;
+
+        when RX_LEN =>
+          if rx_valid='1' then
+            len <= conv_integer(unsigned(rx_data));
+            crc <= crc8(crc,rx_data);
+            index <= 0;
+            if rx_data=x"00" then
+              state <= RX_CRC;
+            else
+              state <= RX_PAYLOAD;
+            end if;
+          end if;
+
+        when RX_PAYLOAD =>
+          if rx_valid='1' then
+            rx_buffer(index) <= rx_data;
+            crc <= crc8(crc,rx_data);
+            if index=len-1 then
+              state <= RX_CRC;
+            else
+              index <= index+1;
+            end if;
+          end if;
+
+        when RX_CRC =>
+          if rx_valid='1' then
+            if rx_data/=crc then
+              state <= HUNT;
+            elsif len=0 then
+              -- resync
+              tx_seq <= seq;
+              tx_len <= 0;
+              state <= TX_SYNC;
+            elsif (kept_valid='1') and (seq=kept_seq) then
+              -- retransmission
+              tx_seq <= seq;
+              tx_len <= kept_len;
+              state <= TX_SYNC;
+            else
+              kept_valid <= '0';
+              kept_seq <= seq;
+              kept_len <= 0;
+              collecting <= '1';
+              index <= 0;
+              settle_counter <= 0;
+              state <= FORWARD;
+            end if;
+          end if;
+
+        -- the state machine takes a cycle to leave its state after a byte,
+        -- thus its readiness is sampled two cycles after passing a byte on
+        when FORWARD =>
+          if settle_counter/=0 then
+            settle_counter <= settle_counter-1;
+          elsif up_rx_ready='1' then
+            up_rx_valid <= '1';
+            up_rx_data <= rx_buffer(index);
+            if index=len-1 then
+              settle_counter <= 2;
+              state <= COLLECT;
+            else
+              settle_counter <= 1;
+              index <= index+1;
+            end if;
+          end if;
+
+        when COLLECT =>
+          if settle_counter/=0 then
+            settle_counter <= settle_counter-1;
+          elsif up_idle='1' then
+            collecting <= '0';
+            kept_valid <= '1';
+            tx_seq <= kept_seq;
+            tx_len <= kept_len;
+            state <= TX_SYNC;
+          end if;
+
+        when TX_SYNC =>
+          tx_valid <= '1';
+          tx_data <= C_FRAME_SYNC;
+          if (tx_valid='1') and (tx_ready='1') then
+            tx_data <= tx_seq;
+            crc <= crc8(C_FRAME_CRC_INIT,tx_seq);
+            state <= TX_SEQ;
+          end if;
+
+        when TX_SEQ =>
+          tx_valid <= '1';
+          if (tx_valid='1') and (tx_ready='1') then
+            tx_data <= conv_std_logic_vector(tx_len,8);
+            crc <= crc8(crc,conv_std_logic_vector(tx_len,8));
+            state <= TX_LEN;
+          end if;
+
+        when TX_LEN =>
+          tx_valid <= '1';
+          if (tx_valid='1') and (tx_ready='1') then
+            index <= 0;
+            if tx_len=0 then
+              tx_data <= crc;
+              state <= TX_CRC;
+            else
+              tx_data <= tx_buffer(0);
+              crc <= crc8(crc,tx_buffer(0));
+              state <= TX_PAYLOAD;
+            end if;
+          end if;
+
+        when TX_PAYLOAD =>
+          tx_valid <= '1';
+          if (tx_valid='1') and (tx_ready='1') then
+            if index=tx_len-1 then
+              tx_data <= crc;
+              state <= TX_CRC;
+            else
+              tx_data <= tx_buffer(index+1);
+              crc <= crc8(crc,tx_buffer(index+1));
+              index <= index+1;
+            end if;
+          end if;
+
+        when TX_CRC =>
+          tx_valid <= '1';
+          if (tx_valid='1') and (tx_ready='1') then
+            tx_valid <= '0';
+            state <= HUNT;
+          end if;
+      end case;
+
+    end if;
+  end process;
+
+end architecture;
@@ -0,0 +1,100 @@
+library ieee;
+use ieee.std_logic_1164.all;
+use ieee.std_logic_arith.all;
+
+library work;
+use work.test_package.all;
+
+--! @brief UART link of a hardware test.
+--! @details Combines UART receiver and transmitter and, if FRAMED is set, the
+--! framing layer of the framed protocol (uart_framer). Either way, the state
+--! machine of the hardware test is connected by the byte interface of the raw
+--! protocol, indicating whether it is ready to receive a byte (rx_ready) and
+--! whether it is idle, i.e. done with a command (sm_idle). The latter two are
+--! only used by the framing layer.
+entity uart_link is
+  generic(
+    CLK_FREQ  : integer := 50000000;
+    BAUD_RATE : integer := 9600;
+    FRAMED : boolean := false
+  );
+  port(
+    clk : in std_logic;
+    rst : in std_logic;
+    rxd : in std_logic;
+    txd : out std_logic;
+
+    rx_valid : out std_logic;
+    rx_data : out std_logic_vector(7 downto 0);
+    rx_ready : in std_logic;
+    sm_idle : in std_logic;
+    tx_valid : in std_logic;
+    tx_ready : out std_logic;
+    tx_data : in std_logic_vector(7 downto 0)
+  );
+end entity;
+
+architecture implementation of uart_link is
+  signal uart_rx_valid : std_logic;
+  signal uart_rx_data  : std_logic_vector(7 downto 0);
+  signal uart_tx_valid : std_logic;
+  signal uart_tx_ready : std_logic;
+  signal uart_tx_data  : std_logic_vector(7 downto 0);
+begin
+
+  rx : uart_receiver generic map (
+    CLK_FREQ => CLK_FREQ,
+    BAUD_RATE => BAUD_RATE
+  ) port map (
+    clk => clk,
+    rst => rst,
+    rxd => rxd,
+
+    valid => uart_rx_valid,
+    do    => uart_rx_data
+  );
+
+  tx : uart_transmitter generic map (
+    CLK_FREQ => CLK_FREQ,
+    BAUD_RATE => BAUD_RATE
+  ) port map (
+    clk => clk,
+    rst => rst,
+    txd => txd,
+    di => uart_tx_data,
+    valid => uart_tx_valid,
+    ready => uart_tx_ready
+  );
+
+  framed_link: if FRAMED generate
+    framer: entity work.uart_framer generic map (
+      IDLE_TIMEOUT => CLK_FREQ/1000
+    ) port map (
+      clk => clk,
+      rst => rst,
+
+      rx_valid => uart_rx_valid,
+      rx_data => uart_rx_data,
+      tx_valid => uart_tx_valid,
+      tx_ready => uart_tx_ready,
+      tx_data => uart_tx_data,
+
+      up_rx_valid => rx_valid,
+      up_rx_data => rx_data,
+      up_rx_ready => rx_ready,
+      up_idle => sm_idle,
+      up_tx_valid => tx_valid,
+      up_tx_ready => tx_ready,
+      up_tx_data => tx_data
+    );
+  end generate;
+
+  raw_link: if not FRAMED generate
+    rx_valid <= uart_rx_valid;
+    rx_data <= uart_rx_data;
+    uart_tx_valid <= tx_valid;
+    tx_ready <= uart_tx_ready;
+    uart_tx_data <= tx_data;
+  end generate;
+
+end architecture;